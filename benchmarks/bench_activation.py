@@ -0,0 +1,155 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Activation latency benchmarks, for use with pytest-benchmark:
+
+    pytest benchmarks/bench_activation.py --benchmark-json=bench.json
+
+Every plugin in condact/plugins is measured end to end and per phase, against synthetic
+prefixes of several sizes. Nothing here needs network access.
+"""
+from __future__ import annotations
+
+from argparse import Namespace
+from importlib import import_module
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from condact.cli import execute
+from condact.logic import PluginActivator
+from condact.shell_manager import get_shell_syntax, update_plugin_manager
+
+from .conftest import PLUGIN_MODULES, load_plugin
+
+# (number of packages in conda-meta, number of activate.d/deactivate.d scripts)
+PREFIX_SHAPES = ((0, 0), (100, 50), (5000, 500))
+
+STACK_DEPTHS = (0, 1, 5, 20)
+
+
+def _shape_id(shape: tuple[int, int]) -> str:
+    return "pkgs{}-scripts{}".format(*shape)
+
+
+def _unregister(pm, modules) -> None:
+    for module in modules:
+        if pm.is_registered(module):
+            pm.unregister(module)
+
+
+def _activate_ns(prefix: str, stack: bool = False) -> Namespace:
+    return Namespace(command="activate", env=prefix, dev=False, stack=stack)
+
+
+@pytest.mark.parametrize("plugin", PLUGIN_MODULES)
+def test_update_plugin_manager(benchmark, plugin):
+    """Measure loading the plugin manager for a single requested plugin."""
+    module = import_module(f"condact.plugins.{plugin}")
+    pm = update_plugin_manager([module], plugin)
+
+    benchmark.pedantic(
+        update_plugin_manager,
+        args=([module], plugin),
+        setup=lambda: _unregister(pm, [module]),
+        rounds=20,
+    )
+
+
+@pytest.mark.parametrize("plugin", PLUGIN_MODULES)
+def test_get_shell_syntax(benchmark, plugin):
+    """Measure looking up a plugin hook in a loaded plugin manager."""
+    module = import_module(f"condact.plugins.{plugin}")
+    pm = update_plugin_manager([module], plugin)
+
+    syntax = benchmark(get_shell_syntax, pm, plugin)
+
+    assert syntax.name == plugin
+
+
+@pytest.mark.parametrize("shape", PREFIX_SHAPES, ids=_shape_id)
+@pytest.mark.parametrize("plugin", PLUGIN_MODULES)
+def test_parse_and_build(benchmark, plugin, shape, prefix_factory, stacked_environ, no_plan_cache):
+    """Measure building an activation plan without the plan cache."""
+    prefix = prefix_factory(*shape)
+    stacked_environ(0)
+    syntax = load_plugin(plugin)
+    benchmark.extra_info.update(packages=shape[0], scripts=shape[1])
+
+    cmds_dict = benchmark(lambda: PluginActivator(syntax).parse_and_build(_activate_ns(prefix)))
+
+    assert "CONDA_PREFIX" in cmds_dict["export_vars"]
+
+
+@pytest.mark.parametrize("shape", PREFIX_SHAPES, ids=_shape_id)
+@pytest.mark.parametrize("plugin", PLUGIN_MODULES)
+def test_parse_and_build_cached(benchmark, plugin, shape, prefix_factory, stacked_environ):
+    """Measure serving an activation plan from the plan cache."""
+    prefix = prefix_factory(*shape)
+    stacked_environ(0)
+    syntax = load_plugin(plugin)
+    PluginActivator(syntax).parse_and_build(_activate_ns(prefix))
+    benchmark.extra_info.update(packages=shape[0], scripts=shape[1])
+
+    benchmark(lambda: PluginActivator(syntax).parse_and_build(_activate_ns(prefix)))
+
+
+@pytest.mark.parametrize("depth", STACK_DEPTHS)
+@pytest.mark.parametrize("plugin", ["posix_cl", "posix_ose"])
+def test_parse_and_build_stacked(benchmark, plugin, depth, prefix_factory, stacked_environ, no_plan_cache):
+    """Measure building a stacked activation plan on top of depth active environments."""
+    prefix = prefix_factory(100, 50)
+    stacked_environ(depth)
+    syntax = load_plugin(plugin)
+    benchmark.extra_info.update(depth=depth)
+
+    benchmark(lambda: PluginActivator(syntax).parse_and_build(_activate_ns(prefix, stack=True)))
+
+
+@pytest.mark.parametrize("shape", PREFIX_SHAPES, ids=_shape_id)
+@pytest.mark.parametrize("plugin", PLUGIN_MODULES)
+def test_get_env_arg_list(benchmark, plugin, shape, prefix_factory, stacked_environ, no_plan_cache):
+    """Measure rendering a plan into shell commands, for plugins that define templates."""
+    syntax = load_plugin(plugin)
+    if syntax.export_var_tmpl is None:
+        pytest.skip(f"{plugin} does not define variable templates")
+
+    stacked_environ(0)
+    activator = PluginActivator(syntax)
+    cmds_dict = activator.parse_and_build(_activate_ns(prefix_factory(*shape)))
+
+    benchmark(lambda: activator._get_env_arg_list(cmds_dict, []))
+
+
+@pytest.mark.parametrize("shape", PREFIX_SHAPES, ids=_shape_id)
+@pytest.mark.parametrize("plugin", PLUGIN_MODULES)
+def test_update_env_map(benchmark, plugin, shape, prefix_factory, stacked_environ, no_plan_cache):
+    """Measure creating the environment mapping passed to os.execve."""
+    stacked_environ(0)
+    activator = PluginActivator(load_plugin(plugin))
+    cmds_dict = activator.parse_and_build(_activate_ns(prefix_factory(*shape)))
+
+    benchmark(activator.update_env_map, cmds_dict)
+
+
+@pytest.mark.parametrize("shape", PREFIX_SHAPES, ids=_shape_id)
+@pytest.mark.parametrize("plugin", PLUGIN_MODULES)
+def test_execute(benchmark, plugin, shape, prefix_factory, stacked_environ, no_plan_cache, mocker, capsys):
+    """Measure `conda shell -n <PLUGIN> activate <PREFIX>` end to end, without replacing the process."""
+    mocker.patch("os.execve")
+    mocker.patch("os.execv")
+    prefix = prefix_factory(*shape)
+    stacked_environ(0)
+    # plugins that are not built into condact.cli must already be registered to be found
+    update_plugin_manager([import_module(f"condact.plugins.{plugin}")], plugin)
+    benchmark.extra_info.update(packages=shape[0], scripts=shape[1])
+
+    def run():
+        try:
+            execute(["-n", plugin, "activate", prefix])
+        except SystemExit:
+            pass
+
+    benchmark.pedantic(run, rounds=10)
+    capsys.readouterr()
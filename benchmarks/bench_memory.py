@@ -0,0 +1,92 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Memory benchmarks for building an os.exec* activation in a large process environment:
+
+    pytest benchmarks/bench_memory.py --benchmark-json=bench.json
+
+The peak memory allocated (measured with tracemalloc) is stored in each benchmark's
+extra_info, next to the peak of the previous approach, which copied os.environ in
+PluginActivator.__init__, _Activator.__init__ and update_env_map.
+"""
+from __future__ import annotations
+
+import os
+import tracemalloc
+from argparse import Namespace
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from condact.logic import PluginActivator
+
+from .conftest import load_plugin
+
+# (number of extra variables, length of each value), e.g. module systems exporting long paths
+ENVIRON_SHAPES = ((100, 100), (2000, 1000))
+
+
+def _environ_id(shape: tuple[int, int]) -> str:
+    return "vars{}-len{}".format(*shape)
+
+
+@pytest.fixture
+def large_environ(monkeypatch):
+    """Return a function adding count variables with values of the given length to os.environ."""
+
+    def apply(count: int, length: int) -> None:
+        for i in range(count):
+            monkeypatch.setenv(f"CONDACT_BENCH_{i}", str(i % 10) * length)
+
+    return apply
+
+
+def _peak(func) -> int:
+    """Return the peak memory allocated in bytes while running func."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _copying_activation(activator: PluginActivator, cmds_dict: dict) -> dict:
+    """Apply cmds_dict the way activation did before EnvOverlay: three copies of os.environ."""
+    activator.environ = os.environ.copy()
+    activator._activator.environ = os.environ.copy()
+    env_map = os.environ.copy()
+    for key in cmds_dict["unset_vars"]:
+        env_map.pop(str(key), None)
+    for group in ("set_vars", "export_path", "export_vars"):
+        env_map.update({str(k): str(v) for k, v in cmds_dict.get(group, {}).items()})
+    return env_map
+
+
+@pytest.mark.parametrize("shape", ENVIRON_SHAPES, ids=_environ_id)
+def test_activation_peak_memory(benchmark, shape, large_environ, prefix_factory, stacked_environ, no_plan_cache):
+    """Measure the peak memory of building and materializing an activation environment."""
+    stacked_environ(0)
+    large_environ(*shape)
+    syntax = load_plugin("posix_ose")
+    prefix = prefix_factory(100, 50)
+    args = Namespace(command="activate", env=prefix, dev=False, stack=False)
+
+    def overlay():
+        activator = PluginActivator(syntax)
+        return activator.update_env_map(activator.parse_and_build(args)).materialize()
+
+    def copying():
+        activator = PluginActivator(syntax)
+        return _copying_activation(activator, activator.parse_and_build(args))
+
+    assert overlay() == copying()
+    benchmark.extra_info.update(
+        variables=shape[0],
+        value_length=shape[1],
+        peak_bytes=_peak(overlay),
+        copying_peak_bytes=_peak(copying),
+    )
+
+    benchmark(overlay)
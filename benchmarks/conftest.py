@@ -0,0 +1,97 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import json
+import os
+import pkgutil
+from importlib import import_module
+from typing import Callable
+
+import pytest
+
+import condact.plugins
+
+# names of every plugin module shipped in condact/plugins
+PLUGIN_MODULES = sorted(module.name for module in pkgutil.iter_modules(condact.plugins.__path__))
+
+# script extensions used by the shipped plugins; synthetic scripts are created for each of them
+SCRIPT_EXTENSIONS = (".sh", ".csh", ".fish", ".ps1")
+
+
+def make_prefix(root: str, packages: int, scripts: int) -> str:
+    """
+    Create a synthetic environment prefix at root with the given number of conda-meta
+    package records and of activate.d/deactivate.d scripts per script extension.
+    """
+    conda_meta = os.path.join(root, "conda-meta")
+    os.makedirs(conda_meta, exist_ok=True)
+    os.makedirs(os.path.join(root, "bin"), exist_ok=True)
+    with open(os.path.join(conda_meta, "history"), "w") as fh:
+        fh.write("==> 2023-01-01 00:00:00 <==\n")
+
+    for i in range(packages):
+        with open(os.path.join(conda_meta, f"pkg{i}-1.0-0.json"), "w") as fh:
+            json.dump({"name": f"pkg{i}", "version": "1.0", "build": "0"}, fh)
+
+    for directory in ("activate.d", "deactivate.d"):
+        path = os.path.join(root, "etc", "conda", directory)
+        os.makedirs(path, exist_ok=True)
+        for i in range(scripts):
+            for ext in SCRIPT_EXTENSIONS:
+                with open(os.path.join(path, f"pkg{i}{ext}"), "w") as fh:
+                    fh.write("\n")
+
+    return root
+
+
+@pytest.fixture(scope="session")
+def prefix_factory(tmp_path_factory) -> Callable[[int, int], str]:
+    """Return a function creating (once per shape) a synthetic prefix with packages and scripts."""
+    prefixes = {}
+
+    def factory(packages: int, scripts: int) -> str:
+        if (packages, scripts) not in prefixes:
+            root = tmp_path_factory.mktemp(f"env-{packages}-{scripts}")
+            prefixes[packages, scripts] = make_prefix(str(root), packages, scripts)
+        return prefixes[packages, scripts]
+
+    return factory
+
+
+@pytest.fixture
+def stacked_environ(prefix_factory, monkeypatch) -> Callable[[int], None]:
+    """
+    Return a function that sets up the environment as if depth environments were
+    already activated (stacked) on top of each other.
+    """
+
+    def apply(depth: int) -> None:
+        path = os.environ.get("PATH", "")
+        monkeypatch.setenv("CONDA_SHLVL", str(depth))
+        monkeypatch.delenv("CONDA_PREFIX", raising=False)
+        for level in range(depth):
+            prefix = prefix_factory(0, 0) + f"-stack{level}"
+            os.makedirs(os.path.join(prefix, "conda-meta"), exist_ok=True)
+            path = os.path.join(prefix, "bin") + os.pathsep + path
+            if level:
+                monkeypatch.setenv(f"CONDA_PREFIX_{level}", os.environ["CONDA_PREFIX"])
+                monkeypatch.setenv(f"CONDA_STACKED_{level + 1}", "true")
+            monkeypatch.setenv("CONDA_PREFIX", prefix)
+        monkeypatch.setenv("PATH", path)
+
+    return apply
+
+
+@pytest.fixture
+def no_plan_cache(monkeypatch) -> None:
+    """Disable the activation plan cache, so that every build walks the prefix."""
+    monkeypatch.setenv("CONDACT_NO_CACHE", "1")
+
+
+def load_plugin(name: str):
+    """Import a plugin module from condact/plugins and return its shell plugin hook."""
+    from condact.registry import resolve_shell_plugin
+
+    module = import_module(f"condact.plugins.{name}")
+    return resolve_shell_plugin(next(iter(module.conda_shells())))
@@ -0,0 +1,81 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+asyncio API for building activation plans from event-loop hosts.
+
+    from condact import aio
+
+    plan = await aio.build_activate("env1", plugin="posix_ose", timeout=10)
+    env = await aio.build_activate("env1", materialize=True)
+
+Building a plan reads the prefix, its conda-meta and activate.d directories (and conda's
+configuration, the first time), which can be slow on network file systems, so builds run
+in an executor (the loop's default executor unless one is given) and never block the loop.
+Concurrent requests with the same arguments share one in-flight build. Cancelling a request,
+or its timeout expiring, only stops waiting for it: the build itself cannot be interrupted,
+completes in the background for the other requests, and its plan is stored in the plan cache.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+from concurrent.futures import Executor
+from typing import Mapping
+
+from . import api
+
+# in-flight builds, by event loop and build arguments
+_inflight: dict[tuple, asyncio.Future] = {}
+
+
+def _forget(key: tuple, future: asyncio.Future) -> None:
+    """Remove a finished build from the in-flight builds."""
+    if _inflight.get(key) is future:
+        del _inflight[key]
+    # every request may have given up; retrieve the error so that it is not reported as lost
+    if not future.cancelled():
+        future.exception()
+
+
+def _build(
+    plugin: str, env_name_or_prefix: str | None, stack: bool, environ: dict[str, str], materialize: bool
+) -> dict:
+    """Build the plan in the executor, loading the shell plugin first if needed."""
+    syntax = api.get_shell_plugin(plugin)
+    return api.build_plan(syntax, env_name_or_prefix, stack=stack, environ=environ, materialize=materialize)
+
+
+async def build_activate(
+    env_name_or_prefix: str | None = None,
+    plugin: str = api.DEFAULT_PLUGIN,
+    *,
+    stack: bool = False,
+    environ: Mapping[str, str] | None = None,
+    materialize: bool = False,
+    timeout: float | None = None,
+    executor: Executor | None = None,
+) -> dict:
+    """
+    Build the activation plan of an environment (default: base) with the shell plugin,
+    against environ (default: os.environ) in executor, and return it. If materialize is true,
+    return the environment mapping for os.execve instead of the plan.
+    Requests are coalesced when they are made from the same event loop with the same
+    arguments, including the environment name or prefix as given.
+    Raise asyncio.TimeoutError if the plan is not built within timeout seconds, and the
+    error of the build if it fails.
+    """
+    loop = asyncio.get_running_loop()
+    environ = dict(os.environ if environ is None else environ)
+    key = (loop, plugin, env_name_or_prefix, bool(stack), materialize, tuple(sorted(environ.items())))
+
+    future = _inflight.get(key)
+    if future is None:
+        build = functools.partial(_build, plugin, env_name_or_prefix, bool(stack), environ, materialize)
+        future = _inflight[key] = loop.run_in_executor(executor, build)
+        future.add_done_callback(functools.partial(_forget, key))
+
+    # shielded, so that one request giving up does not cancel the build for the others
+    result = await asyncio.wait_for(asyncio.shield(future), timeout)
+    # the environment mapping is mutable, and shared with the other requests
+    return dict(result) if materialize else result
@@ -0,0 +1,240 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Python API for building activation plans without going through ``conda shell``.
+
+    from condact.api import build_many
+
+    plans = build_many(["env1", "env2", "/path/to/env3"], plugin="posix_ose")
+    env_maps = build_many(["env1", "env2"], plugin="posix_ose", materialize=True)
+
+conda's context and the shell plugin registry are loaded once per process and shared by
+every build; plans are built on a thread pool. conda reads the environment being activated
+from os.environ, so plans for any other environment are built by conda in worker processes
+(see condact.logic._call_activator), and os.environ is never modified.
+
+Tools that activate environments over and over (IDEs, notebook servers, job runners) can
+keep an ActivationSession instead, which tracks the environment of the processes it starts:
+
+    session = ActivationSession("posix_ose")
+    plan = session.activate("env1")
+    subprocess.run(["python"], env=session.environ)
+    env = session.env_for("env2")
+
+Its methods return plans and environments, and never exit or replace the process. The
+session reloads conda's context only when the condarc files change.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Mapping
+
+from conda.base.constants import SEARCH_PATH
+from conda.base.context import context
+
+from .fingerprint import is_current
+from .logic import PluginActivator, plan_context
+from .plan import ActivationPlan
+from .shell_types import CondaShellPlugins
+
+DEFAULT_PLUGIN = "posix_ose"
+
+_syntax_lock = threading.Lock()
+_syntaxes: dict[str, CondaShellPlugins] = {}
+
+
+def get_shell_plugin(plugin: str = DEFAULT_PLUGIN) -> CondaShellPlugins:
+    """
+    Return the shell plugin hook with the given name. The plugin manager (and conda's
+    context) is loaded the first time a plugin is requested and reused afterwards.
+    Raise PluginError if the plugin cannot be found.
+    """
+    with _syntax_lock:
+        syntax = _syntaxes.get(plugin)
+        if syntax is None:
+            from .cli import load_plugin_modules
+            from .shell_manager import get_shell_syntax, update_plugin_manager
+
+            pm = update_plugin_manager(load_plugin_modules(plugin), plugin)
+            syntax = _syntaxes[plugin] = get_shell_syntax(pm, plugin)
+        return syntax
+
+
+def build_plan(
+    syntax: CondaShellPlugins,
+    env_name_or_prefix: str | None,
+    *,
+    stack: bool = False,
+    environ: Mapping[str, str] | None = None,
+    materialize: bool = False,
+) -> dict:
+    """
+    Build the activation plan of one environment with the shell plugin, against environ
+    (default: os.environ). If materialize is true, return the environment mapping for
+    os.execve instead of the plan.
+    """
+    activator = PluginActivator(syntax, environ)
+    args = argparse.Namespace(command="activate", env=env_name_or_prefix, dev=False, stack=stack)
+    cmds_dict = activator.parse_and_build(args)
+    if materialize:
+        return activator.update_env_map(cmds_dict).materialize()
+    return cmds_dict
+
+
+def build_many(
+    envs: Iterable[str],
+    plugin: str = DEFAULT_PLUGIN,
+    *,
+    stack: bool = False,
+    dev: bool = False,
+    environ: Mapping[str, str] | None = None,
+    max_workers: int | None = None,
+    materialize: bool = False,
+    return_exceptions: bool = False,
+) -> dict[str, dict]:
+    """
+    Build the activation plans of many environments (names or prefixes) with one shell
+    plugin, on a thread pool. Every plan is built against environ (default: os.environ), as if
+    each environment were activated from the same shell.
+
+    Return a dict mapping each environment, as given, to its plan, or to its environment
+    mapping for os.execve if materialize is true. If building a plan fails, the first error
+    (in the order of envs) is raised once every build has finished, unless return_exceptions
+    is true, in which case the exception is returned in place of the plan.
+    """
+    envs = list(dict.fromkeys(envs))
+    syntax = get_shell_plugin(plugin)
+
+    def build(env: str) -> dict:
+        return build_plan(syntax, env, stack=stack, environ=environ, materialize=materialize)
+
+    # the builds run concurrently, within one block fixing the context settings
+    with plan_context(dev), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {env: executor.submit(build, env) for env in envs}
+
+    results = {}
+    for env, future in futures.items():
+        error = future.exception()
+        if error is not None and not return_exceptions:
+            raise error
+        results[env] = error if error is not None else future.result()
+    return results
+
+
+def condarc_files() -> list[str]:
+    """
+    Return the paths of the condarc files that conda reads its configuration from, as
+    found on its search path: the files and the ``condarc.d`` directories that exist, and
+    the YAML files in those directories.
+    """
+    paths = []
+    for entry in SEARCH_PATH:
+        path = entry.replace("$CONDA_ROOT", context.root_prefix)
+        path = os.path.expanduser(os.path.expandvars(path))
+        if "$" in path or not os.path.exists(path):
+            continue
+        paths.append(os.path.normpath(path))
+        if os.path.isdir(path):
+            paths += sorted(glob.glob(os.path.join(path, "*.yml")) + glob.glob(os.path.join(path, "*.yaml")))
+    return paths
+
+
+def condarc_state() -> tuple:
+    """Return the paths, sizes and modification times of the condarc files, for comparison."""
+    state = []
+    for path in condarc_files():
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        state.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(state)
+
+
+class ActivationSession:
+    """
+    A long-lived activation session for tools embedding condact.
+
+    The session loads conda's context and the shell plugin registry once, and reloads them
+    only when the condarc files change. It tracks the environment of the processes it
+    starts in ``environ``, initially a copy of the given environment (default: os.environ):
+    activate, deactivate and reactivate build their plan against it, apply the plan to it
+    and return the plan. The deactivate.d and activate.d scripts listed in the plans are not
+    run; that is up to the caller.
+    """
+
+    def __init__(self, plugin: str = DEFAULT_PLUGIN, environ: Mapping[str, str] | None = None):
+        self.plugin = plugin
+        self.environ: dict[str, str] = dict(os.environ if environ is None else environ)
+        self._lock = threading.RLock()
+        self._syntax: CondaShellPlugins | None = None
+        self._condarc_state: tuple | None = None
+
+    @property
+    def syntax(self) -> CondaShellPlugins:
+        """
+        Return the shell plugin hook of the session, loading conda's context and the plugin
+        registry again if the condarc files changed since they were loaded.
+        Raise PluginError if the plugin cannot be found.
+        """
+        with self._lock:
+            state = condarc_state()
+            if self._syntax is None or state != self._condarc_state:
+                from .cli import load_plugin_modules
+                from .shell_manager import get_shell_syntax, update_plugin_manager
+
+                pm = update_plugin_manager(load_plugin_modules(self.plugin), self.plugin)
+                self._syntax = get_shell_syntax(pm, self.plugin)
+                self._condarc_state = state
+            return self._syntax
+
+    def _build(
+        self, command: str, env_name_or_prefix: str | None = None, stack: bool = False
+    ) -> tuple[ActivationPlan, dict[str, str]]:
+        """
+        Return the plan of command against environ, and the environment it results in.
+        condact's own settings still come from the process environment.
+        """
+        activator = PluginActivator(self.syntax, self.environ)
+        args = argparse.Namespace(command=command, env=env_name_or_prefix, dev=False, stack=stack)
+        with plan_context():
+            plan = ActivationPlan.from_mapping(activator.parse_and_build(args))
+        return plan, activator.update_env_map(plan).materialize()
+
+    def activate(self, env_name_or_prefix: str | None = None, stack: bool = False) -> ActivationPlan:
+        """
+        Activate an environment (default: base) in the session, stacked on the active one
+        if stack is true. Return the plan.
+        """
+        with self._lock:
+            plan, self.environ = self._build("activate", env_name_or_prefix, stack)
+            return plan
+
+    def deactivate(self) -> ActivationPlan:
+        """Deactivate the active environment of the session. Return the plan."""
+        with self._lock:
+            plan, self.environ = self._build("deactivate")
+            return plan
+
+    def reactivate(self) -> ActivationPlan:
+        """
+        Reactivate the active environment of the session, after its packages changed.
+        Return the plan, which is empty if the environment did not change.
+        """
+        with self._lock:
+            if is_current(self.environ):
+                return ActivationPlan()
+            plan, self.environ = self._build("reactivate")
+            return plan
+
+    def env_for(self, env_name_or_prefix: str | None = None, stack: bool = False) -> dict[str, str]:
+        """
+        Return the environment for starting a process in an environment (default: base),
+        activated from the session's environment, without changing the session.
+        """
+        with self._lock:
+            return self._build("activate", env_name_or_prefix, stack)[1]
@@ -0,0 +1,256 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Persistent on-disk cache for activation plans (the dictionaries built by
+``_Activator._build_activate_stack``), stored in the format of condact.plan_format.
+
+A shared, read-only tier can be configured next to the per-user cache by pointing
+``CONDACT_SHARED_CACHE_DIR`` at a directory that administrators populate with
+``conda shell cache warm`` (for example on a cluster where many users activate the same
+centrally managed environments). Lookups fall back to the shared tier on a miss in the
+per-user cache, and never write to it. The shared directory and its entries are only
+read if they are owned by root or the current user and not writable by group or others.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Iterable, Mapping
+
+from . import plan_format
+from .paths import is_trusted, user_cache_dir
+from .plan import ActivationPlan
+
+DEFAULT_MAX_ENTRIES = 256
+
+SHARED_DIR_VAR = "CONDACT_SHARED_CACHE_DIR"
+
+# variable of the plans in a shared cache holding, as JSON, how to rebuild the parts of the
+# plan that depend on the user's shell (see condact.logic.warm_shared_cache)
+SHARED_TEMPLATE_VAR = "_CONDACT_SHARED_TEMPLATE"
+
+# variables of the shell that plans in a shared cache are rebuilt for on load, and that
+# their keys therefore leave out
+USER_VARIABLES = ("PATH", "PS1", "prompt")
+
+# permission bits of the entries of a shared cache, which other users read
+SHARED_ENTRY_MODE = 0o644
+
+ENTRY_SUFFIX = ".plan"
+
+# suffixes of the entries managed by stats, clear and eviction: entries written before plans
+# were stored in binary format are no longer read, but are still cleaned up
+_ENTRY_SUFFIXES = (ENTRY_SUFFIX, ".json")
+
+# paths (relative to the prefix) whose state determines the activation plan of an environment
+_FINGERPRINT_PATHS = (
+    "conda-meta",
+    os.path.join("conda-meta", "history"),
+    os.path.join("conda-meta", "state"),
+    os.path.join("etc", "conda", "activate.d"),
+    os.path.join("etc", "conda", "deactivate.d"),
+)
+
+
+def prefix_fingerprint(prefix: str) -> str:
+    """
+    Return a fingerprint of the prefix state that the activation plan depends on:
+    the conda-meta directory and its history and state files, plus the activate.d
+    and deactivate.d directories. Only ``stat`` is used, so this is cheap even on NFS.
+    """
+    digest = hashlib.sha1(prefix.encode())
+    for relpath in _FINGERPRINT_PATHS:
+        try:
+            st = os.stat(os.path.join(prefix, relpath))
+        except OSError:
+            digest.update(b"-")
+            continue
+        digest.update(f"{relpath}:{st.st_mtime_ns}:{st.st_size};".encode())
+    return digest.hexdigest()
+
+
+def state_variables(prefix: str) -> tuple[str, ...]:
+    """
+    Return the names of the variables that activating the prefix sets (configured with
+    ``conda env config vars``), read from its conda-meta/state file. Activation saves the
+    current values of these variables, to be restored on deactivation.
+    """
+    try:
+        with open(os.path.join(prefix, "conda-meta", "state")) as fh:
+            env_vars = json.load(fh).get("env_vars")
+    except (OSError, ValueError, AttributeError):
+        return ()
+    return tuple(sorted(env_vars)) if isinstance(env_vars, dict) else ()
+
+
+def _is_plan_variable(key: str) -> bool:
+    """Return True if the environment variable can change the result of an activation build."""
+    return key in ("PATH", "PS1", "prompt") or key.startswith(("CONDA_", "_CE_", "__CONDA_SHLVL_"))
+
+
+def plan_variables(environ: Mapping[str, str]) -> dict[str, str]:
+    """
+    Return the environment variables of environ that ``_build_activate_stack`` reads:
+    ``PATH``, the prompt variables and all conda-owned variables, including the values
+    saved by activations for deactivation to restore.
+    """
+    return {k: v for k, v in environ.items() if _is_plan_variable(k)}
+
+
+def environ_digest(environ: Mapping[str, str], exclude: Iterable[str] = ()) -> str:
+    """
+    Return a digest of the plan variables of environ (see plan_variables), leaving out the
+    variables named in exclude.
+    """
+    exclude = frozenset(exclude)
+    items = sorted((k, v) for k, v in plan_variables(environ).items() if k not in exclude)
+    return hashlib.sha1(json.dumps(items).encode()).hexdigest()
+
+
+class PlanCache:
+    """
+    A directory of activation plans stored in binary format, one file per key, with
+    least-recently-used eviction once ``max_entries`` is exceeded.
+
+    Reads do not take any locks; writes go to a temporary file which is then
+    renamed into place, so concurrent shells never observe a partial entry.
+
+    A shared cache is managed by its administrators: its entries are readable by everyone,
+    hits do not touch them and nothing is evicted. Keys include the prefix fingerprint, so
+    an entry is never found once its environment has changed. Entries that another user
+    could have written (see condact.paths.is_trusted) are not read.
+    """
+
+    def __init__(
+        self, directory: str | None = None, max_entries: int = DEFAULT_MAX_ENTRIES, shared: bool = False
+    ):
+        self.directory = directory or os.path.join(user_cache_dir(), "plans")
+        self.max_entries = max_entries
+        self.shared = shared
+
+    @classmethod
+    def from_environ(cls) -> PlanCache | None:
+        """
+        Return the plan cache configured by the environment, or None if ``CONDACT_NO_CACHE``
+        is set. ``CONDACT_CACHE_SIZE`` sets the maximum number of entries.
+        """
+        if os.environ.get("CONDACT_NO_CACHE"):
+            return None
+        try:
+            max_entries = int(os.environ.get("CONDACT_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+        except ValueError:
+            max_entries = DEFAULT_MAX_ENTRIES
+        return cls(max_entries=max_entries)
+
+    @classmethod
+    def shared_from_environ(cls) -> PlanCache | None:
+        """
+        Return the shared cache configured by ``CONDACT_SHARED_CACHE_DIR``, or None if it is
+        not set or ``CONDACT_NO_CACHE`` is set.
+        """
+        directory = os.environ.get(SHARED_DIR_VAR)
+        if not directory or os.environ.get("CONDACT_NO_CACHE"):
+            return None
+        return cls(os.path.abspath(os.path.expanduser(directory)), shared=True)
+
+    @staticmethod
+    def key(*parts: object) -> str:
+        """Return the cache key for the given parts (prefix, plugin name, stack flag, ...)."""
+        return hashlib.sha256(json.dumps([str(p) for p in parts]).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def _entries(self) -> Iterable[os.DirEntry]:
+        try:
+            return [e for e in os.scandir(self.directory) if e.name.endswith(_ENTRY_SUFFIXES)]
+        except OSError:
+            return []
+
+    def get(self, key: str) -> ActivationPlan | None:
+        """
+        Return the cached plan for key, or None if there is no (readable) entry, or, if the
+        cache is shared, no trusted one.
+        A hit refreshes the entry's modification time, which is what eviction is based on,
+        unless the cache is shared.
+        """
+        path = self._path(key)
+        if self.shared and not (is_trusted(self.directory) and is_trusted(path)):
+            return None
+        try:
+            plan = plan_format.load(path)
+        except (OSError, plan_format.PlanFormatError):
+            return None
+
+        if self.shared:
+            return plan
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return plan
+
+    def write(self, key: str, plan: Mapping) -> None:
+        """Store plan under key, without eviction. Raise OSError if it cannot be written."""
+        plan_format.dump(plan, self._path(key), SHARED_ENTRY_MODE if self.shared else None)
+
+    def put(self, key: str, plan: Mapping) -> None:
+        """
+        Store plan under key, then evict the least recently used entries if the cache is full
+        (and not shared). Failure to write is not an error; the plan is simply not cached.
+        """
+        try:
+            self.write(key, plan)
+        except OSError:
+            return
+
+        if not self.shared:
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = self._entries()
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+
+        def mtime(entry: os.DirEntry) -> float:
+            try:
+                return entry.stat().st_mtime
+            except OSError:
+                return 0
+
+        for entry in sorted(entries, key=mtime)[:excess]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Return the location, size limit, number of entries and total size of the cache."""
+        entries = self._entries()
+        size = 0
+        for entry in entries:
+            try:
+                size += entry.stat().st_size
+            except OSError:
+                pass
+        return {
+            "directory": self.directory,
+            "max_entries": self.max_entries,
+            "entries": len(entries),
+            "bytes": size,
+        }
+
+    def clear(self) -> int:
+        """Remove every entry from the cache. Return the number of entries removed."""
+        removed = 0
+        for entry in self._entries():
+            try:
+                os.unlink(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
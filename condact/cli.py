@@ -3,29 +3,50 @@
 from __future__ import annotations
 
 import argparse
+import os
 import sys
+from importlib import import_module
+from types import ModuleType
+from typing import TYPE_CHECKING, Mapping
 
-from conda.exceptions import conda_exception_handler
+# conda.plugins is already loaded when conda discovers this module, so importing it is free;
+# everything else is imported only by the code path that needs it, to keep startup fast
 from conda.plugins import CondaSubcommand, hookimpl
 
-from .shell_manager import update_plugin_manager, get_shell_syntax
-from .logic import PluginActivator, _ActivatorChild
-import condact.plugins.bash_ose as bash_ose
-import condact.plugins.posix_cl as posix_cl
-import condact.plugins.posix_ose as posix_ose
+try:
+    from conda.plugins import CondaPostCommand
+except ImportError:  # conda releases without post-command plugin hooks
+    CondaPostCommand = None
 
-PLUGINS = [
-    bash_ose,
-    posix_cl,
-    posix_ose,
-]
+from . import trace
+
+if TYPE_CHECKING:
+    from .environ import EnvOverlay
+    from .logic import _ActivatorChild
+
+# names of the plugin modules shipped in condact.plugins, which match the names of their plugins
+PLUGINS = (
+    "bash_ose",
+    "posix_cl",
+    "posix_ose",
+)
+
+
+def load_plugin_modules(plugin_name: str | None = None) -> list[ModuleType]:
+    """
+    Import and return the built-in plugin modules. If plugin_name names a built-in plugin,
+    only that module is imported.
+    """
+    names = [plugin_name] if plugin_name in PLUGINS else PLUGINS
+    return [import_module(f"condact.plugins.{name}") for name in names]
 
 
 def get_parsed_args(argv: list[str]) -> argparse.Namespace:
     """
     Parse CLI arguments to determine desired command.
     Create namespace with 'command' key, optional 'dev' key and, for activate only,
-    optional 'env' and 'stack' keys.
+    optional 'env' and 'stack' keys. For run, the command to run (everything after '--')
+    is stored in the 'argv' key.
     """
     parser = argparse.ArgumentParser(
         "conda shell",
@@ -38,11 +59,41 @@ def get_parsed_args(argv: list[str]) -> argparse.Namespace:
         action='store',
         help='The name of the conda shell plugin to use'
     )
+    parser.add_argument(
+        '--trace',
+        metavar='PATH',
+        default=None,
+        help='Append per-phase timings to PATH as JSON lines (same as setting CONDACT_TRACE)',
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        default=False,
+        help='Print results as JSON; activate, deactivate and reactivate print the activation '
+        'plan and the resulting environment changes instead of activating',
+    )
     add_subparsers(parser)
 
-    
+    # split off the command given to run after '--', so that it is never taken for an option
+    # or for the environment name
+    command_argv = None
+    if "--" in argv and "run" in argv[: argv.index("--")]:
+        split = argv.index("--")
+        argv, command_argv = argv[:split], argv[split + 1 :]
+
     try:
         args = parser.parse_args(argv)
+        if command_argv is not None:
+            # a '--' following the start of the command belongs to the command
+            args.argv = [*args.argv, "--", *command_argv] if args.argv else command_argv
+        if args.command == "run" and (args.envs or args.all_envs) and args.env is not None:
+            # with --envs or --all, there is no environment argument before the command
+            args.argv = [args.env, *args.argv]
+            args.env = None
+        if args.command == "run" and not args.argv:
+            parser.error("the following arguments are required: command")
+        if args.json and args.command in ("run", "serve", "export"):
+            parser.error(f"--json is not supported by the {args.command} command")
     except SystemExit:
         # SystemExit: help blurb was printed, intercepting SystemExit(0) to avoid
         # plugins using classic activation logic causing the evaluation of help strings
@@ -117,6 +168,134 @@ def add_subparsers(parser: argparse.ArgumentParser) -> None:
         "--dev", action="store_true", default=False, help=argparse.SUPPRESS
     )
 
+    cache = commands.add_parser(
+        "cache",
+        help="Inspect or clear the activation plan cache, or warm the shared cache",
+    )
+    cache.add_argument(
+        "cache_command",
+        choices=("stats", "clear", "warm"),
+        help="'stats' prints information about the cache; 'clear' removes all cached plans "
+        "and script effects; 'warm' writes the plans of the given environments to the shared cache",
+    )
+    cache.add_argument(
+        "envs",
+        metavar="env_name_or_prefix",
+        nargs="*",
+        help="For warm, the environment names or prefixes to build plans for.",
+    )
+
+    run = commands.add_parser(
+        "run",
+        help="Run a command in a conda environment without starting a shell",
+    )
+    run.add_argument(
+        "env",
+        metavar="env_name_or_prefix",
+        default=None,
+        type=str,
+        nargs="?",
+        help="The environment name or prefix to run the command in. Defaults to the base environment.",
+    )
+    run.add_argument(
+        "argv",
+        metavar="-- command",
+        nargs=argparse.REMAINDER,
+        help="The command to run and its arguments.",
+    )
+    run.add_argument(
+        "--dev", action="store_true", default=False, help=argparse.SUPPRESS
+    )
+    targets = run.add_mutually_exclusive_group()
+    targets.add_argument(
+        "--envs",
+        type=lambda value: [env for env in value.split(",") if env],
+        default=None,
+        help="Run the command in each of these comma-separated environment names or prefixes.",
+    )
+    targets.add_argument(
+        "--all",
+        dest="all_envs",
+        action="store_true",
+        default=False,
+        help="Run the command in every environment known to conda.",
+    )
+    run.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="With --envs or --all, the number of environments to run the command in at once "
+        "(default: the number of CPUs).",
+    )
+    run.set_defaults(stack=False)
+
+    compile_parser = commands.add_parser(
+        "compile",
+        help="Write a static activation script for an environment, sourced without starting Python",
+    )
+    compile_parser.add_argument(
+        "env",
+        metavar="env_name_or_prefix",
+        default=None,
+        type=str,
+        nargs="?",
+        help="The environment name or prefix to compile. Defaults to the base environment.",
+    )
+    # also accept the plugin name after the command: conda shell compile -n <PLUGIN> <ENV>
+    compile_parser.add_argument(
+        "-n",
+        "--name",
+        dest="plugin",
+        default=argparse.SUPPRESS,
+        help="The name of the conda shell plugin to use",
+    )
+
+    export_parser = commands.add_parser(
+        "export",
+        help="Write the variables set by activating an environment as a static environment file",
+    )
+    export_parser.add_argument(
+        "env",
+        metavar="env_name_or_prefix",
+        default=None,
+        type=str,
+        nargs="?",
+        help="The environment name or prefix to export. Defaults to the base environment.",
+    )
+    export_parser.add_argument(
+        "--format",
+        dest="output_format",
+        # condact.export.FORMATS, not imported here to keep startup fast
+        choices=("dotenv", "systemd-env", "dockerfile", "systemd", "json", "sbatch"),
+        default="dotenv",
+        help="The format of the environment file (default: dotenv).",
+    )
+    export_parser.add_argument(
+        "--scripts",
+        choices=("capture", "warn"),
+        default="capture",
+        help="Whether to inline the effect of the environment's activate.d scripts, or only "
+        "list them as warnings (default: capture).",
+    )
+    export_parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="Write the environment file to this path instead of standard output.",
+    )
+
+    serve_parser = commands.add_parser(
+        "serve",
+        help="Run the activation daemon used by condact-client",
+    )
+    serve_parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="Exit after this many seconds without a request (default: 900).",
+    )
+
 
 def print_activation_commands(activator: _ActivatorChild) -> int:
     """
@@ -126,17 +305,236 @@ def print_activation_commands(activator: _ActivatorChild) -> int:
     return 0
 
 
+def print_json(data: object) -> None:
+    """Print data to stdout as JSON, on one line."""
+    import json
+
+    print(json.dumps(data, default=str))
+
+
+def print_json_error(error: Exception) -> int:
+    """Print error to stdout as a JSON error object, as conda does with --json. Return 1."""
+    print_json({"exception_name": type(error).__name__, "error": str(error)})
+    return 1
+
+
+def handle_errors(args: argparse.Namespace, func, *func_args) -> int:
+    """
+    Return the exit code of func(*func_args). Errors are reported by conda's exception
+    handler or, with --json, printed as a JSON error object.
+    """
+    if args.json:
+        try:
+            return func(*func_args)
+        except Exception as e:
+            return print_json_error(e)
+
+    from conda.exceptions import conda_exception_handler
+
+    return conda_exception_handler(func, *func_args)
+
+
+def activation_result(command: str, plugin: str, plan: Mapping, env_map: EnvOverlay | None = None) -> dict:
+    """
+    Return the JSON result of an activation command: the plan and the changes it makes to
+    the environment, as recorded by the environment mapping env_map (no changes if None).
+    """
+    from .plan import ActivationPlan
+
+    sets, unsets = env_map.changes() if env_map is not None else ({}, set())
+    return {
+        "command": command,
+        "plugin": plugin,
+        "plan": ActivationPlan.from_mapping(plan).to_dict(),
+        "environment": {"set": sets, "unset": sorted(unsets)},
+    }
+
+
+def print_activation_json(syntax, args: argparse.Namespace) -> int:
+    """
+    Print the activation plan of the command and the environment changes it makes, as JSON,
+    without activating anything. Return 0 if successful; run it with handle_errors, so that
+    errors are printed as JSON too.
+    """
+    from .logic import PluginActivator
+
+    activator = PluginActivator(syntax)
+    plan = activator.parse_and_build(args)
+    print_json(activation_result(args.command, syntax.name, plan, activator.update_env_map(plan)))
+    return 0
+
+
+def run_cache_command(args: argparse.Namespace) -> int:
+    """
+    Print statistics about the plan cache, or clear it along with the script cache.
+    Return 0 if successful.
+    """
+    from .cache import PlanCache
+    from .script_cache import script_cache_dir
+
+    cache = PlanCache.from_environ() or PlanCache()
+
+    if args.cache_command == "clear":
+        removed = cache.clear()
+        removed_scripts = PlanCache(script_cache_dir()).clear()
+        if args.json:
+            print_json({"removed": removed, "removed_scripts": removed_scripts})
+        else:
+            print(f"Removed {removed} cached activation plans and {removed_scripts} cached script effects.")
+    elif args.json:
+        print_json(cache.stats())
+    else:
+        for key, value in cache.stats().items():
+            print(f"{key}: {value}")
+    return 0
+
+
+def run_warm_command(syntax, args: argparse.Namespace) -> int:
+    """
+    Write the activation plans of the environments given on the command line to the shared
+    cache configured by CONDACT_SHARED_CACHE_DIR. Return 0 if successful.
+    """
+    from conda.exceptions import CondaError
+
+    from .cache import SHARED_DIR_VAR, PlanCache
+    from .logic import warm_shared_cache
+
+    cache = PlanCache.shared_from_environ()
+    if cache is None:
+        raise CondaError(f"Set {SHARED_DIR_VAR} to the shared cache directory to warm it.")
+    if not args.envs:
+        raise CondaError("No environments given to warm the shared cache with.")
+
+    try:
+        prefixes = warm_shared_cache(syntax, args.envs, cache)
+    except OSError as err:
+        raise CondaError(f"Could not write to the shared cache in '{cache.directory}': {err}")
+    if args.json:
+        print_json({"directory": cache.directory, "prefixes": prefixes})
+        return 0
+    for prefix in prefixes:
+        print(f"Cached activation plan of {prefix}")
+    return 0
+
+
+def run_compile_command(syntax, args: argparse.Namespace) -> int:
+    """
+    Compile the activation script of an environment and print how to use it. Return 0 if
+    successful.
+    """
+    from .compiled import compile_environment
+
+    path = compile_environment(syntax, args.env)
+    if args.json:
+        print_json({"path": path})
+        return 0
+    print(f"Compiled activation script written to {path}")
+    print(f"Activate the environment with: . {path}")
+    return 0
+
+
+def run_export_command(syntax, args: argparse.Namespace) -> int:
+    """
+    Write the variables set by activating an environment in the requested format, and print
+    warnings about the parts of the activation it does not apply. Return 0 if successful.
+    """
+    from .export import export_environment, export_warnings, render
+    from .paths import write_atomic
+
+    exported = export_environment(syntax, args.env, capture_scripts=args.scripts == "capture")
+    content = render(exported, args.output_format)
+    for message in export_warnings(exported, args.output_format):
+        print(f"warning: {message}", file=sys.stderr)
+
+    if args.output:
+        write_atomic(os.path.abspath(args.output), content, mode=0o644)
+    else:
+        print(content, end="")
+    return 0
+
+
+def run_fanout_command(args: argparse.Namespace) -> int:
+    """
+    Run a command in several environments concurrently. Return 0 if it succeeded in all of
+    them, 1 if not.
+    """
+    from .fanout import all_environments, run_fanout
+
+    envs = all_environments() if args.all_envs else list(dict.fromkeys(args.envs))
+    return run_fanout(args.plugin, envs, args.argv, args.jobs)
+
+
 def execute(argv: list[str]) -> SystemExit:
     """
     Get shell hook from named plugin. Raise error if no shell hooks are found.
-    Run process associated with parsed CLI command (activate, deactivate, reactivate).
+    Run process associated with parsed CLI command (activate, deactivate, reactivate, run).
+    The cache (except for cache warm) and serve commands do not need a shell plugin.
     """
     args = get_parsed_args(argv)
-    pm = update_plugin_manager(PLUGINS)
+    if args.trace:
+        trace.enable(args.trace)
 
-    syntax = get_shell_syntax(pm, args.plugin)
+    with trace.span("cli.execute", command=args.command, plugin=args.plugin):
+        return run_command(args)
+
+
+def run_command(args: argparse.Namespace) -> SystemExit:
+    """
+    Run the process associated with already parsed CLI arguments; see execute.
+    Reactivating an environment that has not changed since it was activated exits at once,
+    without output (or with an empty plan, with --json).
+    """
+    if args.command == "reactivate" and not args.dev:
+        from .fingerprint import is_current
+
+        if is_current(os.environ):
+            if args.json:
+                print_json(activation_result(args.command, args.plugin, {}))
+            return 0
+    if args.command == "cache" and args.cache_command != "warm":
+        return sys.exit(handle_errors(args, run_cache_command, args))
+    if args.command == "serve":
+        from .daemon import serve
+
+        return sys.exit(serve(load_plugin_modules(), args.idle_timeout))
+    if args.command == "run" and (args.envs or args.all_envs):
+        from conda.exceptions import conda_exception_handler
+
+        return sys.exit(conda_exception_handler(run_fanout_command, args))
+
+    from .shell_manager import get_shell_syntax, update_plugin_manager
+
+    if args.json:
+        try:
+            pm = update_plugin_manager(load_plugin_modules(args.plugin), args.plugin)
+            syntax = get_shell_syntax(pm, args.plugin)
+        except Exception as e:
+            return sys.exit(print_json_error(e))
+    else:
+        pm = update_plugin_manager(load_plugin_modules(args.plugin), args.plugin)
+        syntax = get_shell_syntax(pm, args.plugin)
+
+    if args.command == "compile":
+        return sys.exit(handle_errors(args, run_compile_command, syntax, args))
+
+    if args.command == "cache":
+        return sys.exit(handle_errors(args, run_warm_command, syntax, args))
+
+    if args.command == "export":
+        return sys.exit(handle_errors(args, run_export_command, syntax, args))
+
+    if args.json:
+        return sys.exit(handle_errors(args, print_activation_json, syntax, args))
+
+    if args.command == "run":
+        from .logic import PluginActivator
+
+        activator = PluginActivator(syntax)
+        return activator.run(activator.parse_and_build(args), args.argv)
 
     if syntax.osexec:
+        from .logic import PluginActivator
+
         activator = PluginActivator(syntax)
         cmds_dict = activator.parse_and_build(args)
 
@@ -145,6 +543,10 @@ def execute(argv: list[str]) -> SystemExit:
         
         return activator.activate(cmds_dict)
     else:
+        from conda.exceptions import conda_exception_handler
+
+        from .logic import _ActivatorChild
+
         activator = _ActivatorChild(syntax, args)
         return sys.exit(conda_exception_handler(print_activation_commands, activator))
 
@@ -156,3 +558,21 @@ def conda_subcommands():
         summary="Run plugins used for activate, deactivate, and reactivate",
         action=execute,
     )
+
+
+def mark_compiled_scripts_stale(command: str) -> None:
+    """Mark the compiled activation scripts of the prefix changed by a conda command stale."""
+    from .compiled import mark_target_prefix_stale
+
+    mark_target_prefix_stale(command)
+
+
+if CondaPostCommand is not None:
+
+    @hookimpl
+    def conda_post_commands():
+        yield CondaPostCommand(
+            name="condact-compiled-scripts",
+            action=mark_compiled_scripts_stale,
+            run_for={"install", "update", "upgrade", "remove", "uninstall"},
+        )
@@ -0,0 +1,211 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Thin client for the condact activation daemon (``conda shell serve``).
+
+The client sends the request and its environment to the daemon over a Unix socket and
+renders the returned plan with the plugin's templates, or replaces the process for os.exec*
+plugins the same way PluginActivator.activate does (see condact.osexec). It must not import conda: if the daemon cannot be reached, or the plugin needs
+custom activation logic, the client hands over to ``conda shell`` instead.
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import Iterable, Mapping, Sequence
+
+from . import plan_format
+from .environ import EnvOverlay
+from .fingerprint import is_current
+from .osexec import exec_activation, update_env_map
+from .paths import user_runtime_dir
+
+PROTOCOL_VERSION = 3
+
+COMMANDS = ("activate", "deactivate", "reactivate")
+
+
+def socket_path() -> str:
+    """Return the path of the current user's daemon socket."""
+    return os.path.join(user_runtime_dir(), "daemon.sock")
+
+
+def send_message(sock: socket.socket, message: Mapping, payload: bytes = b"") -> None:
+    """
+    Send a message as a single line of JSON, followed by an optional binary payload whose
+    size is recorded in the message.
+    """
+    if payload:
+        message = {**message, "payload_size": len(payload)}
+    sock.sendall(json.dumps(message).encode() + b"\n" + payload)
+
+
+def recv_message(sock: socket.socket) -> dict:
+    """
+    Receive a message sent by send_message and return it, with its binary payload (if any)
+    under the "payload" key.
+    Raise ConnectionError if the connection is closed before a full message arrives.
+    """
+    with sock.makefile("rb") as reader:
+        line = reader.readline()
+        if not line.endswith(b"\n"):
+            raise ConnectionError("Connection closed before a full message was received.")
+        message = json.loads(line)
+
+        size = message.pop("payload_size", 0)
+        if size:
+            payload = reader.read(size)
+            if len(payload) != size:
+                raise ConnectionError("Connection closed before a full message was received.")
+            message["payload"] = payload
+    return message
+
+
+def parse_args(argv: list[str]) -> dict | None:
+    """
+    Parse the same arguments as ``conda shell -n <PLUGIN> {activate,deactivate,reactivate}``.
+    Return None for anything the client does not handle, so that it is passed on to conda.
+    """
+    request = {"plugin": None, "command": None, "env": None, "stack": None, "dev": False}
+    args = list(argv)
+
+    while args:
+        arg = args.pop(0)
+        if arg in ("-n", "--name") and args:
+            request["plugin"] = args.pop(0)
+        elif arg.startswith("--name="):
+            request["plugin"] = arg.split("=", 1)[1]
+        elif request["command"] is None and arg in COMMANDS:
+            request["command"] = arg
+        elif arg == "--dev" and request["command"]:
+            request["dev"] = True
+        elif arg in ("--stack", "--no-stack") and request["command"] == "activate":
+            request["stack"] = arg == "--stack"
+        elif request["command"] == "activate" and request["env"] is None and not arg.startswith("-"):
+            request["env"] = arg
+        else:
+            return None
+
+    if request["command"] is None or request["plugin"] is None:
+        return None
+    return request
+
+
+def request_plan(request: Mapping, environ: Mapping[str, str], timeout: float = 30) -> dict:
+    """
+    Send a plan request to the daemon and return its response, with the plan decoded
+    under the "plan" key.
+    Raise OSError if the daemon cannot be reached, or ValueError if the response is invalid.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path())
+        send_message(sock, {"version": PROTOCOL_VERSION, **request, "environ": dict(environ)})
+        response = recv_message(sock)
+
+    if "payload" in response:
+        response["plan"] = plan_format.loads(response.pop("payload"))
+    return response
+
+
+def yield_commands(plan: Mapping, syntax: Mapping) -> Iterable[str]:
+    """
+    Yield the shell commands for the plan, in the same order as _Activator._yield_commands.
+    """
+    for key, value in sorted(plan.get("export_path", {}).items()):
+        yield syntax["export_var_tmpl"] % (key, value)
+    for script in plan.get("deactivate_scripts", ()):
+        yield syntax["run_script_tmpl"] % script
+    for key in plan.get("unset_vars", ()):
+        yield syntax["unset_var_tmpl"] % key
+    for key, value in plan.get("set_vars", {}).items():
+        yield syntax["set_var_tmpl"] % (key, value)
+    for key, value in plan.get("export_vars", {}).items():
+        yield syntax["export_var_tmpl"] % (key, value)
+    for script in plan.get("activate_scripts", ()):
+        yield syntax["run_script_tmpl"] % script
+
+
+def render(plan: Mapping, syntax: Mapping) -> str:
+    """
+    Return the shell commands for the plan, as _Activator._finalize does: either the
+    commands themselves or, for plugins with a tempfile extension, the path of a file
+    containing them.
+    """
+    commands = syntax["command_join"].join((*yield_commands(plan, syntax), ""))
+    if not syntax.get("tempfile_extension"):
+        return commands
+
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=syntax["tempfile_extension"], delete=False
+    ) as tf:
+        tf.write(commands)
+    return tf.name
+
+
+def apply_plan(plan: Mapping, environ: Mapping[str, str]) -> dict:
+    """Return a copy of environ updated with the plan, as PluginActivator.update_env_map does."""
+    return update_env_map(plan, environ).materialize()
+
+
+def exec_plan(plan: Mapping, syntax: Mapping, snapshot_scripts: Sequence | None = None) -> int:
+    """
+    Replace the current process with the plugin's script, as PluginActivator.activate does,
+    including the script cache, the snapshot for deactivate and collapse mode.
+    snapshot_scripts are the scripts recorded in the snapshot, as returned by the daemon.
+    Return 0 if the process was handed off to the calling shell (collapse mode).
+    """
+    return exec_activation(
+        plan,
+        EnvOverlay(),
+        syntax["script_path"],
+        syntax["run_script_tmpl"],
+        syntax["command_join"],
+        syntax["script_extension"],
+        snapshot_scripts,
+    )
+
+
+def fallback(argv: list[str]) -> None:
+    """Hand the request over to ``conda shell``, replacing the current process."""
+    conda_exe = os.environ.get("CONDA_EXE", "conda")
+    os.execvp(conda_exe, [conda_exe, "shell", *argv])
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Entry point of the ``condact-client`` command. Accepts the same arguments as ``conda shell``.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    request = parse_args(argv)
+    if request is None:
+        return fallback(argv)
+    if request["command"] == "reactivate" and not request["dev"] and is_current(os.environ):
+        return 0
+
+    try:
+        response = request_plan(request, os.environ)
+    except (OSError, ValueError):
+        return fallback(argv)
+
+    if not response.get("ok"):
+        print(response.get("error", "Unknown error from condact daemon."), file=sys.stderr)
+        return 1
+
+    plan = response["plan"]
+    syntax = response["syntax"]
+
+    if syntax["custom"]:
+        return fallback(argv)
+    if syntax["osexec"]:
+        return exec_plan(plan, syntax, response.get("snapshot_scripts"))
+
+    print(render(plan, syntax), end="")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
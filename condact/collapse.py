@@ -0,0 +1,166 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Collapse mode for the os.exec* plugins, enabled by setting ``CONDACT_COLLAPSE``.
+
+Without it, every activate and deactivate starts a new shell from inside the current one,
+so the chain of shell processes grows with every switch. In collapse mode:
+
+- a shell started by an activation records the shell it was started from (its parent
+  process, CONDA_SHLVL and CONDA_PREFIX) as its ancestor in ``_CONDACT_ANCESTOR``, and is
+  set up to load the conda function of ``scripts/collapse.sh`` (through $ENV for POSIX
+  shells, through the rcfile ``scripts/collapse.bashrc`` for bash);
+- from a shell running that function, ``conda shell`` does not start a new shell but writes
+  a handoff script, which the function sources: it applies the environment changes and
+  replaces the current shell with the new one (``exec``), or, if the activation returns to
+  the state of the ancestor, exits to the ancestor.
+
+The depth of the shell chain is thus at most one above the shell where the first
+environment was activated.
+"""
+from __future__ import annotations
+
+import os
+import shlex
+import sys
+from typing import Mapping, NamedTuple
+
+from .environ import EnvOverlay
+
+COLLAPSE_VAR = "CONDACT_COLLAPSE"
+
+# set by the conda function of FUNCTION_SCRIPT for the conda process it runs
+HANDOFF_VAR = "_CONDACT_HANDOFF"
+SHELL_PPID_VAR = "_CONDACT_SHELL_PPID"
+
+# set in the environment of shells started in collapse mode
+ANCESTOR_VAR = "_CONDACT_ANCESTOR"
+# the user's own $ENV, which FUNCTION_SCRIPT sources in its place
+USER_ENV_VAR = "_CONDACT_USER_ENV"
+# the rcfile that scripts/pose.sh starts bash with
+RCFILE_VAR = "_CONDACT_RCFILE"
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts")
+FUNCTION_SCRIPT = os.path.join(SCRIPTS_DIR, "collapse.sh")
+BASH_RCFILE = os.path.join(SCRIPTS_DIR, "collapse.bashrc")
+
+# shells that read the file named by $ENV when started interactively
+ENV_SHELLS = ("sh", "dash", "ash", "ksh", "mksh", "yash", "posh")
+
+
+class Ancestor(NamedTuple):
+    """The shell a chain of collapsed shells returns to."""
+
+    pid: str
+    shlvl: str
+    prefix: str
+
+    def __str__(self) -> str:
+        return f"{self.pid}:{self.shlvl}:{self.prefix}"
+
+    @classmethod
+    def parse(cls, value: str) -> Ancestor | None:
+        """Return the ancestor recorded in value, or None if value is not a valid record."""
+        parts = value.split(":", 2)
+        return cls(*parts) if len(parts) == 3 else None
+
+
+def enabled(environ: Mapping[str, str]) -> bool:
+    """Return True if collapse mode is enabled in environ."""
+    return bool(environ.get(COLLAPSE_VAR))
+
+
+def shell_state(environ: Mapping[str, str]) -> tuple[str, str]:
+    """Return the CONDA_SHLVL and CONDA_PREFIX that identify the activation state of environ."""
+    return environ.get("CONDA_SHLVL", "0") or "0", environ.get("CONDA_PREFIX", "")
+
+
+def load_function(env_map: EnvOverlay, shell: str) -> bool:
+    """
+    Set up the interactive shell about to be started by scripts/pose.sh in the environment
+    env_map to load the conda function of FUNCTION_SCRIPT: POSIX shells read it through
+    $ENV, bash through BASH_RCFILE. A $ENV already set is kept in USER_ENV_VAR, and
+    FUNCTION_SCRIPT sources it first.
+    Return False if the shell cannot be set up.
+    """
+    name = os.path.basename(shell)
+    if name == "bash":
+        env_map[RCFILE_VAR] = BASH_RCFILE
+        return True
+    if name not in ENV_SHELLS:
+        return False
+
+    env_map.pop(RCFILE_VAR, None)
+    user_env = env_map.get("ENV")
+    if user_env and user_env != FUNCTION_SCRIPT:
+        env_map[USER_ENV_VAR] = user_env
+    env_map["ENV"] = FUNCTION_SCRIPT
+    return True
+
+
+def record_ancestor(environ: Mapping[str, str], env_map: EnvOverlay, shell: str | None = None) -> None:
+    """
+    Record the shell running this process, in the state of environ, as the ancestor in the
+    environment env_map of the shell about to be started. shell, if given, is the shell that
+    scripts/pose.sh starts, which is set up to load the conda function (see load_function);
+    if it cannot be, a warning is printed, as later switches then nest shells unless the
+    user's rc file sources FUNCTION_SCRIPT.
+    """
+    env_map[ANCESTOR_VAR] = str(Ancestor(str(os.getppid()), *shell_state(environ)))
+    if shell is not None and not load_function(env_map, shell):
+        print(
+            f"warning: collapse mode cannot load the conda function into '{shell or '$SHELL'}'; "
+            f"source {FUNCTION_SCRIPT} from its rc file to collapse later switches.",
+            file=sys.stderr,
+        )
+
+
+def render_handoff(handoff: str, environ: Mapping[str, str], env_map: EnvOverlay, argv: list[str]) -> str:
+    """
+    Return the handoff script switching the shell that runs the conda function, in the state
+    of environ, to env_map: it exits to the recorded ancestor if env_map is the ancestor's
+    activation state, and otherwise replaces the shell with argv in env_map.
+    """
+    lines = [f"rm -f {shlex.quote(handoff)}"]
+
+    ancestor = Ancestor.parse(environ.get(ANCESTOR_VAR, ""))
+    if (
+        ancestor is not None
+        and ancestor.pid == environ.get(SHELL_PPID_VAR)
+        and tuple(ancestor[1:]) == shell_state(env_map)
+    ):
+        lines.append("exit 0")
+        return "\n".join(lines) + "\n"
+
+    sets, unsets = env_map.changes()
+    if unsets:
+        lines.append("unset " + " ".join(sorted(unsets)))
+    for key, value in sets.items():
+        lines.append(f"export {key}={shlex.quote(value)}")
+    lines.append("exec " + " ".join(shlex.quote(arg) for arg in argv))
+    return "\n".join(lines) + "\n"
+
+
+def handoff(
+    environ: Mapping[str, str], env_map: EnvOverlay, argv: list[str], shell: str | None = None
+) -> bool:
+    """
+    Hand the shell switch over to the conda function of the calling shell, if collapse mode
+    is enabled and the function is running this process: write the handoff script and
+    return True. Otherwise return False; in collapse mode, the shell about to be started is
+    then set up to collapse later switches. shell is the interactive shell that argv starts
+    (see record_ancestor), or None if argv loads the conda function itself.
+    """
+    if not enabled(environ):
+        return False
+
+    path = environ.get(HANDOFF_VAR)
+    if not path:
+        record_ancestor(environ, env_map, shell)
+        return False
+
+    content = render_handoff(path, environ, env_map, argv)
+    # the function created the file with mktemp; write in place so that it keeps its mode
+    with open(path, "w") as fh:
+        fh.write(content)
+    return True
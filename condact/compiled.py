@@ -0,0 +1,162 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Ahead-of-time compiled activation scripts.
+
+``conda shell -n <PLUGIN> compile <ENV>`` builds the activation plan for an environment once
+and writes it, rendered with the plugin's templates, to ``<prefix>/etc/conda/condact/``.
+Sourcing the compiled script activates the environment without starting Python, as long as:
+
+- the shell starts from the same state the script was compiled in (CONDA_SHLVL,
+  CONDA_PREFIX and PATH are unchanged),
+- conda-meta/history, conda-meta/state (``conda env config vars``), activate.d and
+  deactivate.d are not newer than the script, and have not been created since, and
+- conda has not marked the script stale after an install, update or remove.
+
+Otherwise the script falls back to evaluating ``conda shell -n <PLUGIN> activate <PREFIX>``.
+Only plugins with classic activation logic and POSIX syntax can be compiled.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shlex
+import time
+from glob import glob
+from typing import Mapping
+
+from conda.base.context import context
+from conda.exceptions import CondaError
+
+from .logic import PluginActivator, _locate_prefix
+from .paths import write_atomic
+from .shell_types import CondaShellPlugins
+
+# variables of the shell that the compiled plan depends on
+GUARDED_VARS = ("CONDA_SHLVL", "CONDA_PREFIX", "PATH")
+
+# paths whose modification makes the compiled script out of date, relative to the prefix
+WATCHED_PATHS = (
+    os.path.join("conda-meta", "history"),
+    os.path.join("conda-meta", "state"),
+    os.path.join("etc", "conda", "activate.d"),
+    os.path.join("etc", "conda", "deactivate.d"),
+)
+
+STALE_SUFFIX = ".stale"
+
+
+def compiled_dir(prefix: str) -> str:
+    """Return the directory holding the compiled activation scripts of a prefix."""
+    return os.path.join(prefix, "etc", "conda", "condact")
+
+
+def compiled_script_path(prefix: str, syntax: CondaShellPlugins) -> str:
+    """Return the path of the compiled activation script of a prefix for a shell plugin."""
+    return os.path.join(compiled_dir(prefix), syntax.name + syntax.script_extension)
+
+
+def check_compilable(syntax: CondaShellPlugins) -> None:
+    """Raise CondaError if activation scripts cannot be compiled for the shell plugin."""
+    if syntax.osexec:
+        raise CondaError(
+            f"Shell plugin '{syntax.name}' starts a new shell on activation; "
+            "only plugins with classic activation logic can be compiled."
+        )
+    if syntax.script_extension != ".sh":
+        raise CondaError(f"Shell plugin '{syntax.name}' does not use POSIX syntax and cannot be compiled.")
+
+
+def render_compiled_script(
+    syntax: CondaShellPlugins,
+    prefix: str,
+    cmds_dict: dict,
+    environ: Mapping[str, str],
+) -> str:
+    """
+    Return the text of a compiled activation script for the plan cmds_dict, which was built
+    for prefix in environ.
+    """
+    activator = PluginActivator(syntax, environ)
+    commands = activator._get_env_arg_list(cmds_dict, [])
+    script = compiled_script_path(prefix, syntax)
+
+    conditions = [f"[ ! -e {shlex.quote(script + STALE_SUFFIX)} ]"]
+    for path in WATCHED_PATHS:
+        path = os.path.join(prefix, path)
+        if os.path.exists(path):
+            conditions.append(f"[ ! {shlex.quote(path)} -nt {shlex.quote(script)} ]")
+        else:
+            conditions.append(f"[ ! -e {shlex.quote(path)} ]")
+    conditions += [
+        f'[ "${{{name}:-}}" = {shlex.quote(environ.get(name, ""))} ]' for name in GUARDED_VARS
+    ]
+    fallback = (
+        f'eval "$("${{CONDA_EXE:-conda}}" shell -n {shlex.quote(syntax.name)} '
+        f'activate {shlex.quote(prefix)})"'
+    )
+
+    lines = [
+        "# condact compiled activation script; do not edit.",
+        f"# plugin: {syntax.name}",
+        f"# prefix: {prefix}",
+        f"# compiled: {time.strftime('%Y-%m-%dT%H:%M:%S')}",
+        "if " + " && ".join(conditions) + "; then",
+        *(command.rstrip("\n") for command in commands),
+        "else",
+        fallback,
+        "fi",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def compile_environment(
+    syntax: CondaShellPlugins,
+    env_name_or_prefix: str | None,
+    environ: Mapping[str, str] | None = None,
+) -> str:
+    """
+    Build the activation plan of an environment and write it as a compiled activation script
+    for the shell plugin. Return the path of the script.
+    """
+    check_compilable(syntax)
+    environ = dict(os.environ if environ is None else environ)
+
+    activator = PluginActivator(syntax, environ)
+    # the script must activate the environment completely, whichever environment is active
+    activator.minimal_transitions = False
+    args = argparse.Namespace(command="activate", env=env_name_or_prefix, dev=False, stack=False)
+    cmds_dict = activator.parse_and_build(args)
+    prefix = _locate_prefix(activator.env_name_or_prefix)
+
+    path = compiled_script_path(prefix, syntax)
+    write_atomic(path, render_compiled_script(syntax, prefix, cmds_dict, environ), mode=0o644)
+    try:
+        os.unlink(path + STALE_SUFFIX)
+    except FileNotFoundError:
+        pass
+    return path
+
+
+def mark_stale(prefix: str) -> list[str]:
+    """
+    Mark every compiled activation script of prefix as stale, so that sourcing it falls back
+    to ``conda shell``. Return the paths of the scripts marked.
+    """
+    marked = []
+    for path in glob(os.path.join(compiled_dir(prefix), "*.sh")):
+        try:
+            with open(path + STALE_SUFFIX, "w"):
+                pass
+        except OSError:
+            continue
+        marked.append(path)
+    return marked
+
+
+def mark_target_prefix_stale(command: str) -> None:
+    """
+    Post-command action for the conda commands that change the packages of an environment:
+    mark the compiled activation scripts of the target prefix stale.
+    """
+    mark_stale(context.target_prefix)
@@ -0,0 +1,151 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Resident activation daemon, started with ``conda shell serve``.
+
+The daemon keeps conda's context and the plugin manager loaded and answers activate,
+deactivate and reactivate plan requests from ``condact-client`` over a per-user Unix socket.
+It exits once no request has arrived for the idle timeout.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+from typing import Iterable, Mapping
+
+from conda.exceptions import CondaError
+
+from . import plan_format
+from .client import COMMANDS, PROTOCOL_VERSION, recv_message, send_message, socket_path
+from .logic import PluginActivator, plan_context
+from .shell_manager import get_shell_syntax, update_plugin_manager
+
+DEFAULT_IDLE_TIMEOUT = 900
+REQUEST_TIMEOUT = 30
+
+# fields of the shell plugin hook that the client needs to render a plan
+_SYNTAX_FIELDS = (
+    "name",
+    "osexec",
+    "script_path",
+    "command_join",
+    "run_script_tmpl",
+    "unset_var_tmpl",
+    "export_var_tmpl",
+    "set_var_tmpl",
+    "tempfile_extension",
+    "script_extension",
+)
+
+
+def describe_syntax(syntax) -> dict:
+    """Return the JSON-serializable parts of a shell plugin hook, as needed by the client."""
+    description = {field: getattr(syntax, field, None) for field in _SYNTAX_FIELDS}
+    description["custom"] = bool(getattr(syntax, "custom", None))
+    return description
+
+
+def build_plan(pm, request: Mapping) -> dict:
+    """
+    Build the plan for a client request against the client's environment.
+    Return the response message.
+    """
+    if request.get("version") != PROTOCOL_VERSION:
+        return {"ok": False, "error": f"Unsupported protocol version: {request.get('version')}"}
+    if request.get("command") not in COMMANDS:
+        return {"ok": False, "error": f"Unsupported command: {request.get('command')}"}
+
+    environ = request.get("environ") or {}
+    args = argparse.Namespace(
+        command=request["command"],
+        env=request.get("env"),
+        stack=request.get("stack"),
+        dev=bool(request.get("dev")),
+    )
+
+    try:
+        # parse_and_build sets context.dev, which must not leak into later requests
+        with plan_context():
+            syntax = get_shell_syntax(pm, request.get("plugin"))
+            activator = PluginActivator(syntax, environ)
+            cmds_dict = activator.parse_and_build(args)
+            snapshot_scripts = activator.snapshot_scripts(cmds_dict["export_vars"].get("CONDA_PREFIX"))
+    except CondaError as e:
+        return {"ok": False, "error": str(e)}
+
+    return {
+        "ok": True,
+        "plan": cmds_dict,
+        "syntax": describe_syntax(syntax),
+        "snapshot_scripts": snapshot_scripts,
+    }
+
+
+def _bind(path: str) -> socket.socket:
+    """
+    Bind a listening socket at path, replacing a stale socket file left by a daemon that died.
+    Raise CondaError if another daemon is already listening.
+    """
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            raise CondaError(f"A condact daemon is already listening on '{path}'.")
+        finally:
+            probe.close()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen()
+    return server
+
+
+def serve(plugins: Iterable, idle_timeout: float | None = None, path: str | None = None) -> int:
+    """
+    Load the plugin manager once, then answer plan requests until no request has been
+    received for idle_timeout seconds (DEFAULT_IDLE_TIMEOUT if not given).
+    Return 0 when the daemon exits.
+    """
+    if idle_timeout is None:
+        idle_timeout = DEFAULT_IDLE_TIMEOUT
+    pm = update_plugin_manager(list(plugins))
+    path = path or socket_path()
+    server = _bind(path)
+    server.settimeout(idle_timeout)
+
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except (socket.timeout, BlockingIOError):
+                # an idle timeout of 0 makes the socket non-blocking
+                break
+
+            with conn:
+                conn.settimeout(REQUEST_TIMEOUT)
+                try:
+                    request = recv_message(conn)
+                    response = build_plan(pm, request)
+                except Exception as e:
+                    # a failing request must not bring down the daemon for every other shell
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                # the plan is sent in binary format after the JSON response
+                plan = response.pop("plan", None)
+                payload = plan_format.dumps(plan) if plan is not None else b""
+                try:
+                    send_message(conn, response, payload)
+                except OSError:
+                    pass
+    finally:
+        server.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    return 0
@@ -0,0 +1,90 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Copy-on-write view of a process environment.
+
+Activation reads the environment many times but changes only a handful of variables.
+EnvOverlay records those changes on top of a shared, unmodified base mapping (os.environ
+by default), so that the environment is copied once, by materialize(), when the mapping
+for os.execve is needed.
+"""
+from __future__ import annotations
+
+import os
+from typing import Iterator, Mapping, MutableMapping
+
+_MISSING = object()
+
+
+class EnvOverlay(MutableMapping):
+    """
+    A mutable mapping of environment variables layered over a base mapping. Assignments and
+    deletions are recorded in the overlay; the base mapping is never modified.
+    """
+
+    __slots__ = ("_base", "_sets", "_unsets")
+
+    def __init__(self, base: Mapping[str, str] | None = None):
+        if isinstance(base, EnvOverlay):
+            # share the underlying base instead of stacking overlays
+            self._base = base._base
+            self._sets = dict(base._sets)
+            self._unsets = set(base._unsets)
+        else:
+            self._base = os.environ if base is None else base
+            self._sets: dict[str, str] = {}
+            self._unsets: set[str] = set()
+
+    def __getitem__(self, key: str) -> str:
+        value = self._sets.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if key in self._unsets:
+            raise KeyError(key)
+        return self._base[key]
+
+    def __setitem__(self, key: str, value: str) -> None:
+        self._sets[key] = value
+        self._unsets.discard(key)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._sets.pop(key, None)
+        if key in self._base:
+            self._unsets.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._sets:
+            return True
+        return key not in self._unsets and key in self._base
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._base:
+            if key not in self._unsets and key not in self._sets:
+                yield key
+        yield from self._sets
+
+    def __len__(self) -> int:
+        hidden = sum(1 for key in self._unsets if key in self._base)
+        hidden += sum(1 for key in self._sets if key in self._base and key not in self._unsets)
+        return len(self._base) - hidden + len(self._sets)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(sets={self._sets!r}, unsets={sorted(self._unsets)!r})"
+
+    def copy(self) -> EnvOverlay:
+        """Return a new overlay with the same changes over the same base mapping."""
+        return EnvOverlay(self)
+
+    def changes(self) -> tuple[dict[str, str], set[str]]:
+        """Return copies of the variables set and of the base variables unset in this overlay."""
+        return dict(self._sets), set(self._unsets)
+
+    def materialize(self) -> dict[str, str]:
+        """Return a plain dict with the base mapping and the changes applied."""
+        env = dict(self._base)
+        for key in self._unsets:
+            env.pop(key, None)
+        env.update(self._sets)
+        return env
@@ -0,0 +1,200 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Export of activation plans as static environment files.
+
+``conda shell -n <PLUGIN> export <ENV> --format <FORMAT>`` builds the activation plan of an
+environment once, applies it to the current environment, and writes the variables that the
+activation sets or unsets in one of the formats of FORMATS, so that container images,
+systemd units and batch jobs start processes in the environment without running conda (or
+Python) at start-up:
+
+- ``dotenv``: literal ``KEY=value`` lines, for ``docker run --env-file``;
+- ``systemd-env``: ``KEY="value"`` lines, for systemd's ``EnvironmentFile=``;
+- ``dockerfile``: ``ENV`` instructions;
+- ``systemd``: a ``[Service]`` drop-in with ``Environment=`` and ``UnsetEnvironment=``;
+- ``json``: an object with the prefix, the variables and the scripts not inlined;
+- ``sbatch``: a POSIX shell fragment for batch scripts to source.
+
+The activate.d scripts of the environment are run once and their effect on the environment
+is inlined, as with condact.script_cache; a script that cannot be captured (because it is
+not a POSIX script or fails), and every script after it, is not inlined but reported, to be
+run at start-up. The ``sbatch`` fragment sources those scripts itself.
+The variables are exported as the current environment leaves them, so export from the
+environment the processes will start in, for example inside the image build.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shlex
+from typing import Mapping, NamedTuple
+
+from .logic import PluginActivator
+from .script_cache import capture
+from .shell_types import CondaShellPlugins
+
+FORMATS = ("dotenv", "systemd-env", "dockerfile", "systemd", "json", "sbatch")
+
+# variables that only concern interactive shells or condact itself
+_SHELL_ONLY_VARS = frozenset({"PS1", "prompt"})
+_IGNORED_PREFIX = "_CONDACT_"
+
+
+class ExportedEnvironment(NamedTuple):
+    """The static effect of activating an environment."""
+
+    #: the activated prefix
+    prefix: str
+    #: the variables to set, in order
+    export_vars: dict[str, str]
+    #: the variables to unset
+    unset_vars: tuple[str, ...]
+    #: the activate.d scripts whose effect is not inlined, to be run at start-up
+    scripts: tuple[str, ...]
+
+
+def _exported(name: str) -> bool:
+    return name not in _SHELL_ONLY_VARS and not name.startswith(_IGNORED_PREFIX)
+
+
+def export_environment(
+    syntax: CondaShellPlugins,
+    env_name_or_prefix: str | None,
+    capture_scripts: bool = True,
+    environ: Mapping[str, str] | None = None,
+) -> ExportedEnvironment:
+    """
+    Build the activation plan of an environment with the shell plugin and return its effect
+    on environ (the current environment by default). If capture_scripts is true, the effect
+    of the leading activate.d scripts that can be captured is inlined.
+    Raise CondaError if the plan cannot be built.
+    """
+    environ = dict(os.environ if environ is None else environ)
+
+    activator = PluginActivator(syntax, environ)
+    # the file must activate the environment completely, whichever environment is active
+    activator.minimal_transitions = False
+    args = argparse.Namespace(command="activate", env=env_name_or_prefix, dev=False, stack=False)
+    plan = activator.parse_and_build(args)
+    env_map = activator.update_env_map(plan)
+
+    scripts = list(plan.activate_scripts)
+    if capture_scripts and syntax.script_extension == ".sh":
+        while scripts:
+            effect = capture(scripts[0], env_map.materialize())
+            if effect is None:
+                break
+            for name in effect.unset_vars:
+                env_map.pop(name, None)
+            env_map.update(effect.export_vars)
+            scripts.pop(0)
+
+    sets, unsets = env_map.changes()
+    return ExportedEnvironment(
+        prefix=env_map.get("CONDA_PREFIX", ""),
+        export_vars={name: value for name, value in sets.items() if _exported(name)},
+        unset_vars=tuple(sorted(name for name in unsets if _exported(name))),
+        scripts=tuple(scripts),
+    )
+
+
+def _double_quote(value: str, special: str = '\\"$') -> str:
+    """Return value in double quotes, with the characters of special escaped by backslashes."""
+    escaped = "".join("\\" + char if char in special else char for char in value)
+    return '"' + escaped.replace("\n", "\\n") + '"'
+
+
+def render_dotenv(exported: ExportedEnvironment) -> str:
+    """
+    Return the variables of exported as a dotenv file for ``docker run --env-file``, which
+    takes everything after the first ``=`` of a line literally, quotes included. Values
+    spanning several lines cannot be written and are left out.
+    """
+    lines = [f"{name}={value}" for name, value in exported.export_vars.items() if "\n" not in value]
+    return "".join(line + "\n" for line in lines)
+
+
+def render_systemd_env(exported: ExportedEnvironment) -> str:
+    """
+    Return the variables of exported as a file for systemd's ``EnvironmentFile=``, which
+    removes the double quotes and the backslashes escaping ``\\ " ` $``, and expands
+    neither variables nor specifiers. Newlines are kept inside the quotes.
+    """
+    lines = []
+    for name, value in exported.export_vars.items():
+        escaped = "".join("\\" + char if char in '\\"`$' else char for char in value)
+        lines.append(f'{name}="{escaped}"')
+    return "".join(line + "\n" for line in lines)
+
+
+def render_dockerfile(exported: ExportedEnvironment) -> str:
+    """Return the variables of exported as Dockerfile ENV instructions."""
+    lines = [f"# conda environment: {exported.prefix}"]
+    lines += [f"ENV {name}={_double_quote(value)}" for name, value in exported.export_vars.items()]
+    return "\n".join(lines) + "\n"
+
+
+def render_systemd(exported: ExportedEnvironment) -> str:
+    """Return the variables of exported as a systemd service drop-in."""
+    lines = [f"# conda environment: {exported.prefix}", "[Service]"]
+    for name, value in exported.export_vars.items():
+        # systemd expands specifiers starting with % in Environment= settings
+        assignment = _double_quote(f"{name}={value}", '\\"').replace("%", "%%")
+        lines.append(f"Environment={assignment}")
+    if exported.unset_vars:
+        lines.append("UnsetEnvironment=" + " ".join(exported.unset_vars))
+    return "\n".join(lines) + "\n"
+
+
+def render_json(exported: ExportedEnvironment) -> str:
+    """Return exported as a JSON object."""
+    return json.dumps(exported._asdict(), indent=2) + "\n"
+
+
+def render_sbatch(exported: ExportedEnvironment) -> str:
+    """
+    Return a POSIX shell fragment, for batch job scripts to source, that applies the
+    variables of exported and sources the scripts not inlined.
+    """
+    lines = [f"# conda environment: {exported.prefix}"]
+    if exported.unset_vars:
+        lines.append("unset " + " ".join(exported.unset_vars))
+    lines += [f"export {name}={shlex.quote(value)}" for name, value in exported.export_vars.items()]
+    lines += [f". {shlex.quote(script)}" for script in exported.scripts]
+    return "\n".join(lines) + "\n"
+
+
+_RENDERERS = {
+    "dotenv": render_dotenv,
+    "systemd-env": render_systemd_env,
+    "dockerfile": render_dockerfile,
+    "systemd": render_systemd,
+    "json": render_json,
+    "sbatch": render_sbatch,
+}
+
+
+def render(exported: ExportedEnvironment, output_format: str) -> str:
+    """Return exported rendered in output_format, one of FORMATS."""
+    return _RENDERERS[output_format](exported)
+
+
+def export_warnings(exported: ExportedEnvironment, output_format: str) -> list[str]:
+    """Return the parts of the activation that a file rendered in output_format does not apply."""
+    messages = []
+    if output_format in ("dotenv", "systemd-env", "dockerfile"):
+        messages += [
+            f"The activation unsets {name}, which the {output_format} file cannot do."
+            for name in exported.unset_vars
+        ]
+    if output_format == "dotenv":
+        messages += [
+            f"The value of {name} spans several lines, which the dotenv file cannot hold; it is left out."
+            for name, value in exported.export_vars.items()
+            if "\n" in value
+        ]
+    if output_format != "sbatch":
+        messages += [f"The activate.d script {script} is not inlined; run it at start-up." for script in exported.scripts]
+    return messages
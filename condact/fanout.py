@@ -0,0 +1,117 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Run one command in many environments concurrently:
+
+    conda shell -n <PLUGIN> run --envs a,b,c --jobs 8 -- cmd args...
+    conda shell -n <PLUGIN> run --all -- cmd args...
+
+The activation plans of all environments are built in this process with
+condact.api.build_many, sharing one loaded context. The commands then run as child
+processes, at most ``jobs`` at a time, with their output captured and printed per
+environment in the order the environments were given.
+"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Mapping, NamedTuple
+
+from .api import build_many, get_shell_plugin
+from .logic import PluginActivator
+from .plan import ActivationPlan
+
+
+class RunResult(NamedTuple):
+    """The outcome of running the command in one environment."""
+
+    env: str
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    duration: float
+
+
+def all_environments() -> list[str]:
+    """Return the prefixes of all environments known to conda."""
+    from conda.core.envs_manager import list_all_known_prefixes
+
+    return list(list_all_known_prefixes())
+
+
+def run_many(
+    envs: Iterable[str],
+    argv: list[str],
+    plugin: str,
+    jobs: int | None = None,
+    environ: Mapping[str, str] | None = None,
+) -> Iterator[RunResult]:
+    """
+    Run argv in each environment, with at most jobs (default: the number of CPUs) commands
+    running at once. Yield the results in the order of envs, as soon as each is available.
+    An environment whose plan cannot be built, or whose command cannot be run, yields a
+    result with return code 1 and the error as its stderr; the other environments are
+    not affected.
+    """
+    envs = list(dict.fromkeys(envs))
+    jobs = jobs or os.cpu_count() or 1
+    syntax = get_shell_plugin(plugin)
+    plans = build_many(envs, plugin, environ=environ, max_workers=jobs, return_exceptions=True)
+
+    def run(env: str) -> RunResult:
+        start = time.monotonic()
+        plan = plans[env]
+        try:
+            if isinstance(plan, BaseException):
+                raise plan
+            activator = PluginActivator(syntax, environ)
+            env_map = activator.update_env_map(plan)
+            plan = activator.apply_cached_script_effects(ActivationPlan.from_mapping(plan), env_map)
+            path, arg_list = activator.get_run_argv(plan, argv, env_map)
+            process = subprocess.run(
+                arg_list,
+                executable=path,
+                env=env_map.materialize(),
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+            )
+        except Exception as e:
+            # one environment failing must not abort the results of the others
+            return RunResult(env, 1, b"", f"{e}\n".encode(), time.monotonic() - start)
+        return RunResult(env, process.returncode, process.stdout, process.stderr, time.monotonic() - start)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(run, envs)
+
+
+def print_result(result: RunResult) -> None:
+    """Print the captured output of one environment under a header."""
+    sys.stdout.write(f"==> {result.env} <== (exit {result.returncode}, {result.duration:.2f}s)\n")
+    sys.stdout.flush()
+    sys.stdout.buffer.write(result.stdout)
+    sys.stdout.buffer.flush()
+    sys.stderr.buffer.write(result.stderr)
+    sys.stderr.buffer.flush()
+
+
+def run_fanout(plugin: str, envs: list[str], argv: list[str], jobs: int | None = None) -> int:
+    """
+    Run argv in each environment and print the output of each. Return 0 if the command
+    succeeded in every environment, 1 otherwise.
+    """
+    failed = []
+    for result in run_many(envs, argv, plugin, jobs):
+        print_result(result)
+        if result.returncode != 0:
+            failed.append(result.env)
+
+    if failed:
+        print(
+            f"Command failed in {len(failed)} of {len(envs)} environments: {', '.join(failed)}",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
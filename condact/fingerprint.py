@@ -0,0 +1,64 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Fingerprints of the active environment, for the no-op fast path of reactivate.
+
+Activation and reactivation export ``_CONDACT_FINGERPRINT``, a fingerprint of the state of
+the activated prefix that its plan depends on: its conda-meta history and state, and the
+scripts in its activate.d and deactivate.d directories. ``conda shell reactivate``, which
+runs after every install, update and remove, compares it with the current state of
+CONDA_PREFIX and exits without output (and without starting a shell) if nothing changed.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Mapping
+
+from .cache import prefix_fingerprint
+from .plan import ActivationPlan
+
+FINGERPRINT_VAR = "_CONDACT_FINGERPRINT"
+
+_SCRIPT_DIRS = (
+    os.path.join("etc", "conda", "activate.d"),
+    os.path.join("etc", "conda", "deactivate.d"),
+)
+
+
+def activation_fingerprint(prefix: str) -> str:
+    """
+    Return the fingerprint of the prefix: its prefix_fingerprint, plus the name, size and
+    modification time of each activate.d and deactivate.d script, so that a script edited
+    in place changes the fingerprint too.
+    """
+    digest = hashlib.sha1(prefix_fingerprint(prefix).encode())
+    for relpath in _SCRIPT_DIRS:
+        try:
+            entries = sorted(os.scandir(os.path.join(prefix, relpath)), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            digest.update(f"{relpath}/{entry.name}:{st.st_mtime_ns}:{st.st_size};".encode())
+    return digest.hexdigest()
+
+
+def stamp(cmds_dict: Mapping, prefix: str) -> ActivationPlan:
+    """Return the plan activating prefix, exporting the prefix's fingerprint as well."""
+    plan = ActivationPlan.from_mapping(cmds_dict)
+    export_vars = {**plan.export_vars, FINGERPRINT_VAR: activation_fingerprint(prefix)}
+    return ActivationPlan.from_mapping({**plan, "export_vars": export_vars})
+
+
+def is_current(environ: Mapping[str, str]) -> bool:
+    """
+    Return True if the active environment of environ has not changed since it was activated
+    or last reactivated, so that reactivating it would not change anything.
+    """
+    prefix = environ.get("CONDA_PREFIX")
+    recorded = environ.get(FINGERPRINT_VAR)
+    return bool(prefix and recorded) and recorded == activation_fingerprint(prefix)
@@ -3,13 +3,370 @@
 from __future__ import annotations
 
 import argparse
+import dis
+import functools
+import json
+import multiprocessing
 import os
-from typing import NamedTuple
+import re
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from os.path import abspath, expanduser, expandvars
+from typing import Callable, Iterable, Iterator, Mapping, NamedTuple
 
 from conda.activate import _Activator
-from conda.base.context import context
-
+from conda.base.context import context, locate_prefix_by_name
+from conda.exceptions import CondaError
+
+from . import fingerprint, osexec, script_cache, snapshot
+from .cache import (
+    SHARED_TEMPLATE_VAR,
+    USER_VARIABLES,
+    PlanCache,
+    environ_digest,
+    plan_variables,
+    prefix_fingerprint,
+    state_variables,
+)
+from .environ import EnvOverlay
+from .plan import ActivationPlan
 from .shell_types import CondaShellPlugins
+from .trace import before_exec, span, traced
+from .transition import plan_transition
+
+# serializes the blocks that fix conda context settings for building plans; see plan_context
+_context_lock = threading.RLock()
+
+# the attributes that _Activator.__init__ may set, which _ActivatorChild.__init__ sets itself
+_ACTIVATOR_INIT_ATTRIBUTES = frozenset({"_raw_arguments", "environ"})
+
+# worker processes building plans for environments other than the process environment;
+# see _call_activator
+_build_pool: ProcessPoolExecutor | None = None
+_build_pool_lock = threading.Lock()
+
+
+@contextmanager
+def plan_context(dev: bool = False) -> Iterator[None]:
+    """
+    Keep the conda context settings read while building plans fixed for the enclosed block,
+    which may build plans from several threads: context.dev is switched on if dev is true
+    and restored on exit. Blocks using plan_context are serialized with each other.
+    """
+    with _context_lock:
+        saved = context.dev
+        context.dev = dev or saved
+        try:
+            yield
+        finally:
+            context.dev = saved
+
+
+def auto_stack(environ: Mapping[str, str]) -> bool:
+    """
+    Return whether an activation from environ is stacked by default, as conda decides it
+    from context.auto_stack and context.shlvl, with the level read from environ rather than
+    from os.environ.
+    """
+    try:
+        shlvl = int(environ.get("CONDA_SHLVL", "-1"))
+    except ValueError:
+        shlvl = -1
+    return bool(context.auto_stack and shlvl <= context.auto_stack)
+
+
+@functools.lru_cache(maxsize=None)
+def _check_activator_init() -> None:
+    """
+    Raise CondaError if _Activator.__init__ sets attributes other than those that
+    _ActivatorChild.__init__ sets itself in its place.
+    """
+    assigned = {
+        instruction.argval
+        for instruction in dis.get_instructions(_Activator.__init__)
+        if instruction.opname == "STORE_ATTR"
+    }
+    unknown = assigned - _ACTIVATOR_INIT_ATTRIBUTES
+    if unknown:
+        raise CondaError(
+            "Unsupported conda version: _Activator.__init__ sets "
+            f"{', '.join(sorted(unknown))}, which condact does not initialize."
+        )
+
+
+def _worker_build(syntax: CondaShellPlugins, method: Callable, args: tuple, environ: dict, dev: bool) -> dict:
+    """
+    Return the result of the _Activator method called with args on an _ActivatorChild of
+    syntax for the environment environ. Run in a worker process of the build pool, which
+    holds environ in os.environ for the call, since that is where conda reads it.
+    """
+    os.environ.clear()
+    os.environ.update(environ)
+    context.dev = dev
+    return method(_ActivatorChild(syntax, [], environ), *args)
+
+
+def _call_activator(syntax: CondaShellPlugins, activator: _ActivatorChild, method: Callable, *args) -> dict:
+    """
+    Return the result of the _Activator method called on activator with args. conda reads
+    the environment being activated from os.environ, which is never modified here: if
+    activator.environ holds the same variables that conda reads (see plan_variables), the
+    method is called in this process; otherwise it is called in a worker process holding
+    activator.environ, from a pool of processes started on first use.
+    """
+    if plan_variables(activator.environ) == plan_variables(os.environ):
+        return method(activator, *args)
+
+    global _build_pool
+    with _build_pool_lock:
+        if _build_pool is None:
+            _build_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    with span("logic.worker_build"):
+        future = _build_pool.submit(
+            _worker_build, syntax, method, args, dict(activator.environ), context.dev
+        )
+        return future.result()
+
+
+def _enable_dev(dev: bool) -> None:
+    """
+    Switch on context.dev for a --dev flag. The global context is only written when the
+    value changes, so that concurrent builds within plan_context never modify it.
+    """
+    if dev and not context.dev:
+        context.dev = True
+
+
+def _locate_prefix(env_name_or_prefix: str) -> str:
+    """
+    Return the prefix of an environment name or path, resolved the same way as
+    _Activator._build_activate_stack resolves it.
+    """
+    if re.search(r"\\|/", env_name_or_prefix):
+        return abspath(expanduser(expandvars(env_name_or_prefix)))
+    return locate_prefix_by_name(env_name_or_prefix)
+
+
+def _plan_cache_key(
+    activator: PluginActivator | _ActivatorChild,
+    prefix: str,
+    env_name_or_prefix: str,
+    stack: bool,
+    shared: bool = False,
+) -> str:
+    """
+    Return the plan cache key of activating env_name_or_prefix, located at prefix: it covers
+    the prefix and its fingerprint, the plugin, the stack flag, the fingerprint of the
+    active prefix (whose deactivate.d scripts and variables the plan lists), the variables
+    of the current environment that the build reads, the current values of the variables
+    that the prefix sets (which the plan saves) and the relevant conda settings.
+    Keys of the shared cache leave out the USER_VARIABLES, which shared plans are rebuilt
+    for on load (see _load_shared_plan).
+    """
+    environ = activator.environ
+    old_prefix = environ.get("CONDA_PREFIX")
+    return PlanCache.key(
+        prefix,
+        env_name_or_prefix,
+        activator.name,
+        bool(stack),
+        prefix_fingerprint(prefix),
+        prefix_fingerprint(old_prefix) if old_prefix else None,
+        environ_digest(environ, USER_VARIABLES if shared else ()),
+        [(name, environ.get(name)) for name in state_variables(prefix)],
+        context.changeps1,
+        context.env_prompt,
+        context.dev,
+    )
+
+
+def _cached_activate_stack(
+    activator: PluginActivator | _ActivatorChild,
+    env_name_or_prefix: str,
+    stack: bool,
+    build: Callable[[], dict],
+) -> ActivationPlan | dict:
+    """
+    Return the activation plan for the environment from the plan cache, or from the shared
+    cache on a miss, running build() and storing its result in the plan cache if neither has
+    it. The plan also exports the fingerprint of the prefix used by the no-op fast path of
+    reactivate (see condact.fingerprint).
+    """
+    try:
+        with span("logic.locate_prefix"):
+            prefix = _locate_prefix(env_name_or_prefix)
+    except CondaError:
+        # let the build raise the appropriate error
+        return build()
+
+    cache = PlanCache.from_environ()
+    if cache is None:
+        return fingerprint.stamp(build(), prefix)
+
+    key = _plan_cache_key(activator, prefix, env_name_or_prefix, stack)
+    with span("cache.get") as attrs:
+        cmds_dict = cache.get(key)
+        attrs["hit"] = cmds_dict is not None
+    if cmds_dict is None:
+        shared = PlanCache.shared_from_environ()
+        if shared is not None:
+            with span("cache.get_shared") as attrs:
+                cmds_dict = shared.get(_plan_cache_key(activator, prefix, env_name_or_prefix, stack, True))
+                if cmds_dict is not None:
+                    cmds_dict = _load_shared_plan(activator, cmds_dict)
+                attrs["hit"] = cmds_dict is not None
+    if cmds_dict is None:
+        cmds_dict = build()
+        with span("cache.put"):
+            cache.put(key, cmds_dict)
+    return fingerprint.stamp(cmds_dict, prefix)
+
+
+def _path_entries(activator: PluginActivator | _ActivatorChild, path: str) -> list[str]:
+    """Return the entries of the native PATH value path, converted for the plugin."""
+    return list(activator.path_conversion(tuple(path.split(os.pathsep)))) if path else []
+
+
+def _user_digest(environ: Mapping[str, str]) -> str:
+    """Return a digest of the USER_VARIABLES of environ."""
+    return environ_digest({key: environ.get(key, "") for key in USER_VARIABLES})
+
+
+def _apply_path_template(template: Mapping, entries: list[str]) -> list[str]:
+    """
+    Return the PATH entries of a shared plan for a shell with the given PATH entries: the
+    entries template removes are dropped, and the entries it inserts are placed in front,
+    or where the first removed entry was.
+    """
+    removed = set(template["removed"])
+    index = 0 if template["front"] else next((i for i, e in enumerate(entries) if e in removed), 0)
+    rest = [entry for entry in entries[index:] if entry not in removed]
+    return [*entries[:index], *template["inserted"], *rest]
+
+
+def _shared_template(activator: PluginActivator, plan: ActivationPlan) -> dict:
+    """
+    Return how to rebuild the parts of plan, built from activator.environ, that depend on
+    the USER_VARIABLES for another shell: the PATH entries the plan inserts and removes,
+    and the prompt variables, which the plugin's define_update_prompt computes again. If
+    plan cannot be rebuilt this way, the template instead records the digest of those
+    variables, and the plan is only used by shells where they are the same.
+    """
+    environ = activator.environ
+    template = {}
+    path = plan.export_path.get("PATH", plan.export_vars.get("PATH"))
+    if path is not None:
+        old = _path_entries(activator, environ.get("PATH", ""))
+        new = path.split(activator.pathsep_join(("", "")))
+        removed = [entry for entry in old if entry not in new]
+        inserted = [entry for entry in new if entry not in old]
+        for front in (False, True):
+            candidate = {"removed": removed, "inserted": inserted, "front": front}
+            if activator.pathsep_join(_apply_path_template(candidate, old)) == path:
+                template["path"] = candidate
+                break
+        else:
+            return {"digest": _user_digest(environ)}
+
+    modifier = plan.export_vars.get("CONDA_PROMPT_MODIFIER")
+    if activator.define_update_prompt and modifier is not None and context.changeps1:
+        prompt_vars = {}
+        activator.define_update_prompt(environ=environ, set_vars=prompt_vars, conda_prompt_modifier=modifier)
+        if any(plan.set_vars.get(key) != value for key, value in prompt_vars.items()):
+            return {"digest": _user_digest(environ)}
+        template["prompt"] = sorted(prompt_vars)
+    return template
+
+
+def _load_shared_plan(activator: PluginActivator | _ActivatorChild, plan: ActivationPlan) -> ActivationPlan | None:
+    """
+    Return the plan of a shared cache entry rebuilt for activator.environ with the
+    template stored in it (see _shared_template), or None if it cannot be used there.
+    """
+    export_vars = dict(plan.export_vars)
+    try:
+        template = json.loads(export_vars.pop(SHARED_TEMPLATE_VAR))
+    except (KeyError, ValueError):
+        return None
+    environ = activator.environ
+    fields = {**plan, "export_vars": export_vars}
+
+    if "digest" in template:
+        if template["digest"] != _user_digest(environ):
+            return None
+        return ActivationPlan.from_mapping(fields)
+
+    if "path" in template:
+        group = "export_path" if "PATH" in plan.export_path else "export_vars"
+        entries = _apply_path_template(template["path"], _path_entries(activator, environ.get("PATH", "")))
+        fields[group] = {**fields[group], "PATH": activator.pathsep_join(entries)}
+    if "prompt" in template:
+        set_vars = {key: value for key, value in plan.set_vars.items() if key not in template["prompt"]}
+        activator.define_update_prompt(
+            environ=environ, set_vars=set_vars, conda_prompt_modifier=export_vars["CONDA_PROMPT_MODIFIER"]
+        )
+        fields["set_vars"] = set_vars
+    return ActivationPlan.from_mapping(fields)
+
+
+def warm_shared_cache(syntax: CondaShellPlugins, envs: Iterable[str], cache: PlanCache) -> list[str]:
+    """
+    Build the activation plans of the environment names or prefixes envs with the plugin
+    syntax, from the current environment, and write them to the shared cache. The plans are
+    stored under the keys that activations from the same state look up, so envs should be
+    spelled the way users activate them; the PATH and prompt of the plans are rebuilt for
+    each user's shell on load. Return the prefixes of the environments.
+    Raise CondaError if an environment cannot be found, or OSError if a plan cannot be written.
+    """
+    activator = PluginActivator(syntax)
+    stack = auto_stack(activator.environ)
+    prefixes = []
+    for env_name_or_prefix in envs:
+        prefix = _locate_prefix(env_name_or_prefix)
+        plan = ActivationPlan.from_mapping(
+            activator._conda_build(_Activator._build_activate_stack, env_name_or_prefix, stack)
+        )
+        template = json.dumps(_shared_template(activator, plan))
+        entry = {**plan, "export_vars": {**plan.export_vars, SHARED_TEMPLATE_VAR: template}}
+        cache.write(_plan_cache_key(activator, prefix, env_name_or_prefix, stack, True), entry)
+        prefixes.append(prefix)
+    return prefixes
+
+
+def _transition(
+    activator: PluginActivator | _ActivatorChild,
+    env_name_or_prefix: str,
+    stack: bool,
+    cmds_dict: Mapping,
+) -> ActivationPlan:
+    """
+    Return the plan switching from the active environment to env_name_or_prefix reduced to
+    a minimal transition with condact.transition.plan_transition. The plan is returned
+    unchanged for stacked activations, activations of the active environment itself or from
+    a shell without an active environment, activators whose minimal_transitions attribute
+    is false, and if CONDACT_NO_TRANSITION is set.
+    """
+    plan = ActivationPlan.from_mapping(cmds_dict)
+    old_prefix = activator.environ.get("CONDA_PREFIX")
+    if (
+        stack
+        or not old_prefix
+        or not activator.minimal_transitions
+        or activator.environ.get("CONDACT_NO_TRANSITION")
+    ):
+        return plan
+
+    try:
+        new_prefix = _locate_prefix(env_name_or_prefix)
+    except CondaError:
+        return plan
+    if new_prefix == old_prefix:
+        return plan
+    with span("logic.transition"):
+        return plan_transition(plan, activator.environ, old_prefix, new_prefix)
+
 
 class PluginActivator:
     """
@@ -26,16 +383,22 @@ class PluginActivator:
         unset_var
         activate_scripts
         deactivate_scripts
+    The methods of this class return the map as an immutable ActivationPlan.
 
     Each shell plugin hook provides the shell-specific information needed to implement
     the methods of this class.
     """
 
-    def __init__(self, syntax: NamedTuple):
+    # whether switching between environments is reduced to a minimal transition
+    minimal_transitions = True
+
+    def __init__(self, syntax: NamedTuple, environ: Mapping[str, str] | None = None):
         """
         Create properties so that each class property is assigned the value from the corresponding
         property in the named tuple, based on the expected fields in the shell plugin hook.
         If a property is missing from the named tuple, it will be assigned a value of None.
+        Plans are built against an EnvOverlay of environ, which defaults to os.environ, so the
+        environment is not copied.
 
         Expected properties:
             self.name: str
@@ -56,83 +419,102 @@ class PluginActivator:
             self.set_var_tmpl: str | None
             self.tempfile_extension: str | None
             self.define_update_prompt: Callable[[dict, str], None] | None
-            self.environ: mapping
+            self.environ: EnvOverlay
             self._activator: _Activator
 
         """
         for field in CondaShellPlugins._fields:
             setattr(self, field, getattr(syntax, field, None))
 
-        self.environ = os.environ.copy()
+        self.environ = EnvOverlay(environ)
 
-        # initializing an instance of _Activator just so that we can use some of its
-        # methods rather than duplicating code
-        self._activator = _ActivatorChild(syntax, [])
+        self._syntax = syntax
+        self._args = None
+        self._activator_child = None
 
-    def update_env_map(self, cmds_dict: dict) -> map:
+    @property
+    def _activator(self) -> _ActivatorChild:
         """
-        Create an environment mapping for use with os.execve, based on the builder dictionary.
+        Return an instance of _ActivatorChild, so that we can use some of its methods rather
+        than duplicating code. The instance is only created when it is first needed, so
+        activations served from the plan cache never initialize an _Activator.
         """
-        env_map = os.environ.copy()
+        if self._activator_child is None:
+            self._activator_child = _ActivatorChild(self._syntax, [], self.environ)
+            if self._args is not None:
+                self._activator_child._parse_and_set_args(self._args)
+        return self._activator_child
 
-        unset_vars = cmds_dict["unset_vars"]
-        set_vars = cmds_dict["set_vars"]
-        export_path = cmds_dict.get("export_path", {})
-        export_vars = cmds_dict.get("export_vars", {})
-
-        for key in unset_vars:
-            env_map.pop(str(key), None)
+    def _conda_build(self, method: Callable, *args) -> dict:
+        """
+        Return the result of the _Activator method called on self._activator with args, for
+        the environment self.environ (see _call_activator).
+        """
+        return _call_activator(self._syntax, self._activator, method, *args)
 
-        for key, value in set_vars.items():
-            env_map[str(key)] = str(value)
+    @traced("PluginActivator.update_env_map")
+    def update_env_map(self, cmds_dict: Mapping) -> EnvOverlay:
+        """
+        Create an environment mapping for use with os.execve, based on the activation plan
+        (or a builder dictionary). The mapping records the changes over self.environ; call
+        materialize() on it to get the dict passed to os.execve.
+        """
+        return osexec.update_env_map(cmds_dict, self.environ)
 
-        for key, value in export_path.items():
-            env_map[str(key)] = str(value)
+    def cached_script_effects(
+        self, plan: ActivationPlan, env: Mapping[str, str] | None = None
+    ) -> tuple[int, dict, set]:
+        """
+        Return the number of leading activate.d scripts of plan that need not be run, because
+        their effect on the environment env (the environment with the plan applied, built
+        with update_env_map by default) is in the script cache, and their combined effect:
+        the variables to set and to unset. See condact.osexec.cached_script_effects.
+        """
+        if not script_cache.enabled(self.environ) or self.script_extension != ".sh":
+            return 0, {}, set()
+        if env is None:
+            env = self.update_env_map(plan)
+        return osexec.cached_script_effects(plan, env, self.environ, self.script_extension)
 
-        for key, value in export_vars.items():
-            env_map[str(key)] = str(value)
+    def apply_cached_script_effects(self, plan: ActivationPlan, env_map: EnvOverlay) -> ActivationPlan:
+        """
+        Apply the effects of the leading activate.d scripts of plan that are in the script
+        cache (see cached_script_effects) to env_map, the environment with plan applied, and
+        return plan without those scripts.
+        """
+        return osexec.apply_cached_script_effects(plan, env_map, self.environ, self.script_extension)
 
-        return env_map
-    
-    def _get_env_arg_list(self, cmds_dict: dict, arg_list: list = []) -> list[str]:
-        unset_vars = cmds_dict["unset_vars"]
-        set_vars = cmds_dict["set_vars"]
-        export_path = cmds_dict.get("export_path", {})
-        export_vars = cmds_dict.get("export_vars", {})
+    @traced("PluginActivator._get_env_arg_list")
+    def _get_env_arg_list(self, cmds_dict: Mapping, arg_list: list = []) -> list[str]:
+        plan = ActivationPlan.from_mapping(cmds_dict)
+        deactivate_list, activate_list = plan.script_commands(self.run_script_tmpl, self.command_join)
+        count, script_sets, script_unsets = self.cached_script_effects(plan)
 
-        for key, value in export_path.items():
+        for key, value in plan.export_path.items():
             arg_list.append(self.export_var_tmpl % (key, value))
 
-        deactivate_scripts = cmds_dict.get("deactivate_scripts", ())
-
-        if deactivate_scripts:
-            deactivate_list = [
-                (self.run_script_tmpl % script) + self.command_join
-                for script in deactivate_scripts
-            ]
-            arg_list.extend(deactivate_list)
+        arg_list.extend(deactivate_list)
 
-        for key in unset_vars:
+        for key in plan.unset_vars:
             arg_list.append(self.unset_var_tmpl % key)
 
-        for key, value in set_vars.items():
+        for key, value in plan.set_vars.items():
             arg_list.append(self.set_var_tmpl % (key, value))
 
-        for key, value in export_vars.items():
+        for key, value in plan.export_vars.items():
             arg_list.append(self.export_var_tmpl % (key, value))
 
-        activate_scripts = cmds_dict.get("activate_scripts", ())
+        for key in script_unsets:
+            arg_list.append(self.unset_var_tmpl % key)
 
-        if activate_scripts:
-            activate_list = [
-                (self.run_script_tmpl % script) + self.command_join
-                for script in activate_scripts
-            ]
-            arg_list.extend(activate_list)
+        for key, value in script_sets.items():
+            arg_list.append(self.export_var_tmpl % (key, value))
+
+        arg_list.extend(activate_list[count:])
         
         return arg_list
 
-    def get_activate_builder(self) -> dict:
+    def get_activate_builder(self) -> ActivationPlan:
         """
         Create dictionary containing the environment variables to be set, unset and
         exported, as well as the package activation and deactivation scripts to be run.
@@ -143,24 +525,29 @@ class PluginActivator:
             builder_result = self._build_activate_stack(self.env_name_or_prefix, False)
         return builder_result
 
-    def parse_and_build(self, args: argparse.Namespace) -> dict:
+    @traced("PluginActivator.parse_and_build")
+    def parse_and_build(self, args: argparse.Namespace) -> ActivationPlan:
         """
         Parse CLI arguments. Build and return the dictionary that contains environment variables
             to be set, unset, and exported, and any relevant package activation and deactivation
             scripts that should be run.
         Set context.dev if a --dev flag exists.
-        For activate, set self.env_name_or_prefix and self.stack.
+        For activate (and run, which activates the environment for one command), set
+        self.env_name_or_prefix and self.stack.
         """
-        context.dev = args.dev or context.dev
+        _enable_dev(args.dev)
 
-        # run _ActivatorChild._parse_and_set_args() to set self.command, context.dev,
+        # _ActivatorChild._parse_and_set_args() is run with these arguments when the
+        # _ActivatorChild instance is created, to set self.command, context.dev,
         # self.env_name_or_prefix and self.stack for other _Activator methods
-        self._activator._parse_and_set_args(args)
+        self._args = args
+        if self._activator_child is not None:
+            self._activator_child._parse_and_set_args(args)
 
-        if args.command == "activate":
+        if args.command in ("activate", "run"):
             self.env_name_or_prefix = args.env or "base"
             if args.stack is None:
-                self.stack = context.auto_stack and context.shlvl <= context.auto_stack
+                self.stack = auto_stack(self.environ)
             else:
                 self.stack = args.stack
             cmds_dict = self.get_activate_builder()
@@ -171,37 +558,97 @@ class PluginActivator:
 
         return cmds_dict
     
-    def activate(self, cmds_dict: dict) -> SystemExit:
+    def activate(self, cmds_dict: Mapping) -> SystemExit:
         """
         Change environment. As a new process in in new environment, run deactivate
         scripts from packages in old environment (to reset env variables) and
         activate scripts from packages installed in new environment.
+        In collapse mode (see condact.collapse), the new process replaces the shell this
+        command was run from instead, and 0 is returned. See condact.osexec.exec_activation.
         """
-        path = self.script_path
-        arg_list = [path]
-        env_map = self.update_env_map(cmds_dict)
+        plan = ActivationPlan.from_mapping(cmds_dict)
+        return osexec.exec_activation(
+            plan,
+            self.environ,
+            self.script_path,
+            self.run_script_tmpl,
+            self.command_join,
+            self.script_extension,
+            self.snapshot_scripts(plan.export_vars.get("CONDA_PREFIX")),
+        )
+
+    def snapshot_scripts(self, new_prefix: str | None) -> tuple[tuple[str, ...], tuple[str, ...]] | None:
+        """
+        For activate, return the scripts recorded in the snapshot of the activation of
+        new_prefix (see condact.snapshot.take): the deactivate.d scripts of new_prefix and
+        the activate.d scripts of the environment it replaces. Otherwise return None.
+        """
+        if self._args is None or self._args.command != "activate" or not new_prefix:
+            return None
 
-        deactivate_scripts = cmds_dict.get("deactivate_scripts", ())
+        old_prefix = self.environ.get("CONDA_PREFIX")
+        return (
+            self._activator._get_deactivate_scripts(new_prefix),
+            self._activator._get_activate_scripts(old_prefix) if old_prefix else (),
+        )
 
-        if deactivate_scripts:
-            deactivate_list = [
-                (self.run_script_tmpl % script) + self.command_join
-                for script in deactivate_scripts
-            ]
-            arg_list.extend(deactivate_list)
+    def record_snapshot(self, env_map: EnvOverlay) -> None:
+        """
+        For activate, record the snapshot of the variables changed by the activation to
+        env_map in env_map, for build_deactivate to restore; see condact.snapshot.
+        """
+        scripts = self.snapshot_scripts(env_map.get("CONDA_PREFIX"))
+        if scripts is None:
+            return
 
-        activate_scripts = cmds_dict.get("activate_scripts", ())
+        with span("snapshot.take"):
+            snapshot.take(self.environ, env_map, *scripts)
 
-        if activate_scripts:
-            activate_list = [
-                (self.run_script_tmpl % script) + self.command_join
-                for script in activate_scripts
-            ]
-            arg_list.extend(activate_list)
+    def get_run_argv(self, cmds_dict: Mapping, argv: list[str], env_map: Mapping[str, str]) -> tuple[str, list[str]]:
+        """
+        Return the path of the executable and the argument list that run argv in the
+        environment mapping env_map, built from cmds_dict.
+        If the plan has no deactivate.d or activate.d scripts, the command is resolved against
+        the PATH of env_map and run directly. Otherwise the scripts are sourced by /bin/sh,
+        which then replaces itself with the command; this is only possible for plugins whose
+        scripts use POSIX syntax. Scripts are left out of the plan, before it is passed here,
+        by the minimal transition (see parse_and_build) and apply_cached_script_effects.
+        Raise CondaError if the command cannot be found or the scripts cannot be run.
+        """
+        plan = ActivationPlan.from_mapping(cmds_dict)
+        scripts = (*plan.deactivate_scripts, *plan.activate_scripts)
+
+        if not scripts:
+            path = shutil.which(argv[0], path=env_map.get("PATH", os.defpath))
+            if path is None:
+                raise CondaError(f"Command not found in the environment: {argv[0]}")
+            return path, list(argv)
+
+        if self.script_extension != ".sh":
+            raise CondaError(
+                f"Shell plugin '{self.name}' cannot run the environment's "
+                f"{self.script_extension} activation scripts without starting a shell."
+            )
+        deactivate_list, activate_list = plan.script_commands(self.run_script_tmpl, self.command_join)
+        script = "".join((*deactivate_list, *activate_list))
+        path = "/bin/sh"
+        return path, [path, "-c", script + 'exec "$@"', "sh", *argv]
+
+    def run(self, cmds_dict: Mapping, argv: list[str]) -> SystemExit:
+        """
+        Replace the process with argv, run in the environment described by cmds_dict,
+        without starting an interactive shell.
+        """
+        env_map = self.update_env_map(cmds_dict)
+        plan = self.apply_cached_script_effects(ActivationPlan.from_mapping(cmds_dict), env_map)
+        path, arg_list = self.get_run_argv(plan, argv, env_map)
 
-        os.execve(path, arg_list, env_map)
+        env = env_map.materialize()
+        before_exec(path)
+        os.execve(path, arg_list, env)
 
-    def _build_activate_stack(self, env_name_or_prefix: str, stack: bool) -> dict:
+    @traced("PluginActivator._build_activate_stack")
+    def _build_activate_stack(self, env_name_or_prefix: str, stack: bool) -> ActivationPlan:
         """
         Build dictionary with the following key-value pairs, to be used in creating the new
         environment to be activated:
@@ -213,10 +660,20 @@ class PluginActivator:
                 that should be run on deactivation (from `deactivate.d`), if any
             activate_scripts: tuple containing scripts associated with installed packages
                 that should be run on activation (from `activate.d`), if any
+        Plans are served from the plan cache when possible, and switching between environments
+        is reduced to a minimal transition. The result is an ActivationPlan, which can also be
+        read as this dictionary.
         """
-        return self._activator._build_activate_stack(env_name_or_prefix, stack)
+        cmds_dict = _cached_activate_stack(
+            self,
+            env_name_or_prefix,
+            stack,
+            lambda: self._conda_build(_Activator._build_activate_stack, env_name_or_prefix, stack),
+        )
+        return _transition(self, env_name_or_prefix, stack, cmds_dict)
     
-    def build_deactivate(self) -> dict:
+    @traced("PluginActivator.build_deactivate")
+    def build_deactivate(self) -> ActivationPlan:
         """
         Build dictionary with the following key-value pairs, to be used in creating the new
         environment to be activated (that is, the previous environment used):
@@ -228,10 +685,24 @@ class PluginActivator:
                 that should be run on deactivation (from `deactivate.d`), if any
             activate_scripts: tuple containing scripts associated with installed packages
                 that should be run on activation (from `activate.d`), if any
+        The snapshot recorded by the activation is restored when it is still valid; see
+        condact.snapshot.
         """
-        return self._activator.build_deactivate()
+        with span("snapshot.restore") as attrs:
+            plan = snapshot.restore(self.environ)
+            attrs["hit"] = plan is not None
+        if plan is not None:
+            return plan
+
+        plan = ActivationPlan.from_mapping(self._activator.build_deactivate())
+        var = snapshot.snapshot_var(self.environ.get("CONDA_SHLVL", ""))
+        if var not in self.environ:
+            return plan
+        # drop the stale snapshot of the deactivated environment
+        return ActivationPlan.from_mapping({**plan, "unset_vars": (*plan.unset_vars, var)})
     
-    def build_reactivate(self) -> dict:
+    @traced("PluginActivator.build_reactivate")
+    def build_reactivate(self) -> ActivationPlan:
         """
         Build dictionary with the following key-value pairs, to be used in updating the
         environment mapping:
@@ -244,7 +715,7 @@ class PluginActivator:
             activate_scripts: tuple containing scripts associated with installed packages
                 that should be run on activation (from `activate.d`), if any
         """
-        return self._activator.build_reactivate()
+        return ActivationPlan.from_mapping(self._activator.build_reactivate())
 
 
 class _ActivatorChild(_Activator):
@@ -252,11 +723,23 @@ class _ActivatorChild(_Activator):
     Consume shell hook to create child class compatible with the current conda activator logic.
     This class does not contain any public methods.
     """
-    def __init__(self, syntax: NamedTuple, arguments: argparse.Namespace | list[str]):
+
+    # whether switching between environments is reduced to a minimal transition
+    minimal_transitions = True
+
+    def __init__(
+        self,
+        syntax: NamedTuple,
+        arguments: argparse.Namespace | list[str],
+        environ: Mapping[str, str] | None = None,
+    ):
         """
         Create properties so that each class property is assigned the value from the corresponding
         property in the named tuple, based on the expected fields in the shell plugin hook.
         If a property is missing from the named tuple, it will be assigned a value of None.
+        self.environ is an EnvOverlay of environ (default: os.environ), the environment being
+        activated, which _Activator methods are called for with _conda_build.
+        _Activator.__init__ is not run, so that it does not copy os.environ.
 
         Expected properties:
             self.name: str
@@ -277,18 +760,20 @@ class _ActivatorChild(_Activator):
             self.set_var_tmpl: str
             self.tempfile_extension: str | None
             self.define_update_prompt: Callable[[dict, str], None] | None
-            
-            From _Activator:
-                self._raw_arguments: argparse.Namespace | list[str]
-                self.environ: mapping
+
+            self.environ: EnvOverlay
         """
 
         for field in CondaShellPlugins._fields:
             setattr(self, field, getattr(syntax, field, None))
 
+        _check_activator_init()
+        self._syntax = syntax
+        self._raw_arguments = arguments
         self.hook_source_path = ""
-        return super().__init__(arguments)
+        self.environ = EnvOverlay(environ)
 
+    @traced("_ActivatorChild._update_prompt")
     def _update_prompt(self, set_vars: dict, conda_prompt_modifier: str) -> None:
         """
         Update the prompt to include the current environment.
@@ -305,6 +790,54 @@ class _ActivatorChild(_Activator):
         else:
             pass
 
+    @traced("_ActivatorChild._build_activate_stack")
+    def _build_activate_stack(self, env_name_or_prefix: str, stack: bool) -> dict:
+        """
+        Build the activation dictionary with _Activator, serving it from the plan cache when
+        possible and reducing a switch between environments to a minimal transition.
+        """
+        cmds_dict = _cached_activate_stack(
+            self,
+            env_name_or_prefix,
+            stack,
+            lambda: self._conda_build(_Activator._build_activate_stack, env_name_or_prefix, stack),
+        )
+        return _transition(self, env_name_or_prefix, stack, cmds_dict).to_dict()
+
+    @traced("_ActivatorChild.build_reactivate")
+    def build_reactivate(self) -> dict:
+        """
+        Build the reactivation dictionary with _Activator, exporting the fingerprint of the
+        active prefix used by the no-op fast path of reactivate.
+        """
+        cmds_dict = self._conda_build(_Activator.build_reactivate)
+        prefix = self.environ.get("CONDA_PREFIX")
+        if not prefix:
+            return cmds_dict
+        return fingerprint.stamp(cmds_dict, prefix).to_dict()
+
+    @traced("_ActivatorChild.build_deactivate")
+    def build_deactivate(self) -> dict:
+        """Build the deactivation dictionary with _Activator."""
+        return self._conda_build(_Activator.build_deactivate)
+
+    def _conda_build(self, method: Callable, *args) -> dict:
+        """
+        Return the result of the _Activator method called with args, for the environment
+        self.environ (see _call_activator).
+        """
+        return _call_activator(self._syntax, self, method, *args)
+
+    @traced("_ActivatorChild._get_activate_scripts")
+    def _get_activate_scripts(self, prefix: str) -> tuple[str, ...]:
+        """Return the activate.d scripts of the prefix, as _Activator does."""
+        return super()._get_activate_scripts(prefix)
+
+    @traced("_ActivatorChild._get_deactivate_scripts")
+    def _get_deactivate_scripts(self, prefix: str) -> tuple[str, ...]:
+        """Return the deactivate.d scripts of the prefix, as _Activator does."""
+        return super()._get_deactivate_scripts(prefix)
+
     def _hook_preamble(self) -> str:
         """Placeholder function. ``_Activator`` requires child classes to include this method."""
         return ""
@@ -316,13 +849,13 @@ class _ActivatorChild(_Activator):
         For activate, set self.env_name_or_prefix and self.stack.
         """
         self.command = args.command
-        context.dev = args.dev or context.dev
+        _enable_dev(args.dev)
 
-        if self.command == "activate":
+        if self.command in ("activate", "run"):
             self.env_name_or_prefix = args.env or "base"
 
             if args.stack is None:
-                self.stack = context.auto_stack and context.shlvl <= context.auto_stack
+                self.stack = auto_stack(self.environ)
             else:
                 self.stack = args.stack
 
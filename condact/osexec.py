@@ -0,0 +1,116 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Activation with os.exec* plugins, from a plan that has already been built.
+
+PluginActivator.activate and condact-client (with plans built by the daemon) both replace
+the process through exec_activation, so that the script cache, the snapshots restored by
+deactivate and collapse mode apply the same way to both.
+"""
+from __future__ import annotations
+
+import os
+from typing import Mapping, Sequence
+
+from . import collapse, script_cache, snapshot
+from .environ import EnvOverlay
+from .plan import ActivationPlan
+from .trace import before_exec, span
+
+
+def update_env_map(plan: Mapping, environ: Mapping[str, str]) -> EnvOverlay:
+    """
+    Return the environment mapping for os.execve with the plan (or a builder dictionary)
+    applied to environ, as an EnvOverlay recording the changes; call materialize() on it to
+    get the dict passed to os.execve.
+    """
+    plan = ActivationPlan.from_mapping(plan)
+    env_map = EnvOverlay(environ)
+
+    for key in plan.unset_vars:
+        env_map.pop(str(key), None)
+
+    for key, value in plan.set_vars.items():
+        env_map[str(key)] = str(value)
+
+    for key, value in plan.export_path.items():
+        env_map[str(key)] = str(value)
+
+    for key, value in plan.export_vars.items():
+        env_map[str(key)] = str(value)
+
+    return env_map
+
+
+def cached_script_effects(
+    plan: ActivationPlan, env: Mapping[str, str], environ: Mapping[str, str], script_extension: str
+) -> tuple[int, dict, set]:
+    """
+    Return the number of leading activate.d scripts of plan that need not be run, because
+    their effect on the environment env (environ with the plan applied) is in the script
+    cache, and their combined effect: the variables to set and to unset. Only scripts with
+    the extension ``.sh`` are cached. See condact.script_cache.
+    """
+    if not script_cache.enabled(environ) or script_extension != ".sh":
+        return 0, {}, set()
+    with span("script_cache.apply") as attrs:
+        count, sets, unsets = script_cache.cached_effects(
+            env, plan.deactivate_scripts, plan.activate_scripts, environ
+        )
+        attrs["scripts"] = count
+    return count, sets, unsets
+
+
+def apply_cached_script_effects(
+    plan: ActivationPlan, env_map: EnvOverlay, environ: Mapping[str, str], script_extension: str
+) -> ActivationPlan:
+    """
+    Apply the effects of the leading activate.d scripts of plan that are in the script
+    cache (see cached_script_effects) to env_map, environ with plan applied, and return plan
+    without those scripts.
+    """
+    count, sets, unsets = cached_script_effects(plan, env_map, environ, script_extension)
+    if not count:
+        return plan
+    for key in unsets:
+        env_map.pop(key, None)
+    env_map.update(sets)
+    return ActivationPlan.from_mapping({**plan, "activate_scripts": plan.activate_scripts[count:]})
+
+
+def exec_activation(
+    plan: Mapping,
+    environ: Mapping[str, str],
+    script_path: str,
+    run_script_tmpl: str,
+    command_join: str,
+    script_extension: str,
+    snapshot_scripts: tuple[Sequence[str], Sequence[str]] | None = None,
+) -> int:
+    """
+    Replace the process with the plugin's script at script_path, which runs the deactivate.d
+    and activate.d scripts of plan in environ with plan applied. snapshot_scripts, given for
+    activate, are the scripts recorded in the snapshot that deactivate restores (see
+    condact.snapshot.take).
+    In collapse mode (see condact.collapse), the new process replaces the calling shell
+    instead, and 0 is returned.
+    """
+    plan = ActivationPlan.from_mapping(plan)
+    env_map = update_env_map(plan, environ)
+
+    plan = apply_cached_script_effects(plan, env_map, environ, script_extension)
+    # after the cached script effects, so that deactivate restores the variables they set
+    if snapshot_scripts is not None:
+        with span("snapshot.take"):
+            snapshot.take(environ, env_map, *snapshot_scripts)
+
+    deactivate_list, activate_list = plan.script_commands(run_script_tmpl, command_join)
+    arg_list = [script_path, *deactivate_list, *activate_list]
+
+    # the plugin scripts start the user's $SHELL
+    if collapse.handoff(environ, env_map, arg_list, env_map.get("SHELL", "")):
+        return 0
+
+    env = env_map.materialize()
+    before_exec(script_path)
+    os.execve(script_path, arg_list, env)
@@ -0,0 +1,110 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Locations of the per-user directories used by condact.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+
+
+def user_cache_dir() -> str:
+    """
+    Return the directory used for condact's persistent caches.
+    ``CONDACT_CACHE_DIR`` takes precedence over the platform default.
+    """
+    override = os.environ.get("CONDACT_CACHE_DIR")
+    if override:
+        return os.path.abspath(os.path.expanduser(override))
+
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+
+    return os.path.join(base, "condact")
+
+
+def user_runtime_dir() -> str:
+    """
+    Return a private (mode 0700) per-user directory for sockets and other short-lived files,
+    creating it if needed. ``XDG_RUNTIME_DIR`` is used when set, otherwise a directory named
+    after the user id is created in the system temporary directory.
+    Raise PermissionError if the directory exists but is not private to the current user.
+    """
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        path = os.path.join(runtime, "condact")
+    else:
+        uid = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+        path = os.path.join(tempfile.gettempdir(), f"condact-{uid}")
+
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+    if hasattr(os, "getuid"):
+        st = os.stat(path)
+        if st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise PermissionError(f"Runtime directory '{path}' is not private to the current user.")
+
+    return path
+
+
+def is_trusted(path: str) -> bool:
+    """
+    Return True if path exists, is owned by root or the current user and is not writable by
+    group or others, so that no other user can have put its content there.
+    Ownership is not checked on platforms without user ids.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if not hasattr(os, "getuid"):
+        return True
+    return st.st_uid in (0, os.getuid()) and not st.st_mode & 0o022
+
+
+def remove_stale_files(directory: str, max_age: float) -> None:
+    """
+    Remove the files in directory (including leftover temporary files) that have not been
+    used, that is modified, for max_age seconds. Errors are ignored.
+    """
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def write_atomic(path: str, data: str | bytes, mode: int | None = None) -> None:
+    """
+    Write data to path through a temporary file in the same directory that is renamed into
+    place, so that readers never observe a partially written file.
+    Create the parent directory if needed. Raise OSError if the file cannot be written.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as fh:
+            fh.write(data)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
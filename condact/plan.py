@@ -0,0 +1,183 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Immutable activation plans.
+
+An ActivationPlan holds what _build_activate_stack, build_deactivate and build_reactivate
+return: the variables to unset, set and export, and the deactivate.d and activate.d scripts
+to run. Its attributes are read-only; the plan is also a read-only Mapping with the keys of
+the dictionaries conda builds (``plan["set_vars"]`` returns a dict), so that shell plugins
+written against plain dictionaries keep working.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from types import MappingProxyType
+from typing import Any, Iterator, Mapping, Sequence
+
+# the keys of a plan, in the order plans are serialized
+PLAN_KEYS = (
+    "unset_vars",
+    "set_vars",
+    "export_path",
+    "export_vars",
+    "deactivate_scripts",
+    "activate_scripts",
+)
+
+_SEQUENCE_KEYS = frozenset({"unset_vars", "deactivate_scripts", "activate_scripts"})
+
+
+class ActivationPlan(Mapping):
+    """
+    An immutable activation plan with a stable hash, compact serialization and the shell
+    commands running its scripts computed once per shell syntax.
+    """
+
+    __slots__ = (
+        "_unset_vars",
+        "_set_vars",
+        "_export_path",
+        "_export_vars",
+        "_deactivate_scripts",
+        "_activate_scripts",
+        "_digest",
+        "_script_commands",
+    )
+
+    def __init__(
+        self,
+        unset_vars: Sequence[str] = (),
+        set_vars: Mapping[str, Any] | None = None,
+        export_path: Mapping[str, Any] | None = None,
+        export_vars: Mapping[str, Any] | None = None,
+        deactivate_scripts: Sequence[str] = (),
+        activate_scripts: Sequence[str] = (),
+    ):
+        init = super().__setattr__
+        init("_unset_vars", tuple(unset_vars))
+        init("_set_vars", dict(set_vars or {}))
+        init("_export_path", dict(export_path or {}))
+        init("_export_vars", dict(export_vars or {}))
+        init("_deactivate_scripts", tuple(deactivate_scripts))
+        init("_activate_scripts", tuple(activate_scripts))
+        init("_digest", None)
+        init("_script_commands", {})
+
+    @classmethod
+    def from_mapping(cls, cmds_dict: Mapping) -> ActivationPlan:
+        """
+        Return cmds_dict as an ActivationPlan. A plan is returned as is; in a dictionary
+        built by conda, missing keys are treated as empty.
+        """
+        if isinstance(cmds_dict, ActivationPlan):
+            return cmds_dict
+        return cls(**{key: cmds_dict.get(key) or () for key in PLAN_KEYS if key in cmds_dict})
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @property
+    def unset_vars(self) -> tuple[str, ...]:
+        return self._unset_vars
+
+    @property
+    def set_vars(self) -> Mapping[str, Any]:
+        return MappingProxyType(self._set_vars)
+
+    @property
+    def export_path(self) -> Mapping[str, Any]:
+        return MappingProxyType(self._export_path)
+
+    @property
+    def export_vars(self) -> Mapping[str, Any]:
+        return MappingProxyType(self._export_vars)
+
+    @property
+    def deactivate_scripts(self) -> tuple[str, ...]:
+        return self._deactivate_scripts
+
+    @property
+    def activate_scripts(self) -> tuple[str, ...]:
+        return self._activate_scripts
+
+    def __getitem__(self, key: str) -> Any:
+        """Return the value for key as conda builds it: a tuple, or a new dict."""
+        if key not in PLAN_KEYS:
+            raise KeyError(key)
+        value = super().__getattribute__("_" + key)
+        return value if key in _SEQUENCE_KEYS else dict(value)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(PLAN_KEYS)
+
+    def __len__(self) -> int:
+        return len(PLAN_KEYS)
+
+    def __contains__(self, key: object) -> bool:
+        return key in PLAN_KEYS
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{key}={self[key]!r}' for key in PLAN_KEYS)})"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ActivationPlan):
+            return self.digest == other.digest
+        return super().__eq__(other)
+
+    def __hash__(self) -> int:
+        return int(self.digest[:16], 16)
+
+    def __reduce__(self):
+        return (type(self), tuple(self[key] for key in PLAN_KEYS))
+
+    @property
+    def digest(self) -> str:
+        """Return a hex digest of the plan's content, stable across processes."""
+        if self._digest is None:
+            canonical = [
+                [str(key) for key in self._unset_vars],
+                sorted([str(k), str(v)] for k, v in self._set_vars.items()),
+                sorted([str(k), str(v)] for k, v in self._export_path.items()),
+                sorted([str(k), str(v)] for k, v in self._export_vars.items()),
+                list(self._deactivate_scripts),
+                list(self._activate_scripts),
+            ]
+            digest = hashlib.sha256(json.dumps(canonical, separators=(",", ":")).encode()).hexdigest()
+            super().__setattr__("_digest", digest)
+        return self._digest
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the plan as a new plain dict of JSON-compatible lists and dicts."""
+        return {key: list(value) if key in _SEQUENCE_KEYS else value for key, value in self.items()}
+
+    def to_json(self) -> str:
+        """Return the plan as compact JSON."""
+        return json.dumps(self.to_dict(), separators=(",", ":"), default=str)
+
+    @classmethod
+    def from_json(cls, data: str | bytes) -> ActivationPlan:
+        """Return the plan serialized by to_json. Raise ValueError if data is not a plan."""
+        cmds_dict = json.loads(data)
+        if not isinstance(cmds_dict, dict):
+            raise ValueError("Serialized activation plan must be a JSON object.")
+        return cls.from_mapping(cmds_dict)
+
+    def script_commands(self, run_script_tmpl: str, command_join: str) -> tuple[tuple[str, ...], tuple[str, ...]]:
+        """
+        Return the shell commands running the deactivate.d scripts and the activate.d
+        scripts, rendered with a shell plugin's run_script_tmpl and command_join. The
+        commands are computed once per template.
+        """
+        key = (run_script_tmpl, command_join)
+        commands = self._script_commands.get(key)
+        if commands is None:
+            commands = self._script_commands[key] = (
+                tuple((run_script_tmpl % script) + command_join for script in self._deactivate_scripts),
+                tuple((run_script_tmpl % script) + command_join for script in self._activate_scripts),
+            )
+        return commands
@@ -0,0 +1,147 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Versioned binary format for activation plans, used by the plan cache and the daemon.
+
+All integers are big-endian. A serialized plan is a 16-byte header followed by the body:
+
+    header  magic "CPLN" (4 bytes) | format version (u16) | flags (u16, 0)
+            | body length (u32) | CRC-32 of the body (u32)
+    body    the six plan fields, in the order of condact.plan.PLAN_KEYS:
+            unset_vars, deactivate_scripts, activate_scripts: count (u32), then values
+            set_vars, export_path, export_vars: count (u32), then key/value pairs
+
+Each key and value is a one-byte type tag followed by its data:
+``s`` a UTF-8 string (u32 length, bytes), ``i`` an integer (i64), ``t``/``f`` True/False,
+``n`` None. Strings are encoded with the ``surrogateescape`` error handler, so that values
+from os.environ holding bytes that are not valid UTF-8 are stored as those bytes.
+"""
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import Any, Mapping
+
+from .paths import write_atomic
+from .plan import PLAN_KEYS, ActivationPlan
+
+MAGIC = b"CPLN"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct(">4sHHII")
+_U32 = struct.Struct(">I")
+_I64 = struct.Struct(">q")
+
+_MAPPING_KEYS = frozenset({"set_vars", "export_path", "export_vars"})
+
+
+class PlanFormatError(ValueError):
+    """Raised when data is not a valid serialized activation plan."""
+
+
+def _dump_value(value: Any, out: list[bytes]) -> None:
+    if isinstance(value, bool):
+        out.append(b"t" if value else b"f")
+    elif isinstance(value, int) and -(2**63) <= value < 2**63:
+        out.append(b"i" + _I64.pack(value))
+    elif value is None:
+        out.append(b"n")
+    else:
+        data = str(value).encode("utf-8", "surrogateescape")
+        out.append(b"s" + _U32.pack(len(data)) + data)
+
+
+def dumps(plan: Mapping) -> bytes:
+    """Return the plan (an ActivationPlan or a dictionary built by conda) in binary format."""
+    plan = ActivationPlan.from_mapping(plan)
+    out: list[bytes] = []
+    for key in PLAN_KEYS:
+        value = plan[key]
+        out.append(_U32.pack(len(value)))
+        if key in _MAPPING_KEYS:
+            for item in value.items():
+                _dump_value(item[0], out)
+                _dump_value(item[1], out)
+        else:
+            for item in value:
+                _dump_value(item, out)
+
+    body = b"".join(out)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(body), zlib.crc32(body)) + body
+
+
+def loads(data: bytes) -> ActivationPlan:
+    """
+    Return the activation plan serialized by dumps.
+    Raise PlanFormatError if data is truncated, corrupted or of an unsupported version.
+    """
+    view = memoryview(data)
+    if len(view) < _HEADER.size:
+        raise PlanFormatError("Serialized activation plan is truncated.")
+
+    magic, version, _flags, length, checksum = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise PlanFormatError("Data is not a serialized activation plan.")
+    if version != FORMAT_VERSION:
+        raise PlanFormatError(f"Unsupported activation plan format version: {version}.")
+    body = view[_HEADER.size :]
+    if len(body) != length:
+        raise PlanFormatError("Serialized activation plan is truncated.")
+    if zlib.crc32(body) != checksum:
+        raise PlanFormatError("Serialized activation plan is corrupted (checksum mismatch).")
+
+    pos = 0
+    unpack_u32 = _U32.unpack_from
+
+    def read_value() -> Any:
+        nonlocal pos
+        tag = body[pos]
+        pos += 1
+        if tag == 0x73:  # s
+            (size,) = unpack_u32(body, pos)
+            pos += 4 + size
+            return str(body[pos - size : pos], "utf-8", "surrogateescape")
+        if tag == 0x69:  # i
+            (number,) = _I64.unpack_from(body, pos)
+            pos += 8
+            return number
+        if tag == 0x74:  # t
+            return True
+        if tag == 0x66:  # f
+            return False
+        if tag == 0x6E:  # n
+            return None
+        raise PlanFormatError(f"Unknown value tag in serialized activation plan: {tag!r}.")
+
+    fields = {}
+    try:
+        for key in PLAN_KEYS:
+            (count,) = unpack_u32(body, pos)
+            pos += 4
+            if key in _MAPPING_KEYS:
+                fields[key] = {read_value(): read_value() for _ in range(count)}
+            else:
+                fields[key] = [read_value() for _ in range(count)]
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise PlanFormatError(f"Serialized activation plan is malformed: {e}") from e
+    if pos != len(body):
+        raise PlanFormatError("Serialized activation plan has trailing data.")
+
+    return ActivationPlan(**fields)
+
+
+def dump(plan: Mapping, path: str, mode: int | None = None) -> None:
+    """
+    Write the plan to path in binary format, atomically, with the permission bits mode if
+    given. Raise OSError on failure.
+    """
+    write_atomic(path, dumps(plan), mode)
+
+
+def load(path: str) -> ActivationPlan:
+    """
+    Read a plan written by dump.
+    Raise OSError if path cannot be read, or PlanFormatError if it is not a valid plan.
+    """
+    with open(path, "rb") as fh:
+        return loads(fh.read())
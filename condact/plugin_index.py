@@ -0,0 +1,125 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Persisted index of the shell plugins provided through entry points.
+
+Scanning entry points reads the metadata of every installed distribution. The index maps
+each shell plugin name to the entry point that provides it, so that a single plugin module
+can be imported instead. It is invalidated whenever a directory on ``sys.path`` changes,
+which happens whenever a distribution is installed or removed.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+from importlib import import_module
+from importlib.metadata import entry_points
+from typing import Any, Iterable
+
+from .paths import user_cache_dir, write_atomic
+
+
+def index_path() -> str:
+    """Return the path of the persisted plugin index."""
+    return os.path.join(user_cache_dir(), "plugin-index.json")
+
+
+def site_fingerprint(paths: Iterable[str] | None = None) -> str:
+    """
+    Return a fingerprint of the directories on sys.path (or paths). Adding or removing a
+    dist-info directory changes the modification time of its parent directory.
+    """
+    digest = hashlib.sha1()
+    for path in sys.path if paths is None else paths:
+        try:
+            mtime = os.stat(path or ".").st_mtime_ns
+        except OSError:
+            mtime = -1
+        digest.update(f"{path}:{mtime};".encode())
+    return digest.hexdigest()
+
+
+def provided_shells(plugin: Any) -> list[str]:
+    """Return the names of the shell plugins yielded by a plugin's conda_shells hook, if any."""
+    hook = getattr(plugin, "conda_shells", None)
+    if hook is None:
+        return []
+    try:
+        return [shell.name for shell in hook()]
+    except Exception:
+        return []
+
+
+def _entry_points(group: str) -> Iterable:
+    eps = entry_points()
+    return eps.select(group=group) if hasattr(eps, "select") else eps.get(group, ())
+
+
+def load_index() -> dict[str, dict]:
+    """
+    Return the persisted mapping of shell plugin names to entry points, or an empty dict if
+    there is no index or it no longer matches the installed distributions.
+    """
+    try:
+        with open(index_path()) as fh:
+            index = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(index, dict) or index.get("fingerprint") != site_fingerprint():
+        return {}
+    return index.get("plugins", {})
+
+
+def update_index(pm, group: str) -> dict[str, dict]:
+    """
+    Record which entry point provides each shell plugin, using the plugins already loaded
+    into the plugin manager by a full entry point scan. Return the new mapping.
+    """
+    plugins = {}
+    for entry_point in _entry_points(group):
+        plugin = pm.get_plugin(entry_point.name)
+        for name in provided_shells(plugin):
+            plugins.setdefault(name, {"entry_point": entry_point.name, "value": entry_point.value})
+
+    try:
+        write_atomic(index_path(), json.dumps({"fingerprint": site_fingerprint(), "plugins": plugins}))
+    except OSError:
+        pass
+
+    return plugins
+
+
+def _load_value(value: str) -> Any:
+    """Import the object named by an entry point value ('module' or 'module:attr')."""
+    module_name, _, attr = value.partition(":")
+    obj = import_module(module_name.strip())
+    for part in attr.strip().split(".") if attr.strip() else ():
+        obj = getattr(obj, part)
+    return obj
+
+
+def load_indexed_plugin(pm, plugin_name: str) -> bool:
+    """
+    Register the entry point that provides plugin_name, according to the index.
+    Return False if the index does not know the plugin or is out of date.
+    """
+    entry = load_index().get(plugin_name)
+    if entry is None:
+        return False
+
+    plugin = pm.get_plugin(entry["entry_point"])
+    if plugin is None:
+        try:
+            plugin = _load_value(entry["value"])
+        except Exception:
+            return False
+        if plugin_name not in provided_shells(plugin):
+            return False
+        if not pm.is_registered(plugin):
+            pm.register(plugin, name=entry["entry_point"])
+        return True
+
+    return plugin_name in provided_shells(plugin)
@@ -2,13 +2,22 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from __future__ import annotations
 
+import hashlib
 import os
 import re
+from typing import TYPE_CHECKING
 
 from conda.activate import native_path_to_unix
 
-from condact import CondaShellPlugins, hookimpl
-from condact.logic import PluginActivator
+from condact import CondaShellPlugins, collapse, hookimpl
+from condact.paths import remove_stale_files, user_runtime_dir, write_atomic
+from condact.trace import before_exec
+
+if TYPE_CHECKING:
+    from condact.logic import PluginActivator
+
+# rcfiles that no activation has used for this long are removed
+RCFILE_MAX_AGE = 7 * 24 * 60 * 60
 
 class Custom:
     def _update_prompt(environ: os.environ, set_vars: dict, conda_prompt_modifier: str) -> None:
@@ -35,19 +44,55 @@ class Custom:
             }
         )
 
-def write_script(script_path: str, argv: list) -> None:
-    with open(script_path, "w") as script_file:
-            script_file.write("#!/bin/sh \n")
-            for a in argv:
-                script_file.write(a+"\n")
-            # script_file.write("PS1=$CONDA_PROMPT_MODIFIER+$PS1 \n")
+def rcfile_dir() -> str:
+    """Return the private directory holding the generated rcfiles."""
+    return os.path.join(user_runtime_dir(), "rcfiles")
+
+
+def render_script(argv: list) -> str:
+    """Return the content of the rcfile running the commands in argv."""
+    return "#!/bin/sh \n" + "".join(a + "\n" for a in argv)
+
+
+def write_script(argv: list) -> str:
+    """
+    Return the path of an rcfile running the commands in argv. The file is named after a hash
+    of its content, so concurrent activations never overwrite each other's rcfile and an
+    identical plan reuses the existing file; its modification time is only refreshed, to keep
+    it from being garbage-collected. New files are written atomically.
+    """
+    content = render_script(argv)
+    directory = rcfile_dir()
+    path = os.path.join(directory, hashlib.sha256(content.encode()).hexdigest()[:32] + ".sh")
+
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        write_atomic(path, content, mode=0o600)
+        remove_stale_files(directory, RCFILE_MAX_AGE)
+    return path
+
 
 def custom_activate(activator: PluginActivator, cmds_dict: dict) -> SystemExit:
+    """
+    Start bash with an rcfile applying the activation plan. In collapse mode (see
+    condact.collapse), the rcfile also loads the collapse conda function, and bash replaces
+    the shell this command was run from if that shell runs the function.
+    """
     path = "/bin/bash"
     env_args = activator._get_env_arg_list(cmds_dict, [])
-    write_script(activator.script_path, env_args)
+    if collapse.enabled(activator.environ):
+        env_args.append(activator.run_script_tmpl % collapse.FUNCTION_SCRIPT)
+    argv = [path, "--rcfile", write_script(env_args)]
+
+    env_map = activator.update_env_map(cmds_dict)
+    activator.record_snapshot(env_map)
+    if collapse.handoff(activator.environ, env_map, argv):
+        return 0
 
-    os.execv(path, [path, "--rcfile", activator.script_path])
+    env = env_map.materialize()
+    before_exec(path)
+    os.execve(path, argv, env)
 
 @hookimpl
 def conda_shells():
@@ -0,0 +1,165 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import weakref
+from typing import Iterable, TYPE_CHECKING
+
+from conda.exceptions import PluginError
+
+from .shell_types import CondaShellPlugins
+
+if TYPE_CHECKING:
+    from conda.plugins.manager import CondaPluginManager
+
+# fields every shell plugin must define, as listed in the CondaShellPlugins docstring
+REQUIRED_FIELDS = (
+    "name",
+    "summary",
+    "osexec",
+    "pathsep_join",
+    "sep",
+    "path_conversion",
+    "script_extension",
+    "command_join",
+    "run_script_tmpl",
+)
+
+# fields that plugins using classic activation logic (osexec=False) must also define
+REQUIRED_TEMPLATE_FIELDS = (
+    "export_var_tmpl",
+    "unset_var_tmpl",
+    "set_var_tmpl",
+)
+
+_registries = weakref.WeakKeyDictionary()
+
+
+def validate_shell_plugin(syntax: CondaShellPlugins) -> None:
+    """
+    Check a shell plugin hook against the rules in the CondaShellPlugins docstring.
+    Raise PluginError describing the first rule that is broken.
+
+    Plugins with ``osexec=True`` may still define the variable templates, as plugins with
+    custom activation logic use them to write their scripts.
+    """
+    name = getattr(syntax, "name", None)
+
+    missing = [field for field in REQUIRED_FIELDS if getattr(syntax, field, None) is None]
+    if missing:
+        raise PluginError(f"Shell plugin '{name}' is missing required fields: {', '.join(missing)}.")
+
+    if not isinstance(syntax.osexec, bool):
+        raise PluginError(f"Shell plugin '{name}' must set 'osexec' to True or False.")
+
+    if syntax.osexec:
+        if not syntax.script_path:
+            raise PluginError(f"Shell plugin '{name}' uses os.exec* but does not set 'script_path'.")
+    else:
+        missing = [field for field in REQUIRED_TEMPLATE_FIELDS if getattr(syntax, field, None) is None]
+        if missing:
+            raise PluginError(
+                f"Shell plugin '{name}' does not use os.exec* but is missing: {', '.join(missing)}."
+            )
+
+    for field in ("custom", "define_update_prompt", "path_conversion"):
+        value = _resolve_callable(getattr(syntax, field, None))
+        if value and not callable(value):
+            raise PluginError(f"Shell plugin '{name}' field '{field}' must be callable.")
+
+
+def _resolve_callable(value):
+    """Unwrap staticmethod objects, which are not callable before Python 3.10."""
+    return value.__func__ if isinstance(value, staticmethod) else value
+
+
+def resolve_shell_plugin(syntax: CondaShellPlugins) -> CondaShellPlugins:
+    """
+    Return the descriptor stored in the registry for a validated shell plugin hook: a
+    CondaShellPlugins tuple with staticmethod wrappers unwrapped and a false ``custom``
+    normalized to None.
+    """
+    fields = {field: getattr(syntax, field, None) for field in CondaShellPlugins._fields}
+    fields["custom"] = _resolve_callable(fields["custom"]) or None
+    fields["define_update_prompt"] = _resolve_callable(fields["define_update_prompt"])
+    fields["path_conversion"] = _resolve_callable(fields["path_conversion"])
+    return CondaShellPlugins(**fields)
+
+
+class ShellPluginRegistry:
+    """
+    Shell plugin hooks indexed by name. Each hook is validated when it is registered; an
+    invalid hook, or a name shared by several hooks, only raises an error when it is looked
+    up, so that it cannot break the other plugins.
+    """
+
+    def __init__(self, plugins: Iterable[CondaShellPlugins] = ()):
+        self._plugins: dict[str, CondaShellPlugins] = {}
+        self._errors: dict[str, PluginError] = {}
+        for syntax in plugins:
+            self.register(syntax)
+
+    @classmethod
+    def from_plugin_manager(cls, pm: CondaPluginManager) -> ShellPluginRegistry:
+        """Create a registry from the results of the plugin manager's shell hooks."""
+        return cls(pm.get_hook_results("shells"))
+
+    def register(self, syntax: CondaShellPlugins) -> None:
+        """
+        Validate and add a shell plugin hook. If a plugin with the same name is already
+        registered, the name is recorded as conflicting and looking it up raises an error.
+        """
+        name = getattr(syntax, "name", None)
+        if name in self._plugins or name in self._errors:
+            self._plugins.pop(name, None)
+            self._errors[name] = PluginError(f"Conflicting shell plugins found with name '{name}'.")
+            return
+
+        try:
+            validate_shell_plugin(syntax)
+        except PluginError as e:
+            self._errors[name] = e
+            return
+
+        self._plugins[name] = resolve_shell_plugin(syntax)
+
+    def get(self, name: str) -> CondaShellPlugins:
+        """
+        Return the shell plugin hook with the given name.
+        Raise PluginError if no plugins are registered, the plugin is unknown or it is invalid.
+        """
+        try:
+            return self._plugins[name]
+        except KeyError:
+            pass
+
+        if name in self._errors:
+            raise self._errors[name]
+        if not self:
+            raise PluginError("No shell plugins found.")
+        raise PluginError(f"No shell plugin found with name '{name}'.")
+
+    def names(self) -> list[str]:
+        """Return the names of all valid registered shell plugins."""
+        return list(self._plugins)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._plugins
+
+    def __len__(self) -> int:
+        return len(self._plugins) + len(self._errors)
+
+
+def get_registry(pm: CondaPluginManager) -> ShellPluginRegistry:
+    """
+    Return the shell plugin registry for the plugin manager. The registry is built once and
+    reused until the set of plugins registered with the plugin manager changes.
+    """
+    token = frozenset(id(plugin) for plugin in pm.get_plugins())
+    cached = _registries.get(pm)
+    if cached is not None and cached[0] == token:
+        return cached[1]
+
+    registry = ShellPluginRegistry.from_plugin_manager(pm)
+    _registries[pm] = (token, registry)
+    return registry
@@ -0,0 +1,178 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Cache of the effect of activate.d scripts on the environment, enabled by setting
+``CONDACT_SCRIPT_CACHE``.
+
+Some activate.d scripts (compilers, CUDA toolkits, Java) take a long time to run, but only
+set environment variables. With the cache enabled, an activate.d script is run once in a
+subshell, in a temporary working directory and without input, and the changes it makes to
+the environment are stored in the plan format (as variables to export and to unset), keyed
+by the script's path and content and by the environment it ran in. Later activations apply
+the stored changes instead of sourcing the script.
+
+Scripts with effects beyond environment variables (shell functions, aliases, files) must
+not be cached: ``CONDACT_SCRIPT_CACHE_DENY`` lists the script file names (glob patterns,
+comma-separated) that always run in the shell, and if ``CONDACT_SCRIPT_CACHE_ALLOW`` is set,
+only the scripts it lists are cached. Scripts run in order, so only the scripts before the
+first one that is not cached are applied from the cache, and only when no deactivate.d
+scripts run before them. Scripts that fail are not cached. ``CONDACT_NO_CACHE`` disables the
+script cache along with the plan cache.
+"""
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Mapping, Sequence
+
+from .cache import PlanCache
+from .paths import user_cache_dir
+from .plan import ActivationPlan
+
+ENABLE_VAR = "CONDACT_SCRIPT_CACHE"
+ALLOW_VAR = "CONDACT_SCRIPT_CACHE_ALLOW"
+DENY_VAR = "CONDACT_SCRIPT_CACHE_DENY"
+
+# seconds a script may run for when its effect is captured
+CAPTURE_TIMEOUT = 60
+
+# variables maintained by the shell itself, which are neither part of a script's effect nor
+# of the environment it is keyed by; condact's own variables change with every activation
+_SHELL_VARS = frozenset({"PWD", "OLDPWD", "SHLVL", "_"})
+_IGNORED_PREFIX = "_CONDACT_"
+
+# prints the environment as JSON; the interpreter may set LC_CTYPE when it starts (PEP 538),
+# so its value from before is passed along
+_PRINT_ENV = """
+import json, os, sys
+env = dict(os.environ)
+env.pop("LC_CTYPE", None)
+if env.pop("_CONDACT_LC_CTYPE_SET", None):
+    env["LC_CTYPE"] = env["_CONDACT_LC_CTYPE"]
+sys.stdout.write(json.dumps(env))
+"""
+
+# sources the script, with its output sent to stderr, then prints the environment with an
+# isolated interpreter, unaffected by PYTHON* variables the script may set
+_CAPTURE = (
+    '. "$1" >&2 && _CONDACT_LC_CTYPE="${LC_CTYPE-}" _CONDACT_LC_CTYPE_SET="${LC_CTYPE+1}" '
+    'exec "$2" -I -c "$3"'
+)
+
+
+def enabled(environ: Mapping[str, str]) -> bool:
+    """Return True if the script cache is enabled, and caching is not disabled, in environ."""
+    return bool(environ.get(ENABLE_VAR)) and not environ.get("CONDACT_NO_CACHE")
+
+
+def script_cache_dir() -> str:
+    """Return the directory of the script cache."""
+    return os.path.join(user_cache_dir(), "scripts")
+
+
+def _patterns(environ: Mapping[str, str], name: str) -> list[str]:
+    return [pattern.strip() for pattern in environ.get(name, "").split(",") if pattern.strip()]
+
+
+def is_cacheable(script: str, environ: Mapping[str, str]) -> bool:
+    """Return True if the allow and deny lists of environ let the effect of script be cached."""
+    name = os.path.basename(script)
+    if not script.endswith(".sh") or any(fnmatch.fnmatch(name, p) for p in _patterns(environ, DENY_VAR)):
+        return False
+    allow = _patterns(environ, ALLOW_VAR)
+    return not allow or any(fnmatch.fnmatch(name, pattern) for pattern in allow)
+
+
+def _relevant(name: str) -> bool:
+    return name not in _SHELL_VARS and not name.startswith(_IGNORED_PREFIX)
+
+
+def script_key(script: str, env: Mapping[str, str]) -> str | None:
+    """Return the cache key of running script in env, or None if the script cannot be read."""
+    try:
+        with open(script, "rb") as fh:
+            content = hashlib.sha256(fh.read()).hexdigest()
+    except OSError:
+        return None
+    items = sorted((key, value) for key, value in env.items() if _relevant(key))
+    return PlanCache.key(script, content, hashlib.sha256(json.dumps(items).encode()).hexdigest())
+
+
+def capture(script: str, env: Mapping[str, str]) -> ActivationPlan | None:
+    """
+    Run script in a subshell with the environment env, and return its effect on the
+    environment as a plan exporting and unsetting variables. Return None if the script fails.
+    """
+    with tempfile.TemporaryDirectory(prefix="condact-script-") as cwd:
+        try:
+            process = subprocess.run(
+                ["/bin/sh", "-c", _CAPTURE, "sh", script, sys.executable, _PRINT_ENV],
+                env=dict(env),
+                cwd=cwd,
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                timeout=CAPTURE_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+    if process.returncode != 0:
+        return None
+    try:
+        after = json.loads(process.stdout)
+    except ValueError:
+        return None
+
+    return ActivationPlan(
+        unset_vars=sorted(key for key in env if key not in after and _relevant(key)),
+        export_vars={key: value for key, value in after.items() if env.get(key) != value and _relevant(key)},
+    )
+
+
+def cached_effects(
+    env: Mapping[str, str],
+    deactivate_scripts: Sequence[str],
+    activate_scripts: Sequence[str],
+    environ: Mapping[str, str],
+) -> tuple[int, dict[str, str], set[str]]:
+    """
+    Return the number of leading activate_scripts whose effect can be applied instead of
+    running them, starting from the environment env, and their combined effect: the
+    variables to set and the variables to unset. The effect of scripts not in the cache yet
+    is captured. environ holds the settings of the script cache.
+    """
+    if not enabled(environ) or deactivate_scripts:
+        return 0, {}, set()
+
+    cache = PlanCache(script_cache_dir())
+    current = dict(env)
+    sets: dict[str, str] = {}
+    unsets: set[str] = set()
+    count = 0
+    for script in activate_scripts:
+        if not is_cacheable(script, environ):
+            break
+        key = script_key(script, current)
+        if key is None:
+            break
+        effect = cache.get(key)
+        if effect is None:
+            effect = capture(script, current)
+            if effect is None:
+                break
+            cache.put(key, effect)
+
+        for name in effect.unset_vars:
+            current.pop(name, None)
+            sets.pop(name, None)
+            unsets.add(name)
+        for name, value in effect.export_vars.items():
+            current[name] = value
+            sets[name] = value
+            unsets.discard(name)
+        count += 1
+    return count, sets, unsets
@@ -0,0 +1,38 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+# conda function for the collapse mode of the os.exec* plugins (CONDACT_COLLAPSE)
+#
+# Source this file in interactive POSIX shells. ``conda shell`` then hands the new shell
+# back to this function, which replaces the current shell with it (or exits to the
+# shell the environment was first activated from) instead of nesting another shell.
+# When it is loaded through $ENV, the file that $ENV named before is kept in
+# _CONDACT_USER_ENV and sourced here.
+
+if [ -n "${_CONDACT_USER_ENV:-}" ] && [ -r "$_CONDACT_USER_ENV" ]; then
+    . "$_CONDACT_USER_ENV"
+fi
+
+conda() {
+    if [ "$#" -lt 1 ]; then
+        "$CONDA_EXE" $_CE_M $_CE_CONDA
+        return
+    fi
+    case "$1" in
+        shell)
+            __condact_handoff="$(mktemp "${TMPDIR:-/tmp}/condact-handoff.XXXXXX")" || return
+            _CONDACT_HANDOFF="$__condact_handoff" _CONDACT_SHELL_PPID="$PPID" \
+                "$CONDA_EXE" $_CE_M $_CE_CONDA "$@"
+            __condact_status=$?
+            if [ "$__condact_status" -eq 0 ] && [ -s "$__condact_handoff" ]; then
+                # replaces or exits this shell
+                . "$__condact_handoff"
+            fi
+            rm -f "$__condact_handoff"
+            unset __condact_handoff
+            return "$__condact_status"
+            ;;
+        *)
+            "$CONDA_EXE" $_CE_M $_CE_CONDA "$@"
+            ;;
+    esac
+}
@@ -9,6 +9,15 @@ eval "$@"
 # run an interactive instance of the user's default shell to complete activation
 # new shell will inherit the environment variables of this process
 # we are only using the shell environment variable because POSIX plugin covers a range of shells
+# in collapse mode (CONDACT_COLLAPSE), the shell replaces this script, so that it is a
+# direct child of the shell activation ran in; bash is given the rcfile loading the collapse
+# conda function (_CONDACT_RCFILE), as it does not read $ENV
+if [ -n "${CONDACT_COLLAPSE:-}" ]; then
+    if [ -n "${_CONDACT_RCFILE:-}" ]; then
+        exec ${SHELL} --rcfile "$_CONDACT_RCFILE"
+    fi
+    exec ${SHELL}
+fi
 ${SHELL}
 
 exit 0
@@ -2,45 +2,62 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from __future__ import annotations
 
-from typing import Iterable, Callable
+from typing import TYPE_CHECKING
 
-from conda.plugins.manager import (
-    CondaPluginManager
-)
 from conda.base.context import context
-from conda.cli.main import init_loggers
-from conda.exceptions import PluginError
 
+from .plugin_index import load_indexed_plugin, provided_shells, update_index
+from .registry import get_registry
 from .shell_hookspec import ShellPluginSpecs, spec_name
+from .trace import span, traced
+
+if TYPE_CHECKING:
+    from conda.plugins.manager import CondaPluginManager
+
+    from .shell_types import CondaShellPlugins
 
 # TODO: do I need to cache this?
-def update_plugin_manager(plugins: list) -> CondaPluginManager:
+@traced("shell_manager.update_plugin_manager")
+def update_plugin_manager(plugins: list, plugin_name: str | None = None) -> CondaPluginManager:
     """
-    Update the plugin manager with the available shell plugin hooks.
+    Update the plugin manager with the available shell plugin hooks. Calling this again
+    re-initializes the context but does not register anything twice.
+    If plugin_name is provided by one of the given plugins, or by an entry point recorded in
+    the plugin index, entry points are not scanned; otherwise they are, and the index is updated.
     Return the updated plugin manager.
     """
-    context.__init__()
-    init_loggers(context)
+    from conda.cli.main import init_loggers
+
+    with span("context.init"):
+        context.__init__()
+        init_loggers(context)
 
     pm = context.plugin_manager
-    pm.add_hookspecs(ShellPluginSpecs)
-    pm.load_plugins(*plugins)
-    pm.load_entrypoints(spec_name)
+
+    # the plugin manager is global, so this function may already have updated it
+    shells_hook = getattr(pm.hook, "conda_shells", None)
+    if shells_hook is None or not shells_hook.has_spec():
+        pm.add_hookspecs(ShellPluginSpecs)
+    pm.load_plugins(*(plugin for plugin in plugins if not pm.is_registered(plugin)))
+
+    with span("plugin_index.lookup") as attrs:
+        attrs["hit"] = plugin_name is not None and (
+            any(plugin_name in provided_shells(plugin) for plugin in plugins)
+            or load_indexed_plugin(pm, plugin_name)
+        )
+    if attrs["hit"]:
+        return pm
+
+    with span("load_entrypoints"):
+        pm.load_entrypoints(spec_name)
+        update_index(pm, spec_name)
     return pm
 
 
-def get_shell_syntax(pm: CondaPluginManager, plugin_name: str) -> Iterable[Callable]:
+@traced("shell_manager.get_shell_syntax")
+def get_shell_syntax(pm: CondaPluginManager, plugin_name: str) -> CondaShellPlugins:
     """
-    Return shell plugin hook with specified name.
-    Raise error if no shell plugin hooks are found.
+    Return shell plugin hook with specified name, from the plugin manager's shell plugin registry.
+    Raise error if no shell plugin hooks are found, or if the named hook is invalid.
     """
-    shell_hooks = pm.get_hook_results("shells")
-
-    if not shell_hooks:
-        raise PluginError("No shell plugins found.")
-
-    for hook in shell_hooks:
-        if hook.name == plugin_name:
-            return hook
-        
-    raise PluginError(f"No shell plugin found with name '{plugin_name}'.")
\ No newline at end of file
+    return get_registry(pm).get(plugin_name)
@@ -0,0 +1,145 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Snapshots of the environment before an activation, restored by deactivate.
+
+When an os.exec* plugin activates an environment, the variables the activation changes are
+recorded with their previous values as a deactivation plan: the previous values are exported
+again, variables that did not exist are unset, and the plan runs the deactivate.d scripts of
+the activated environment and the activate.d scripts of the environment it returns to. The
+plan is stored in the format of condact.plan_format (which is checksummed) in the runtime
+directory, named after its digest, and ``_CONDACT_SNAPSHOT_<CONDA_SHLVL>`` records the digest
+together with a digest of the variables as the activation left them.
+
+``conda shell deactivate`` restores the snapshot of the current CONDA_SHLVL without building
+a plan. A snapshot is stale, and deactivate builds the plan with conda instead, if its file
+is missing or invalid, or if one of the recorded variables (other than the prompt) changed
+since the activation.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Iterable, Mapping, MutableMapping, Sequence
+
+from . import plan_format
+from .paths import remove_stale_files, user_runtime_dir
+from .plan import ActivationPlan
+
+SNAPSHOT_VAR_PREFIX = "_CONDACT_SNAPSHOT_"
+
+SNAPSHOT_SUFFIX = ".plan"
+
+# snapshots that no activation has used for this long are removed
+SNAPSHOT_MAX_AGE = 7 * 24 * 60 * 60
+
+# variables restored by a snapshot, but not checked for changes: shells commonly reset the
+# prompt when they start
+_UNCHECKED_VARS = frozenset({"PS1", "prompt"})
+
+
+def snapshot_dir() -> str:
+    """Return the private directory holding the snapshots."""
+    return os.path.join(user_runtime_dir(), "snapshots")
+
+
+def snapshot_var(shlvl: object) -> str:
+    """Return the name of the variable recording the snapshot of an activation to shlvl."""
+    return f"{SNAPSHOT_VAR_PREFIX}{shlvl}"
+
+
+def _checked_vars(plan: ActivationPlan) -> list[str]:
+    names = {*plan.export_vars, *plan.unset_vars} - _UNCHECKED_VARS
+    return sorted(name for name in names if not name.startswith(SNAPSHOT_VAR_PREFIX))
+
+
+def state_digest(environ: Mapping[str, str], names: Iterable[str]) -> str:
+    """Return a digest of the values (or absence) of the variables names in environ."""
+    state = [[name, environ.get(name)] for name in names]
+    return hashlib.sha1(json.dumps(state).encode()).hexdigest()
+
+
+def restore(environ: Mapping[str, str]) -> ActivationPlan | None:
+    """
+    Return the deactivation plan recorded by the activation to the current CONDA_SHLVL of
+    environ, or None if there is no snapshot or it is stale.
+    """
+    record = environ.get(snapshot_var(environ.get("CONDA_SHLVL", "")), "")
+    digest, _, state = record.partition(":")
+    if not digest or not state:
+        return None
+
+    try:
+        plan = plan_format.load(os.path.join(snapshot_dir(), digest + SNAPSHOT_SUFFIX))
+    except (OSError, plan_format.PlanFormatError):
+        return None
+    if plan.digest != digest or state_digest(environ, _checked_vars(plan)) != state:
+        return None
+    return plan
+
+
+def take(
+    environ: Mapping[str, str],
+    env_map: MutableMapping[str, str],
+    deactivate_scripts: Sequence[str],
+    activate_scripts: Sequence[str],
+) -> None:
+    """
+    Record the snapshot of the activation from environ to the environment mapping env_map
+    (an EnvOverlay of environ) in env_map. deactivate_scripts are the deactivate.d scripts of
+    the activated environment and activate_scripts the activate.d scripts of the environment
+    that deactivating it returns to.
+    An activation that replaces the environment at the same CONDA_SHLVL returns to the state
+    recorded by the snapshot it replaces; without a valid one, no snapshot is recorded.
+    Failure to write the snapshot is not an error; deactivate then builds its plan with conda.
+    """
+    new_shlvl = env_map.get("CONDA_SHLVL")
+    if not new_shlvl:
+        return
+    var = snapshot_var(new_shlvl)
+
+    sets, unsets = env_map.changes()
+    previous_values = {}
+    absent = {var}
+    for name in (*sets, *unsets):
+        if name.startswith(SNAPSHOT_VAR_PREFIX):
+            continue
+        if name in environ:
+            previous_values[name] = environ[name]
+        else:
+            absent.add(name)
+
+    if environ.get("CONDA_SHLVL", "0") == new_shlvl:
+        replaced = restore(environ)
+        if replaced is None:
+            env_map.pop(var, None)
+            return
+        # the replaced activation's snapshot holds the values from before it
+        for name in replaced.export_vars:
+            absent.discard(name)
+        previous_values = {
+            **{name: value for name, value in previous_values.items() if name not in replaced.unset_vars},
+            **replaced.export_vars,
+        }
+        absent.update(replaced.unset_vars)
+        activate_scripts = replaced.activate_scripts
+
+    plan = ActivationPlan(
+        unset_vars=sorted(absent),
+        export_vars=previous_values,
+        deactivate_scripts=deactivate_scripts,
+        activate_scripts=activate_scripts,
+    )
+    try:
+        directory = snapshot_dir()
+        path = os.path.join(directory, plan.digest + SNAPSHOT_SUFFIX)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            plan_format.dump(plan, path)
+            remove_stale_files(directory, SNAPSHOT_MAX_AGE)
+    except OSError:
+        env_map.pop(var, None)
+        return
+    env_map[var] = f"{plan.digest}:{state_digest(env_map, _checked_vars(plan))}"
@@ -0,0 +1,151 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Per-phase timing instrumentation.
+
+When ``CONDACT_TRACE=<path>`` is set (or ``conda shell --trace <path>`` is used), each
+instrumented phase appends one JSON line to the trace file when it finishes:
+
+    {"name": "logic.parse_and_build", "start": 1690000000.1, "duration_ms": 12.3,
+     "pid": 4242, "depth": 1, "parent": "cli.execute", "attrs": {...}}
+
+Spans that are still open when the process is replaced by ``os.execve`` are written by
+``before_exec`` with ``"exec": true``. Tracing is a no-op unless enabled.
+"""
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+
+class _Tracer:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def stack(self) -> list[tuple[str, float, float, dict]]:
+        """Return the spans open in the current thread, innermost last."""
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", buffering=1)
+                # a single write per line, so concurrent processes do not interleave records
+                self._file.write(line)
+            except OSError:
+                pass
+
+    def record(self, name: str, wall: float, start: float, attrs: dict, **extra: Any) -> dict:
+        parent = self.stack[-1][0] if self.stack else None
+        return {
+            "name": name,
+            "start": wall,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "pid": os.getpid(),
+            "depth": len(self.stack),
+            "parent": parent,
+            "attrs": attrs,
+            **extra,
+        }
+
+    def close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+
+_tracer: _Tracer | None = _Tracer(os.environ["CONDACT_TRACE"]) if os.environ.get("CONDACT_TRACE") else None
+
+
+def enable(path: str) -> None:
+    """Start writing spans to path, replacing any trace file set by ``CONDACT_TRACE``."""
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = _Tracer(path)
+
+
+def enabled() -> bool:
+    """Return True if spans are being recorded."""
+    return _tracer is not None
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[dict]:
+    """
+    Time the enclosed block and write it to the trace file as a span called name.
+    Yield the span's attributes, which may be updated inside the block.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield attrs
+        return
+
+    entry = (name, time.time(), time.perf_counter(), attrs)
+    tracer.stack.append(entry)
+    error = None
+    try:
+        yield attrs
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            error = f"SystemExit({e.code})"
+        raise
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        # before_exec may already have written the span
+        if tracer.stack and tracer.stack[-1] is entry:
+            tracer.stack.pop()
+            extra = {"error": error} if error else {}
+            tracer.write(tracer.record(name, entry[1], entry[2], attrs, **extra))
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorate a function so that each call is recorded as a span called name."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def before_exec(path: str) -> None:
+    """
+    Write the spans that are still open, and an ``exec`` event for path, before the process
+    is replaced by os.exec*. Nothing written after this point would reach the trace file.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return
+
+    tracer.write(tracer.record("exec", time.time(), time.perf_counter(), {"path": path}))
+    while tracer.stack:
+        name, wall, start, attrs = tracer.stack.pop()
+        tracer.write(tracer.record(name, wall, start, attrs, exec=True))
+    tracer.close()
@@ -0,0 +1,115 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Minimal transitions between environments.
+
+Switching from environment A to environment B without stacking builds a plan that runs all
+of A's deactivate.d scripts, all of B's activate.d scripts and sets every conda variable.
+plan_transition reduces that plan to what actually changes:
+
+- variables whose value in the current environment already matches the plan are not set
+  again, and variables which are not set are not unset;
+- a deactivate.d script of A is skipped if B has the same script, with the same content,
+  and the matching activate.d script of B is skipped if A has it too; that is, the scripts
+  of packages shared by both environments are not run.
+
+Skipping scripts is only correct if a package's scripts do not depend on the prefix they
+were installed to, so packages opt in: a script is only skipped if it contains the line
+``# condact: transition-safe`` among its first lines, or if its file name is listed in the
+comma-separated ``CONDACT_TRANSITION_SCRIPTS`` variable.
+"""
+from __future__ import annotations
+
+import filecmp
+import os
+from typing import Collection, Mapping
+
+from .plan import ActivationPlan
+
+TRANSITION_MARKER = b"condact: transition-safe"
+
+# number of lines at the start of a script searched for TRANSITION_MARKER
+MARKER_LINES = 10
+
+
+def opted_in_scripts(environ: Mapping[str, str]) -> frozenset[str]:
+    """Return the script file names listed in CONDACT_TRANSITION_SCRIPTS."""
+    names = environ.get("CONDACT_TRANSITION_SCRIPTS", "")
+    return frozenset(name.strip() for name in names.split(",") if name.strip())
+
+
+def is_transition_safe(path: str, opted_in: Collection[str] = ()) -> bool:
+    """
+    Return True if the package owning the script at path has opted in to skipping it
+    when switching between environments which share the package.
+    """
+    if os.path.basename(path) in opted_in:
+        return True
+    try:
+        with open(path, "rb") as fh:
+            for _, line in zip(range(MARKER_LINES), fh):
+                if line.lstrip().startswith((b"#", b"::", b"REM", b"rem")) and TRANSITION_MARKER in line:
+                    return True
+    except OSError:
+        pass
+    return False
+
+
+def _shared_scripts(
+    scripts: tuple[str, ...],
+    prefix: str,
+    other_prefix: str,
+    subdir: str,
+    opted_in: Collection[str],
+) -> frozenset[str]:
+    """
+    Return the scripts, located in subdir of prefix, that other_prefix has an identical copy
+    of and that may be skipped.
+    """
+    script_dir = os.path.join(prefix, "etc", "conda", subdir)
+    other_dir = os.path.join(other_prefix, "etc", "conda", subdir)
+    shared = set()
+    for script in scripts:
+        if os.path.dirname(script) != script_dir:
+            continue
+        other = os.path.join(other_dir, os.path.basename(script))
+        try:
+            same = filecmp.cmp(script, other, shallow=False)
+        except OSError:
+            continue
+        if same and is_transition_safe(script, opted_in):
+            shared.add(script)
+    return frozenset(shared)
+
+
+def plan_transition(
+    plan: ActivationPlan,
+    environ: Mapping[str, str],
+    old_prefix: str,
+    new_prefix: str,
+) -> ActivationPlan:
+    """
+    Return the activation plan switching from old_prefix to new_prefix (built without
+    stacking, against environ) reduced to the variables that change and the scripts of
+    the packages that are not shared by both environments.
+    """
+    opted_in = opted_in_scripts(environ)
+    deactivate_scripts = plan.deactivate_scripts
+    activate_scripts = plan.activate_scripts
+    if old_prefix != new_prefix:
+        skipped = _shared_scripts(deactivate_scripts, old_prefix, new_prefix, "deactivate.d", opted_in)
+        deactivate_scripts = tuple(script for script in deactivate_scripts if script not in skipped)
+        skipped = _shared_scripts(activate_scripts, new_prefix, old_prefix, "activate.d", opted_in)
+        activate_scripts = tuple(script for script in activate_scripts if script not in skipped)
+
+    def changed(variables: Mapping) -> dict:
+        return {key: value for key, value in variables.items() if environ.get(str(key)) != str(value)}
+
+    return ActivationPlan(
+        unset_vars=tuple(key for key in plan.unset_vars if str(key) in environ),
+        set_vars=changed(plan.set_vars),
+        export_path=changed(plan.export_path),
+        export_vars=changed(plan.export_vars),
+        deactivate_scripts=deactivate_scripts,
+        activate_scripts=activate_scripts,
+    )
@@ -0,0 +1,22 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""Fixtures shared by the tests and the benchmarks."""
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def condact_cache_dir(tmp_path, monkeypatch) -> str:
+    """Keep condact's caches out of the user's cache directory."""
+    cache_dir = str(tmp_path / "condact-cache")
+    monkeypatch.setenv("CONDACT_CACHE_DIR", cache_dir)
+    return cache_dir
+
+
+@pytest.fixture(autouse=True)
+def condact_runtime_dir(tmp_path, monkeypatch) -> str:
+    """Keep condact's snapshots and rcfiles out of the user's runtime directory."""
+    runtime_dir = str(tmp_path / "runtime")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", runtime_dir)
+    return runtime_dir
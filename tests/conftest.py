@@ -1,7 +1,10 @@
+from __future__ import annotations
+
+import os
 import pytest
 import uuid
 
-from typing import Iterable, NamedTuple
+from typing import Callable, Iterable, Mapping, NamedTuple
 
 from conda.plugins.hookspec import CondaSpecs
 from conda.plugins.manager import CondaPluginManager
@@ -12,6 +15,27 @@ from condact.plugins import posix_cl, posix_ose
 
 from .test_manager import BashPlugin
 
+
+@pytest.fixture
+def make_prefix(tmp_path) -> Callable[..., str]:
+    """
+    Return a factory creating a minimal environment prefix (a conda-meta directory) named
+    name in tmp_path, with the given files (paths relative to the prefix, mapped to their
+    content), and returning its path.
+    """
+
+    def make(name: str = "env", files: Mapping[str, str] | None = None) -> str:
+        path = tmp_path / name
+        os.makedirs(path / "conda-meta")
+        for relpath, content in (files or {}).items():
+            file = path / relpath
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text(content)
+        return str(path)
+
+    return make
+
+
 @pytest.fixture
 def plugin_manager(mocker) -> CondaPluginManager:
     """Return a mocked plugin manager with the shell hookspec registered but no plugins loaded."""
@@ -0,0 +1,94 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from condact import aio
+
+
+@pytest.fixture
+def prefix(make_prefix) -> str:
+    """Return a minimal environment prefix."""
+    return make_prefix()
+
+
+@pytest.fixture
+def blocked_build(mocker) -> threading.Event:
+    """Make builds block until the returned event is set, and return their arguments."""
+    release = threading.Event()
+
+    def build(syntax, env_name_or_prefix, **kwargs):
+        release.wait(5)
+        return {"env": env_name_or_prefix}
+
+    mocker.patch("condact.api.get_shell_plugin")
+    mocker.patch("condact.api.build_plan", side_effect=build)
+    return release
+
+
+@pytest.mark.osexec
+def test_build_activate(posix_ose_hook, mocker, prefix):
+    """Test that plans and environment mappings are built without blocking the loop"""
+    mocker.patch("condact.api.get_shell_plugin", return_value=posix_ose_hook)
+    environ = {"PATH": "/usr/bin", "CONDA_SHLVL": "0"}
+
+    async def main():
+        plan = await aio.build_activate(prefix, environ=environ)
+        env = await aio.build_activate(prefix, environ=environ, materialize=True)
+        return plan, env
+
+    plan, env = asyncio.run(main())
+
+    assert plan["export_vars"]["CONDA_PREFIX"] == prefix
+    assert type(env) is dict
+    assert env["CONDA_PREFIX"] == prefix
+
+
+def test_build_activate_coalesces(blocked_build):
+    """Test that concurrent requests for the same environment share one build"""
+    from condact import api
+
+    async def main():
+        requests = [asyncio.ensure_future(aio.build_activate("a", environ={})) for _ in range(3)]
+        requests.append(asyncio.ensure_future(aio.build_activate("b", environ={})))
+        await asyncio.sleep(0.05)
+        blocked_build.set()
+        return await asyncio.gather(*requests)
+
+    results = asyncio.run(main())
+
+    assert results == [{"env": "a"}] * 3 + [{"env": "b"}]
+    assert api.build_plan.call_count == 2
+    assert aio._inflight == {}
+
+
+def test_build_activate_timeout(blocked_build):
+    """Test that a timeout stops one request without cancelling the build for the others"""
+
+    async def main():
+        waiting = asyncio.ensure_future(aio.build_activate("a", environ={}))
+        with pytest.raises(asyncio.TimeoutError):
+            await aio.build_activate("a", environ={}, timeout=0.05)
+        blocked_build.set()
+        return await waiting
+
+    assert asyncio.run(main()) == {"env": "a"}
+
+
+def test_build_activate_error(mocker):
+    """Test that build errors are raised to every request"""
+    mocker.patch("condact.api.get_shell_plugin")
+    mocker.patch("condact.api.build_plan", side_effect=ValueError("boom"))
+
+    async def main():
+        return await asyncio.gather(
+            aio.build_activate("a", environ={}), aio.build_activate("a", environ={}), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,169 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import os
+import threading
+from types import MappingProxyType
+
+import pytest
+from conda.base.context import context
+
+from condact.api import ActivationSession, build_many, condarc_files
+from condact.plan import ActivationPlan
+
+
+@pytest.fixture
+def prefixes(make_prefix) -> list[str]:
+    """Return the paths of several minimal environment prefixes."""
+    return [make_prefix(f"env{i}") for i in range(8)]
+
+
+@pytest.fixture
+def osexec_plugin(posix_ose_hook, mocker):
+    """Make build_many use the posix_ose hook of the mocked plugin manager."""
+    return mocker.patch("condact.api.get_shell_plugin", return_value=posix_ose_hook)
+
+
+@pytest.mark.osexec
+def test_build_many(osexec_plugin, prefixes):
+    """Test that a plan is built for each environment"""
+    plans = build_many(prefixes, max_workers=4)
+
+    assert list(plans) == prefixes
+    for prefix, plan in plans.items():
+        assert plan["export_vars"]["CONDA_PREFIX"] == prefix
+    osexec_plugin.assert_called_once_with("posix_ose")
+
+
+@pytest.mark.osexec
+def test_build_many_materialize(osexec_plugin, prefixes):
+    """Test that materialized environment mappings are plain dicts based on environ"""
+    env_maps = build_many(prefixes[:2], environ={"PATH": "/usr/bin", "KEEP": "1"}, materialize=True)
+
+    for prefix, env_map in env_maps.items():
+        assert type(env_map) is dict
+        assert env_map["CONDA_PREFIX"] == prefix
+        assert env_map["KEEP"] == "1"
+
+
+@pytest.mark.osexec
+def test_build_many_foreign_environ(osexec_plugin, prefixes, monkeypatch):
+    """Test that plans for another environment are built without modifying os.environ"""
+    environ = {"PATH": "/usr/bin", "CONDA_SHLVL": "0"}
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "environ", MappingProxyType(dict(os.environ)))
+        plans = build_many(prefixes[:4], environ=environ, max_workers=4)
+
+    for prefix, plan in plans.items():
+        assert str(plan["export_vars"]["CONDA_SHLVL"]) == "1"
+        assert plan["export_vars"]["CONDA_PREFIX"] == prefix
+
+
+@pytest.mark.osexec
+def test_build_many_concurrent(osexec_plugin, prefixes, mocker):
+    """Test that the builds run at the same time"""
+    barrier = threading.Barrier(2, timeout=5)
+    mocker.patch("condact.api.build_plan", side_effect=lambda *args, **kwargs: barrier.wait())
+
+    plans = build_many(prefixes[:2], max_workers=2)
+
+    # each build returned its index at the barrier, which both builds reached together
+    assert sorted(plans.values()) == [0, 1]
+
+
+@pytest.mark.osexec
+def test_build_many_dev_restored(osexec_plugin, prefixes):
+    """Test that context.dev is set for the builds only"""
+    dev = context.dev
+    build_many(prefixes[:2], dev=True)
+
+    assert context.dev == dev
+
+
+@pytest.mark.osexec
+def test_build_many_errors(osexec_plugin, prefixes, mocker):
+    """Test that build errors are raised, or returned with return_exceptions"""
+    mocker.patch("condact.api.build_plan", side_effect=ValueError("boom"))
+
+    with pytest.raises(ValueError, match="boom"):
+        build_many(prefixes[:2])
+
+    results = build_many(prefixes[:2], return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results.values())
+
+
+@pytest.fixture
+def condarc(tmp_path, monkeypatch):
+    """Make a condarc file in tmp_path the only file on conda's search path."""
+    path = tmp_path / "condarc"
+    path.write_text("changeps1: true\n")
+    monkeypatch.setattr("condact.api.SEARCH_PATH", (str(path),))
+    return path
+
+
+@pytest.fixture
+def session(posix_ose_hook, condarc) -> ActivationSession:
+    """Return a session of the posix_ose plugin, starting without an active environment."""
+    return ActivationSession(environ={"PATH": "/usr/bin", "CONDA_SHLVL": "0"})
+
+
+@pytest.mark.osexec
+def test_session_activate_deactivate(session, prefixes, mocker):
+    """Test that the session tracks its environment through activate and deactivate"""
+    execve = mocker.patch("os.execve")
+    before = dict(os.environ)
+    plan = session.activate(prefixes[0])
+
+    # built from the session's environment, not from the active environment of the process
+    assert plan["export_vars"]["CONDA_PREFIX"] == prefixes[0]
+    assert plan["export_vars"]["CONDA_SHLVL"] == 1
+    assert session.environ["CONDA_PREFIX"] == prefixes[0]
+    assert session.environ["PATH"].startswith(prefixes[0])
+
+    assert session.reactivate() == ActivationPlan()
+
+    session.deactivate()
+    assert "CONDA_PREFIX" not in session.environ
+    assert session.environ["PATH"] == "/usr/bin"
+    assert session.environ["CONDA_SHLVL"] == "0"
+    assert dict(os.environ) == before
+    execve.assert_not_called()
+
+
+@pytest.mark.osexec
+def test_session_env_for(session, prefixes):
+    """Test that env_for leaves the session's environment unchanged"""
+    env = session.env_for(prefixes[1])
+
+    assert env["CONDA_PREFIX"] == prefixes[1]
+    assert "CONDA_PREFIX" not in session.environ
+
+
+@pytest.mark.osexec
+def test_session_reloads_on_condarc_change(session, prefixes, condarc):
+    """Test that conda's context is reloaded only when a condarc file changes"""
+    from condact import shell_manager
+
+    session.env_for(prefixes[0])
+    session.env_for(prefixes[1])
+    assert shell_manager.update_plugin_manager.call_count == 1
+
+    condarc.write_text("changeps1: false\n")
+    os.utime(condarc, ns=(0, 0))
+    session.env_for(prefixes[0])
+    assert shell_manager.update_plugin_manager.call_count == 2
+
+
+def test_condarc_files(tmp_path, monkeypatch):
+    """Test that condarc files are expanded and condarc.d directories are listed"""
+    (tmp_path / "condarc.d").mkdir()
+    (tmp_path / "condarc.d" / "a.yml").write_text("")
+    monkeypatch.setenv("TEST_CONDARC_DIR", str(tmp_path))
+    monkeypatch.setattr(
+        "condact.api.SEARCH_PATH",
+        ("$TEST_CONDARC_DIR/condarc.d/", "$TEST_CONDARC_DIR/.condarc", "$UNSET_CONDARC_VAR/.condarc"),
+    )
+
+    assert condarc_files() == [str(tmp_path / "condarc.d"), str(tmp_path / "condarc.d" / "a.yml")]
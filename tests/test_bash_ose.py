@@ -0,0 +1,44 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import os
+import stat
+
+from condact.paths import remove_stale_files
+from condact.plugins.bash_ose import RCFILE_MAX_AGE, rcfile_dir, write_script
+
+
+def test_write_script():
+    """Test that rcfiles are private and named after their content"""
+    path = write_script(["export A='1'", "unset B"])
+
+    assert os.path.dirname(path) == rcfile_dir()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    with open(path) as fh:
+        assert fh.read() == "#!/bin/sh \nexport A='1'\nunset B\n"
+
+    assert write_script(["export A='2'"]) != path
+
+
+def test_write_script_reuses_file(mocker):
+    """Test that an identical plan reuses the existing rcfile without writing it again"""
+    path = write_script(["export A='1'"])
+    os.utime(path, (0, 0))
+    write_atomic = mocker.patch("condact.plugins.bash_ose.write_atomic")
+
+    assert write_script(["export A='1'"]) == path
+    write_atomic.assert_not_called()
+    assert os.stat(path).st_mtime > 0
+
+
+def test_remove_stale_rcfiles():
+    """Test that only rcfiles unused for longer than the maximum age are removed"""
+    old = write_script(["export A='old'"])
+    new = write_script(["export A='new'"])
+    os.utime(old, (0, 0))
+
+    remove_stale_files(rcfile_dir(), RCFILE_MAX_AGE)
+
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
@@ -0,0 +1,219 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+from argparse import Namespace
+import json
+import os
+import time
+
+import pytest
+
+from condact.cache import SHARED_TEMPLATE_VAR, PlanCache, environ_digest, prefix_fingerprint
+from condact.logic import PluginActivator, _plan_cache_key, warm_shared_cache
+
+PLAN = {
+    "unset_vars": ["CONDA_PREFIX_1"],
+    "set_vars": {"PS1": "(test) "},
+    "export_vars": {"PATH": "/a/bin:/usr/bin", "CONDA_SHLVL": 1},
+    "deactivate_scripts": (),
+    "activate_scripts": ("/a/etc/conda/activate.d/x.sh",),
+}
+
+
+@pytest.fixture
+def prefix(make_prefix) -> str:
+    """Return a minimal environment prefix with an activate.d script."""
+    return make_prefix(files={"etc/conda/activate.d/base.sh": "export BASE=1\n"})
+
+
+def test_prefix_fingerprint_changes_with_activate_d(prefix):
+    """Test that adding an activate.d script changes the prefix fingerprint."""
+    before = prefix_fingerprint(prefix)
+    assert prefix_fingerprint(prefix) == before
+
+    time.sleep(0.01)
+    with open(os.path.join(prefix, "etc", "conda", "activate.d", "pkg.sh"), "w") as fh:
+        fh.write("export PKG=1\n")
+
+    assert prefix_fingerprint(prefix) != before
+
+
+def test_environ_digest_ignores_unrelated_variables():
+    """Test that only the variables read by the activation build affect the digest."""
+    env = {"PATH": "/usr/bin", "CONDA_SHLVL": "0", "HOME": "/home/a"}
+
+    assert environ_digest(env) == environ_digest({**env, "HOME": "/home/b"})
+    assert environ_digest(env) != environ_digest({**env, "CONDA_SHLVL": "1"})
+
+
+def test_plan_cache_key_covers_active_prefix_and_state_variables(posix_ose_hook, make_prefix):
+    """Test that the key changes with the active prefix and the values the activation saves."""
+    prefix = make_prefix(files={"conda-meta/state": json.dumps({"env_vars": {"FOO": "env"}})})
+    old_prefix = make_prefix("old")
+    environ = {"PATH": "/usr/bin", "CONDA_SHLVL": "1", "CONDA_PREFIX": old_prefix}
+
+    def key(**changes: str) -> str:
+        activator = PluginActivator(posix_ose_hook, {**environ, **changes})
+        return _plan_cache_key(activator, prefix, prefix, False)
+
+    before = key()
+    assert key(HOME="/home/b") == before
+    assert key(FOO="user") != before
+
+    os.makedirs(os.path.join(old_prefix, "etc", "conda", "deactivate.d"))
+    assert key() != before
+
+
+def test_plan_cache_round_trip(tmp_path):
+    """Test that a stored plan is returned with its sequences restored to tuples."""
+    cache = PlanCache(str(tmp_path))
+    key = cache.key("/a", "posix_ose", False)
+
+    assert cache.get(key) is None
+    cache.put(key, PLAN)
+    plan = cache.get(key)
+
+    assert plan["activate_scripts"] == PLAN["activate_scripts"]
+    assert isinstance(plan["unset_vars"], tuple)
+    assert plan["export_vars"]["PATH"] == "/a/bin:/usr/bin"
+
+
+def test_plan_cache_evicts_least_recently_used(tmp_path):
+    """Test that the least recently used entries are evicted once the cache is full."""
+    cache = PlanCache(str(tmp_path), max_entries=2)
+    keys = [cache.key(i) for i in range(3)]
+
+    cache.put(keys[0], PLAN)
+    cache.put(keys[1], PLAN)
+    os.utime(cache._path(keys[1]), (1, 1))
+    cache.get(keys[0])
+    cache.put(keys[2], PLAN)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+
+
+def test_plan_cache_stats_and_clear(tmp_path):
+    """Test that stats reports the cached entries and clear removes them."""
+    cache = PlanCache(str(tmp_path))
+    cache.put(cache.key("a"), PLAN)
+    cache.put(cache.key("b"), PLAN)
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] > 0
+
+    assert cache.clear() == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_plan_cache_disabled(monkeypatch):
+    """Test that CONDACT_NO_CACHE disables the plan cache."""
+    monkeypatch.setenv("CONDACT_NO_CACHE", "1")
+    assert PlanCache.from_environ() is None
+
+
+@pytest.mark.osexec
+def test_osexec_cache_hit_skips_activator(posix_ose_hook, mocker):
+    """Test that a cached activation plan is returned without creating an _Activator."""
+    ns = Namespace(command="activate", env=None, dev=False, stack=None)
+    first = PluginActivator(posix_ose_hook).parse_and_build(ns)
+
+    activator = PluginActivator(posix_ose_hook)
+    build = mocker.patch("condact.logic._Activator._build_activate_stack")
+    second = activator.parse_and_build(ns)
+
+    build.assert_not_called()
+    assert activator._activator_child is None
+    assert second["export_vars"] == first["export_vars"]
+
+
+def test_shared_cache_entries(tmp_path, monkeypatch):
+    """Test that shared entries are world-readable, and are neither touched nor evicted."""
+    monkeypatch.setenv("CONDACT_SHARED_CACHE_DIR", str(tmp_path / "shared"))
+    cache = PlanCache.shared_from_environ()
+    keys = [cache.key(i) for i in range(3)]
+    cache.max_entries = 2
+    for key in keys:
+        cache.put(key, PLAN)
+    os.utime(cache._path(keys[0]), (1, 1))
+
+    assert cache.get(keys[0]) is not None
+    assert os.stat(cache._path(keys[0])).st_mtime == 1
+    assert os.stat(cache._path(keys[0])).st_mode & 0o777 == 0o644
+    assert cache.stats()["entries"] == 3
+
+    monkeypatch.setenv("CONDACT_NO_CACHE", "1")
+    assert PlanCache.shared_from_environ() is None
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="ownership is only checked with user ids")
+def test_shared_cache_untrusted(tmp_path, monkeypatch):
+    """Test that shared entries writable by other users, or in such a directory, are ignored."""
+    monkeypatch.setenv("CONDACT_SHARED_CACHE_DIR", str(tmp_path / "shared"))
+    cache = PlanCache.shared_from_environ()
+    key = cache.key("untrusted")
+    cache.put(key, PLAN)
+    os.chmod(cache.directory, 0o755)
+    assert cache.get(key) is not None
+
+    os.chmod(cache._path(key), 0o666)
+    assert cache.get(key) is None
+
+    os.chmod(cache._path(key), 0o644)
+    os.chmod(cache.directory, 0o777)
+    assert cache.get(key) is None
+
+    os.chmod(cache.directory, 0o755)
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(cache.directory).st_uid + 1)
+    if os.stat(cache.directory).st_uid != 0:
+        assert cache.get(key) is None
+
+
+@pytest.mark.osexec
+def test_osexec_shared_cache_hit(posix_ose_hook, mocker, tmp_path, monkeypatch):
+    """Test that a plan warmed into the shared cache is used without building it."""
+    monkeypatch.setenv("CONDACT_SHARED_CACHE_DIR", str(tmp_path / "shared"))
+    ns = Namespace(command="activate", env=None, dev=False, stack=None)
+    expected = PluginActivator(posix_ose_hook).parse_and_build(ns)
+    PlanCache().clear()
+
+    assert warm_shared_cache(posix_ose_hook, ["base"], PlanCache.shared_from_environ())
+
+    activator = PluginActivator(posix_ose_hook)
+    build = mocker.patch("condact.logic._Activator._build_activate_stack")
+    plan = activator.parse_and_build(ns)
+
+    build.assert_not_called()
+    assert plan["export_vars"] == expected["export_vars"]
+    assert PlanCache().stats()["entries"] == 0
+
+
+@pytest.mark.currentlogic
+def test_cl_shared_cache_rebuilt_for_user(posix_cl_hook, make_prefix, mocker, tmp_path, monkeypatch):
+    """Test that a shared plan is used from a shell with another PATH and prompt, rebuilt for it."""
+    monkeypatch.setenv("CONDACT_SHARED_CACHE_DIR", str(tmp_path / "shared"))
+    old_prefix = make_prefix("old")
+    prefix = make_prefix()
+    old_bin = os.path.join(old_prefix, "bin")
+    monkeypatch.setenv("CONDA_SHLVL", "1")
+    monkeypatch.setenv("CONDA_PREFIX", old_prefix)
+    monkeypatch.setenv("PATH", f"{old_bin}:/usr/bin:/bin")
+    monkeypatch.setenv("PS1", "$ ")
+    assert warm_shared_cache(posix_cl_hook, [prefix], PlanCache.shared_from_environ()) == [prefix]
+
+    environ = {**os.environ, "PATH": f"{old_bin}:/home/user/bin:/usr/bin", "PS1": "user> "}
+    ns = Namespace(command="activate", env=prefix, dev=False, stack=False)
+    expected = PluginActivator(posix_cl_hook, environ).parse_and_build(ns)
+    PlanCache().clear()
+
+    build = mocker.patch("condact.logic._Activator._build_activate_stack")
+    plan = PluginActivator(posix_cl_hook, environ).parse_and_build(ns)
+
+    build.assert_not_called()
+    assert plan == expected
+    assert plan["export_vars"]["PATH"] == f"{prefix}/bin:/home/user/bin:/usr/bin"
+    assert plan["set_vars"]["PS1"].endswith("user> ")
+    assert SHARED_TEMPLATE_VAR not in plan["export_vars"]
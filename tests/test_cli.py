@@ -1,6 +1,12 @@
+from importlib.metadata import entry_points
+import json
+import os
+import subprocess
+import sys
+
 import pytest
 
-from condact.cli import get_parsed_args
+from condact.cli import PLUGINS, get_parsed_args, load_plugin_modules, run_command
 
 VALIDATE_GET_PARSED_ARGS_TEST_CASES = (
     (["--name", "foo", "activate"], ("foo", "activate", False, None, None)),
@@ -52,4 +58,194 @@ def test_get_parsed_args_help_flag(capsys):
     with pytest.raises(SystemExit):
         get_parsed_args(["-h"])
     captured = capsys.readouterr()
-    assert "Process conda activate, deactivate, and reactivate" in captured.out
\ No newline at end of file
+    assert "Process conda activate, deactivate, and reactivate" in captured.out
+
+@pytest.mark.parametrize("cache_command", ["stats", "clear"])
+def test_get_parsed_args_cache(cache_command: str):
+    """Test that the cache command is parsed without a plugin name"""
+    ns = get_parsed_args(["cache", cache_command])
+
+    assert ns.command == "cache"
+    assert ns.cache_command == cache_command
+
+
+def test_get_parsed_args_cache_warm():
+    """Test that cache warm takes the plugin name and a list of environments"""
+    ns = get_parsed_args(["-n", "posix_ose", "cache", "warm", "a", "b"])
+
+    assert ns.plugin == "posix_ose"
+    assert ns.cache_command == "warm"
+    assert ns.envs == ["a", "b"]
+
+
+def test_get_parsed_args_export():
+    """Test that export takes an environment, a format and the scripts mode"""
+    ns = get_parsed_args(["-n", "posix_ose", "export", "test_env", "--format", "systemd", "--scripts", "warn"])
+
+    assert (ns.command, ns.env, ns.output_format, ns.scripts, ns.output) == (
+        "export",
+        "test_env",
+        "systemd",
+        "warn",
+        None,
+    )
+
+
+@pytest.mark.parametrize(
+    "a",
+    [["-n", "posix_cl", "compile", "test_env"], ["compile", "-n", "posix_cl", "test_env"]],
+)
+def test_get_parsed_args_compile(a: list):
+    """Test that the plugin name is accepted before or after the compile command"""
+    ns = get_parsed_args(a)
+
+    assert ns.plugin == "posix_cl"
+    assert ns.command == "compile"
+    assert ns.env == "test_env"
+
+
+def test_load_plugin_modules_requested_plugin_only():
+    """Test that only the module of a requested built-in plugin is imported"""
+    modules = load_plugin_modules("posix_cl")
+
+    assert [module.__name__ for module in modules] == ["condact.plugins.posix_cl"]
+
+
+def test_load_plugin_modules_unknown_plugin_loads_all():
+    """Test that all built-in plugin modules are imported for a plugin that is not built in"""
+    modules = load_plugin_modules("external_plugin")
+
+    assert [module.__name__ for module in modules] == [f"condact.plugins.{name}" for name in PLUGINS]
+
+
+def _condact_is_registered() -> bool:
+    eps = entry_points()
+    group = eps.select(group="conda") if hasattr(eps, "select") else eps.get("conda", ())
+    return any(ep.value == "condact.cli" for ep in group)
+
+
+# total import time allowed for `conda shell -n posix_cl activate`, in microseconds
+IMPORT_TIME_BUDGET_US = int(os.environ.get("CONDACT_IMPORT_TIME_BUDGET_US", 1_500_000))
+
+
+@pytest.mark.skipif(not _condact_is_registered(), reason="condact is not installed as a conda plugin")
+def test_import_time_budget_posix_cl_activate():
+    """
+    Test that `conda shell -n posix_cl activate` stays within its import-time budget and does
+    not import modules that only other subcommands or plugins need
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "conda", "shell", "-n", "posix_cl", "activate"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+    imported = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        imported[name.strip()] = int(self_us)
+
+    assert "condact.plugins.posix_cl" in imported
+    for unneeded in ("condact.plugins.bash_ose", "condact.plugins.posix_ose", "condact.daemon"):
+        assert unneeded not in imported
+    assert sum(imported.values()) <= IMPORT_TIME_BUDGET_US
+
+
+@pytest.mark.parametrize(
+    "a, env, argv",
+    [
+        (["-n", "posix_ose", "run", "test_env", "--", "python", "-V"], "test_env", ["python", "-V"]),
+        (["-n", "posix_ose", "run", "--", "python", "-V"], None, ["python", "-V"]),
+        (["-n", "posix_ose", "run", "test_env", "python", "--", "-V"], "test_env", ["python", "--", "-V"]),
+    ],
+)
+def test_get_parsed_args_run(a: list, env: str, argv: list):
+    """Test that the command given to run is separated from the environment"""
+    ns = get_parsed_args(a)
+
+    assert ns.command == "run"
+    assert ns.env == env
+    assert ns.argv == argv
+    assert ns.stack is False
+
+
+def test_get_parsed_args_run_no_command(capsys):
+    """Test that run requires a command"""
+    with pytest.raises(SystemExit):
+        get_parsed_args(["-n", "posix_ose", "run", "test_env"])
+    assert "required: command" in capsys.readouterr().err
+
+
+def test_get_parsed_args_json_unsupported(capsys):
+    """Test that --json is rejected for commands without JSON output"""
+    with pytest.raises(SystemExit):
+        get_parsed_args(["--json", "export", "base"])
+
+    assert "--json is not supported by the export command" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("plugin", ["posix_ose", "posix_cl"])
+def test_run_command_json(plugin, request, mocker, make_prefix, capsys):
+    """Test that --json prints the plan and the environment changes instead of activating"""
+    request.getfixturevalue(f"{plugin}_hook")
+    execve = mocker.patch("os.execve")
+    prefix = make_prefix()
+
+    with pytest.raises(SystemExit) as exc:
+        run_command(get_parsed_args(["-n", plugin, "--json", "activate", prefix]))
+
+    assert exc.value.code == 0
+    execve.assert_not_called()
+    result = json.loads(capsys.readouterr().out)
+    assert result["command"] == "activate"
+    assert result["plugin"] == plugin
+    assert set(result["plan"]) == {
+        "unset_vars",
+        "set_vars",
+        "export_path",
+        "export_vars",
+        "deactivate_scripts",
+        "activate_scripts",
+    }
+    assert result["environment"]["set"]["CONDA_PREFIX"] == prefix
+    assert result["environment"]["set"]["PATH"].startswith(prefix)
+
+
+def test_run_command_json_error(posix_ose_hook, tmp_path, capsys):
+    """Test that with --json, errors are printed as a JSON object with a non-zero exit code"""
+    with pytest.raises(SystemExit) as exc:
+        run_command(get_parsed_args(["-n", "posix_ose", "--json", "activate", str(tmp_path / "missing")]))
+
+    assert exc.value.code == 1
+    result = json.loads(capsys.readouterr().out)
+    assert result["exception_name"]
+    assert str(tmp_path / "missing") in result["error"]
+
+    with pytest.raises(SystemExit) as exc:
+        run_command(get_parsed_args(["-n", "no_such_plugin", "--json", "activate"]))
+
+    assert exc.value.code == 1
+    assert json.loads(capsys.readouterr().out)["exception_name"] == "PluginError"
+
+
+@pytest.mark.parametrize(
+    "argv, error",
+    [
+        (["cache", "warm", "base"], "CONDACT_SHARED_CACHE_DIR"),
+        (["compile", "base"], "only plugins with classic activation logic"),
+        (["cache", "stats"], "unreadable cache"),
+    ],
+)
+def test_run_command_json_error_other_commands(posix_ose_hook, monkeypatch, mocker, capsys, argv, error):
+    """Test that with --json, the errors of cache warm, compile and cache are printed as JSON"""
+    monkeypatch.delenv("CONDACT_SHARED_CACHE_DIR", raising=False)
+    mocker.patch("condact.cache.PlanCache.stats", side_effect=OSError("unreadable cache"))
+
+    with pytest.raises(SystemExit) as exc:
+        run_command(get_parsed_args(["-n", "posix_ose", "--json", *argv]))
+
+    assert exc.value.code == 1
+    assert error in json.loads(capsys.readouterr().out)["error"]
@@ -0,0 +1,136 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from condact.client import PROTOCOL_VERSION, apply_plan, exec_plan, parse_args, render
+from condact.daemon import build_plan, serve
+from condact.plugins import posix_cl, posix_ose
+from condact.snapshot import snapshot_var
+
+VALIDATE_PARSE_ARGS_TEST_CASES = (
+    (["-n", "posix_cl", "activate"], ("posix_cl", "activate", None, None, False)),
+    (["--name", "posix_ose", "activate", "--stack", "env"], ("posix_ose", "activate", "env", True, False)),
+    (["-n", "posix_cl", "activate", "--no-stack", "--dev", "env"], ("posix_cl", "activate", "env", False, True)),
+    (["-n", "posix_cl", "deactivate", "--dev"], ("posix_cl", "deactivate", None, None, True)),
+    (["-n", "bash_ose", "reactivate"], ("bash_ose", "reactivate", None, None, False)),
+)
+
+@pytest.mark.parametrize("argv, expected", VALIDATE_PARSE_ARGS_TEST_CASES)
+def test_parse_args(argv: list, expected: tuple):
+    """Test that the client parses the same arguments as conda shell"""
+    request = parse_args(argv)
+
+    assert (
+        request["plugin"], request["command"], request["env"], request["stack"], request["dev"]
+    ) == expected
+
+
+@pytest.mark.parametrize("argv", [["activate"], ["-n", "posix_cl", "cache", "stats"], ["-n", "posix_cl", "deactivate", "env"]])
+def test_parse_args_unhandled(argv: list):
+    """Test that requests the client cannot serve are passed on to conda"""
+    assert parse_args(argv) is None
+
+
+PLAN = {
+    "unset_vars": ["OLD"],
+    "set_vars": {"PS1": "(env) "},
+    "export_vars": {"CONDA_SHLVL": 1},
+    "deactivate_scripts": ["/old/deactivate.sh"],
+    "activate_scripts": ["/new/activate.sh"],
+}
+
+SYNTAX = {
+    "command_join": "\n",
+    "run_script_tmpl": '. "%s"',
+    "unset_var_tmpl": "unset %s",
+    "export_var_tmpl": "export %s='%s'",
+    "set_var_tmpl": "%s='%s'",
+    "tempfile_extension": None,
+}
+
+
+def test_render_matches_activator_order():
+    """Test that plans are rendered in the same order as _Activator._yield_commands"""
+    assert render(PLAN, SYNTAX) == (
+        '. "/old/deactivate.sh"\n'
+        "unset OLD\n"
+        "PS1='(env) '\n"
+        "export CONDA_SHLVL='1'\n"
+        '. "/new/activate.sh"\n'
+    )
+
+
+def test_apply_plan():
+    """Test that the plan is applied to a copy of the environment"""
+    environ = {"OLD": "x", "KEEP": "y"}
+    env_map = apply_plan(PLAN, environ)
+
+    assert env_map == {"KEEP": "y", "PS1": "(env) ", "CONDA_SHLVL": "1"}
+    assert environ == {"OLD": "x", "KEEP": "y"}
+
+
+@pytest.mark.currentlogic
+def test_daemon_build_plan(plugin_manager):
+    """Test that the daemon builds a plan against the environment sent by the client"""
+    plugin_manager.load_plugins(posix_cl)
+    request = {
+        "version": PROTOCOL_VERSION,
+        "plugin": "posix_cl",
+        "command": "deactivate",
+        "dev": False,
+        "environ": {"PATH": "/usr/bin"},
+    }
+    response = build_plan(plugin_manager, request)
+
+    assert response["ok"]
+    assert response["syntax"]["name"] == "posix_cl"
+    assert response["syntax"]["custom"] is False
+    assert not response["plan"]["export_vars"]
+
+
+@pytest.mark.osexec
+def test_exec_plan_records_snapshot(plugin_manager, make_prefix, monkeypatch, mocker):
+    """Test that the client applies a daemon plan as PluginActivator.activate does"""
+    plugin_manager.load_plugins(posix_ose)
+    prefix = make_prefix(files={"etc/conda/deactivate.d/unset.sh": ""})
+    environ = {"PATH": "/usr/bin", "CONDA_SHLVL": "0"}
+    request = {
+        "version": PROTOCOL_VERSION,
+        "plugin": "posix_ose",
+        "command": "activate",
+        "env": prefix,
+        "dev": False,
+        "environ": environ,
+    }
+    response = build_plan(plugin_manager, request)
+    assert list(response["snapshot_scripts"][0]) == [f"{prefix}/etc/conda/deactivate.d/unset.sh"]
+
+    monkeypatch.delenv("CONDA_PREFIX", raising=False)
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+    execve = mocker.patch("os.execve")
+    # the daemon's response arrives as JSON
+    snapshot_scripts = json.loads(json.dumps(response["snapshot_scripts"]))
+    exec_plan(response["plan"], response["syntax"], snapshot_scripts)
+
+    path, argv, env = execve.call_args.args
+    assert path == response["syntax"]["script_path"]
+    assert env["CONDA_PREFIX"] == prefix
+    assert snapshot_var(1) in env
+
+
+def test_daemon_build_plan_bad_version(plugin_manager):
+    """Test that requests from an incompatible client are rejected"""
+    response = build_plan(plugin_manager, {"version": 0, "command": "activate"})
+
+    assert not response["ok"]
+    assert "protocol version" in response["error"]
+
+
+def test_daemon_zero_idle_timeout(plugin_manager, tmp_path):
+    """Test that an idle timeout of 0 is kept, and the daemon exits at once without requests"""
+    assert serve([], idle_timeout=0, path=str(tmp_path / "daemon.sock")) == 0
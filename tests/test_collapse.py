@@ -0,0 +1,226 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import itertools
+import os
+import subprocess
+from argparse import Namespace
+
+import pytest
+
+from condact import collapse
+from condact.environ import EnvOverlay
+from condact.logic import PluginActivator
+from condact.plugins import bash_ose
+from condact.plugins.bash_ose import custom_activate
+from condact.shell_manager import get_shell_syntax
+
+# the new shell of a modelled shell process: prints its environment and exits
+PRINT_ENV = "env -0"
+
+
+class ShellChain:
+    """
+    A model of the chain of shell processes of one terminal, where each conda shell command
+    runs as a child of the last shell. The commands that osexec activation hands to the
+    shell (a new shell, or a handoff script) are run with /bin/sh, with the interactive
+    shell replaced by a command printing the environment it would have started with.
+    """
+
+    def __init__(self, environ: dict[str, str], handoff: str):
+        self.pids = itertools.count(1000)
+        self.shells = [(next(self.pids), environ)]
+        self.handoff = handoff
+
+    @staticmethod
+    def run(argv: list[str], env: dict[str, str]) -> dict[str, str] | None:
+        """Run argv and return the environment of the shell it starts, or None if it exits."""
+        output = subprocess.run(argv, env={**env, "SHELL": PRINT_ENV}, capture_output=True, check=True).stdout
+        if not output:
+            return None
+        return dict(item.split("=", 1) for item in output.decode().split("\0") if item)
+
+    def conda_shell(self, posix_ose_hook, mocker, **args) -> None:
+        """Run conda shell activate or deactivate from the last shell."""
+        parent_pid = self.shells[-2][0] if len(self.shells) > 1 else 1
+        pid, environ = self.shells[-1]
+        if environ.get("ENV") == collapse.FUNCTION_SCRIPT:
+            # the shell loaded the collapse function, which runs conda shell
+            open(self.handoff, "w").close()
+            environ = {**environ, collapse.HANDOFF_VAR: self.handoff, collapse.SHELL_PPID_VAR: str(parent_pid)}
+
+        mocker.patch("os.getppid", return_value=pid)
+        execve = mocker.patch("os.execve")
+        activator = PluginActivator(posix_ose_hook, environ)
+        ns = Namespace(**{"dev": False, "stack": False, "env": None, **args})
+        result = activator.activate(activator.parse_and_build(ns))
+
+        if execve.called:
+            path, argv, env = execve.call_args.args
+            self.shells.append((next(self.pids), self.run(argv, env)))
+            return
+
+        assert result == 0
+        env = self.run(["/bin/sh", "-c", '. "$1"', "sh", self.handoff], self.shells[-1][1])
+        if env is None:
+            self.shells.pop()
+        else:
+            # exec replaces the shell process, keeping its pid
+            self.shells[-1] = (pid, env)
+
+
+@pytest.fixture
+def prefixes(make_prefix) -> list[str]:
+    return [make_prefix(name) for name in ("a", "b")]
+
+
+@pytest.fixture
+def terminal(tmp_path) -> ShellChain:
+    """Return a terminal whose shell has collapse mode enabled but no active environment."""
+    environ = {
+        "PATH": os.defpath,
+        "HOME": str(tmp_path),
+        "SHELL": "/bin/sh",
+        "CONDA_SHLVL": "0",
+        collapse.COLLAPSE_VAR: "1",
+    }
+    return ShellChain(environ, str(tmp_path / "handoff"))
+
+
+def test_ancestor_record():
+    """Test that ancestors survive their record, even with colons in the prefix"""
+    ancestor = collapse.Ancestor("12", "1", "C:/envs/a")
+
+    assert collapse.Ancestor.parse(str(ancestor)) == ancestor
+    assert collapse.Ancestor.parse("garbage") is None
+
+
+def test_render_handoff():
+    """Test that the handoff script applies the changes, quoted, and replaces the shell"""
+    env_map = EnvOverlay({"OLD": "1", "CONDA_SHLVL": "1"})
+    del env_map["OLD"]
+    env_map["PS1"] = "(it's) $ "
+
+    script = collapse.render_handoff("/tmp/handoff", {}, env_map, ["/bin/sh", "-c", "a b"])
+
+    assert script.splitlines() == [
+        "rm -f /tmp/handoff",
+        "unset OLD",
+        "export PS1='(it'\"'\"'s) $ '",
+        "exec /bin/sh -c 'a b'",
+    ]
+
+
+def test_record_ancestor_chains_user_env(tmp_path, mocker):
+    """Test that a $ENV already set is sourced by the collapse function script in its place"""
+    user_env = tmp_path / "shrc"
+    user_env.write_text("USER_ENV_LOADED=1\n")
+    mocker.patch("os.getppid", return_value=42)
+    env_map = EnvOverlay({"ENV": str(user_env), "CONDA_SHLVL": "0"})
+
+    collapse.record_ancestor(env_map, env_map, "/bin/sh")
+
+    assert env_map[collapse.ANCESTOR_VAR] == "42:0:"
+    assert env_map["ENV"] == collapse.FUNCTION_SCRIPT
+    assert env_map[collapse.USER_ENV_VAR] == str(user_env)
+    output = subprocess.run(
+        ["/bin/sh", "-c", '. "$ENV"; echo "$USER_ENV_LOADED"'],
+        env=env_map.materialize(),
+        capture_output=True,
+        check=True,
+    ).stdout
+    assert output == b"1\n"
+
+
+def test_record_ancestor_bash_rcfile(tmp_path, mocker):
+    """Test that bash, which does not read $ENV, loads the conda function and ~/.bashrc"""
+    (tmp_path / ".bashrc").write_text("USER_RC_LOADED=1\n")
+    mocker.patch("os.getppid", return_value=42)
+    env_map = EnvOverlay({"PATH": os.defpath, "HOME": str(tmp_path), "CONDA_SHLVL": "0"})
+
+    collapse.record_ancestor(env_map, env_map, "/bin/bash")
+
+    assert "ENV" not in env_map
+    command = 'type conda >/dev/null && echo "$USER_RC_LOADED"'
+    output = subprocess.run(
+        ["/bin/bash", "--rcfile", env_map[collapse.RCFILE_VAR], "-i", "-c", command],
+        env=env_map.materialize(),
+        capture_output=True,
+        check=True,
+    ).stdout
+    assert output == b"1\n"
+
+
+def test_record_ancestor_unsupported_shell(mocker, capsys):
+    """Test that a shell that cannot load the conda function is warned about"""
+    mocker.patch("os.getppid", return_value=42)
+    env_map = EnvOverlay({"CONDA_SHLVL": "0"})
+
+    collapse.record_ancestor(env_map, env_map, "/usr/bin/zsh")
+
+    assert "ENV" not in env_map and collapse.RCFILE_VAR not in env_map
+    assert "'/usr/bin/zsh'" in capsys.readouterr().err
+
+
+@pytest.mark.osexec
+def test_collapse_disabled(posix_ose_hook, mocker, tmp_path):
+    """Test that without CONDACT_COLLAPSE, activation nests a new shell as before"""
+    execve = mocker.patch("os.execve")
+    environ = {"PATH": os.defpath, "CONDA_SHLVL": "0", collapse.HANDOFF_VAR: str(tmp_path / "handoff")}
+    activator = PluginActivator(posix_ose_hook, environ)
+
+    activator.activate(activator.parse_and_build(Namespace(command="deactivate", dev=False)))
+
+    assert execve.called
+    assert collapse.ANCESTOR_VAR not in execve.call_args.args[2]
+
+
+@pytest.mark.osexec
+def test_constant_depth(posix_ose_hook, mocker, prefixes, terminal):
+    """Test that 100 switches between environments keep the depth of the shell chain constant"""
+    terminal.conda_shell(posix_ose_hook, mocker, command="activate", env=prefixes[0])
+    assert len(terminal.shells) == 2
+    shell_pid = terminal.shells[-1][0]
+
+    for i in range(100):
+        prefix = prefixes[i % 2]
+        terminal.conda_shell(posix_ose_hook, mocker, command="activate", env=prefix)
+
+        assert len(terminal.shells) == 2
+        assert terminal.shells[-1][0] == shell_pid
+        assert terminal.shells[-1][1]["CONDA_PREFIX"] == prefix
+
+
+@pytest.mark.osexec
+def test_deactivate_returns_to_ancestor(posix_ose_hook, mocker, prefixes, terminal):
+    """Test that deactivating back to the first shell's state exits to that shell"""
+    terminal.conda_shell(posix_ose_hook, mocker, command="activate", env=prefixes[0])
+    terminal.conda_shell(posix_ose_hook, mocker, command="deactivate")
+
+    assert len(terminal.shells) == 1
+    assert "CONDA_PREFIX" not in terminal.shells[0][1]
+
+
+@pytest.fixture
+def bash_ose_hook(plugin_manager):
+    """Return the bash os.exec* plugin hook with the name 'bash_ose'."""
+    plugin_manager.load_plugins(bash_ose)
+    return get_shell_syntax(plugin_manager, "bash_ose")
+
+
+@pytest.mark.osexec
+def test_bash_ose_collapse(bash_ose_hook, mocker, tmp_path):
+    """Test that bash_ose hands off a bash loading the collapse function"""
+    handoff = tmp_path / "handoff"
+    environ = {**os.environ, collapse.COLLAPSE_VAR: "1", collapse.HANDOFF_VAR: str(handoff)}
+    execve = mocker.patch("os.execve")
+    activator = PluginActivator(bash_ose_hook, environ)
+
+    assert custom_activate(activator, {"export_vars": {"CONDA_SHLVL": 5}}) == 0
+
+    execve.assert_not_called()
+    exec_line = handoff.read_text().splitlines()[-1]
+    assert exec_line.startswith("exec /bin/bash --rcfile ")
+    with open(exec_line.split()[-1]) as fh:
+        assert collapse.FUNCTION_SCRIPT in fh.read()
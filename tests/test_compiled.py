@@ -0,0 +1,78 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import os
+import subprocess
+
+import pytest
+from conda.exceptions import CondaError
+
+from condact.compiled import STALE_SUFFIX, compile_environment, mark_stale
+
+
+@pytest.fixture
+def prefix(make_prefix) -> str:
+    """Return a minimal environment prefix with one activate.d script."""
+    return make_prefix(
+        files={"conda-meta/history": "", "etc/conda/activate.d/hello.sh": "export HELLO=compiled\n"}
+    )
+
+
+def source(script: str, environ: dict) -> str:
+    """Source script in sh with a stub conda executable and return the resulting environment."""
+    result = subprocess.run(
+        ["sh", "-c", '. "$0" && env', script],
+        env={**environ, "CONDA_EXE": "false"},
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout
+
+
+def test_compile_environment(posix_cl_hook, prefix):
+    """Test that the compiled script activates the environment without conda"""
+    path = compile_environment(posix_cl_hook, prefix)
+
+    assert path == os.path.join(prefix, "etc", "conda", "condact", "posix_cl.sh")
+
+    output = source(path, dict(os.environ))
+    assert f"CONDA_PREFIX={prefix}" in output
+    assert "HELLO=compiled" in output
+
+
+def test_compiled_script_guards(posix_cl_hook, prefix):
+    """Test that the compiled script falls back to conda when the shell state differs"""
+    path = compile_environment(posix_cl_hook, prefix)
+
+    output = source(path, {**os.environ, "PATH": "/usr/bin:/bin"})
+    assert "HELLO=compiled" not in output
+
+
+def test_mark_stale(posix_cl_hook, prefix):
+    """Test that marking a prefix stale disables its compiled scripts until recompiled"""
+    path = compile_environment(posix_cl_hook, prefix)
+
+    assert mark_stale(prefix) == [path]
+    assert os.path.exists(path + STALE_SUFFIX)
+    assert "HELLO=compiled" not in source(path, dict(os.environ))
+
+    compile_environment(posix_cl_hook, prefix)
+    assert not os.path.exists(path + STALE_SUFFIX)
+    assert "HELLO=compiled" in source(path, dict(os.environ))
+
+
+def test_compiled_script_env_vars_changed(posix_cl_hook, prefix):
+    """Test that setting environment variables with conda env config vars disables the script"""
+    path = compile_environment(posix_cl_hook, prefix)
+
+    with open(os.path.join(prefix, "conda-meta", "state"), "w") as fh:
+        fh.write('{"env_vars": {"HELLO": "configured"}}')
+
+    assert "HELLO=compiled" not in source(path, dict(os.environ))
+
+
+def test_compile_osexec_plugin(posix_ose_hook, prefix):
+    """Test that plugins starting a new shell cannot be compiled"""
+    with pytest.raises(CondaError, match="only plugins with classic activation logic"):
+        compile_environment(posix_ose_hook, prefix)
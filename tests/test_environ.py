@@ -0,0 +1,71 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from condact.environ import EnvOverlay
+from condact.logic import PluginActivator
+
+BASE = {"PATH": "/usr/bin", "HOME": "/home/user", "PS1": "$ "}
+
+
+def test_overlay_reads_base():
+    """Test that an overlay without changes is equal to its base mapping"""
+    env = EnvOverlay(BASE)
+
+    assert env == BASE
+    assert len(env) == 3
+    assert env["HOME"] == "/home/user"
+    assert EnvOverlay()["PATH"] == os.environ["PATH"]
+
+
+def test_overlay_changes_do_not_touch_base():
+    """Test that setting and unsetting variables only changes the overlay"""
+    base = dict(BASE)
+    env = EnvOverlay(base)
+
+    env["PATH"] = "/env/bin:/usr/bin"
+    env["CONDA_PREFIX"] = "/env"
+    del env["PS1"]
+
+    assert base == BASE
+    assert "PS1" not in env
+    assert env.get("PS1") is None
+    assert len(env) == 3
+    assert env.changes() == ({"PATH": "/env/bin:/usr/bin", "CONDA_PREFIX": "/env"}, {"PS1"})
+    assert env.materialize() == {"PATH": "/env/bin:/usr/bin", "HOME": "/home/user", "CONDA_PREFIX": "/env"}
+
+    with pytest.raises(KeyError):
+        del env["PS1"]
+
+    env["PS1"] = "(env) $ "
+    assert env["PS1"] == "(env) $ "
+    assert len(env) == 4
+
+
+def test_overlay_copy():
+    """Test that copies share the base mapping but not the changes"""
+    env = EnvOverlay(BASE)
+    env["A"] = "1"
+    copy = env.copy()
+    copy["B"] = "2"
+    del copy["A"]
+
+    assert dict(env) == {**BASE, "A": "1"}
+    assert dict(copy) == {**BASE, "B": "2"}
+    assert copy._base is env._base
+
+
+@pytest.mark.osexec
+def test_update_env_map_does_not_copy(plugin_hook):
+    """Test that the activator and its env map record changes over os.environ"""
+    activator = PluginActivator(plugin_hook)
+    env_map = activator.update_env_map({"unset_vars": [], "set_vars": {"HIGHWAY": "freeway"}})
+
+    assert env_map._base is os.environ
+    assert env_map.changes() == ({"HIGHWAY": "freeway"}, set())
+    assert "HIGHWAY" not in activator.environ
+    assert isinstance(env_map.materialize(), dict)
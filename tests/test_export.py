@@ -0,0 +1,130 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import json
+import os
+import re
+import subprocess
+
+import pytest
+
+from condact.export import ExportedEnvironment, export_environment, export_warnings, render
+
+EXPORTED = ExportedEnvironment(
+    prefix="/opt/env",
+    export_vars={"PATH": "/opt/env/bin:/usr/bin", "GREETING": 'say "hi" for $5 at 100%'},
+    unset_vars=("CONDA_PREFIX_1",),
+    scripts=("/opt/env/etc/conda/activate.d/setup.csh",),
+)
+
+
+def test_render_dotenv():
+    """Test that dotenv values are written literally, as docker run --env-file reads them"""
+    exported = EXPORTED._replace(export_vars={**EXPORTED.export_vars, "MOTD": "two\nlines"})
+    content = render(exported, "dotenv")
+
+    # docker takes the name before the first "=" and the rest of the line as the value
+    parsed = dict(line.split("=", 1) for line in content.splitlines())
+    assert parsed == EXPORTED.export_vars
+    assert any("MOTD" in message for message in export_warnings(exported, "dotenv"))
+
+
+def parsed_systemd_env(content: str) -> dict[str, str]:
+    """
+    Parse content by the rules of systemd's EnvironmentFile= for double-quoted values: the
+    quotes are removed, as are the backslashes before \\ " ` $, and newlines are kept.
+    """
+    values = re.finditer(r'^(\w+)="((?:[^"\\]|\\.)*)"$', content, re.MULTILINE | re.DOTALL)
+    return {match[1]: re.sub(r'\\([\\"`$])', r"\1", match[2]) for match in values}
+
+
+def test_render_systemd_env():
+    """Test that systemd-env values survive EnvironmentFile's unquoting"""
+    exported = EXPORTED._replace(export_vars={**EXPORTED.export_vars, "MOTD": "two\nlines `x` \\"})
+    content = render(exported, "systemd-env")
+
+    assert parsed_systemd_env(content) == exported.export_vars
+
+
+def test_render_dockerfile():
+    """Test that each variable becomes an ENV instruction"""
+    lines = render(EXPORTED, "dockerfile").splitlines()
+
+    assert lines[1:] == [
+        'ENV PATH="/opt/env/bin:/usr/bin"',
+        'ENV GREETING="say \\"hi\\" for \\$5 at 100%"',
+    ]
+
+
+def test_render_systemd():
+    """Test that the drop-in escapes specifiers and unsets variables"""
+    lines = render(EXPORTED, "systemd").splitlines()
+
+    assert lines[1:] == [
+        "[Service]",
+        'Environment="PATH=/opt/env/bin:/usr/bin"',
+        'Environment="GREETING=say \\"hi\\" for $5 at 100%%"',
+        "UnsetEnvironment=CONDA_PREFIX_1",
+    ]
+
+
+def test_render_json():
+    """Test that the JSON export holds everything, including the scripts not inlined"""
+    data = json.loads(render(EXPORTED, "json"))
+
+    assert data["export_vars"] == EXPORTED.export_vars
+    assert data["unset_vars"] == ["CONDA_PREFIX_1"]
+    assert data["scripts"] == list(EXPORTED.scripts)
+
+
+def test_render_sbatch(tmp_path):
+    """Test that sourcing the sbatch fragment applies the variables"""
+    exported = EXPORTED._replace(scripts=())
+    fragment = tmp_path / "env.sh"
+    fragment.write_text(render(exported, "sbatch"))
+    env = {"PATH": os.defpath, "CONDA_PREFIX_1": "/old"}
+
+    output = subprocess.run(
+        ["/bin/sh", "-c", '. "$1"; echo "$GREETING|${CONDA_PREFIX_1-unset}"', "sh", str(fragment)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    assert output == 'say "hi" for $5 at 100%|unset\n'
+
+
+def test_export_warnings():
+    """Test that formats warn about what they cannot apply"""
+    assert len(export_warnings(EXPORTED, "dotenv")) == 2
+    assert len(export_warnings(EXPORTED, "systemd-env")) == 2
+    assert len(export_warnings(EXPORTED, "systemd")) == 1
+    assert export_warnings(EXPORTED, "sbatch") == []
+
+
+@pytest.mark.osexec
+def test_export_environment_inlines_scripts(posix_ose_hook, make_prefix):
+    """Test that the effect of activate.d scripts is inlined up to the first failing script"""
+    prefix = make_prefix(
+        files={
+            "etc/conda/activate.d/01-jdk.sh": "export JAVA_HOME=/opt/jdk\n",
+            "etc/conda/activate.d/02-broken.sh": "false\n",
+            "etc/conda/activate.d/03-cuda.sh": "export CUDA_PATH=/opt/cuda\n",
+        }
+    )
+    scripts = os.path.join(prefix, "etc", "conda", "activate.d")
+    environ = {"PATH": os.defpath, "CONDA_SHLVL": "0"}
+
+    exported = export_environment(posix_ose_hook, prefix, environ=environ)
+
+    assert exported.prefix == prefix
+    assert exported.export_vars["JAVA_HOME"] == "/opt/jdk"
+    assert "CUDA_PATH" not in exported.export_vars
+    assert exported.scripts == (os.path.join(scripts, "02-broken.sh"), os.path.join(scripts, "03-cuda.sh"))
+    assert not any(name.startswith("_CONDACT_") for name in exported.export_vars)
+
+    warned = export_environment(posix_ose_hook, prefix, capture_scripts=False, environ=environ)
+    assert "JAVA_HOME" not in warned.export_vars
+    assert len(warned.scripts) == 3
@@ -0,0 +1,82 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import pytest
+
+from condact.cli import get_parsed_args
+from condact.fanout import run_fanout, run_many
+
+
+@pytest.fixture
+def prefixes(make_prefix) -> list[str]:
+    """Return the paths of several minimal environment prefixes."""
+    return [make_prefix(f"env{i}") for i in range(4)]
+
+
+@pytest.fixture(autouse=True)
+def osexec_plugin(posix_ose_hook, mocker):
+    """Make the fan-out use the posix_ose hook of the mocked plugin manager."""
+    mocker.patch("condact.api.get_shell_plugin", return_value=posix_ose_hook)
+    mocker.patch("condact.fanout.get_shell_plugin", return_value=posix_ose_hook)
+
+
+def test_run_many(prefixes):
+    """Test that the command runs in each environment, with results in the given order"""
+    results = list(run_many(prefixes, ["sh", "-c", 'echo "$CONDA_PREFIX"'], "posix_ose", jobs=2))
+
+    assert [result.env for result in results] == prefixes
+    for prefix, result in zip(prefixes, results):
+        assert result.returncode == 0
+        assert result.stdout.decode().strip() == prefix
+
+
+def test_run_many_errors(prefixes):
+    """Test that unknown environments and failing commands are reported per environment"""
+    envs = [prefixes[0], "no-such-env"]
+    results = list(run_many(envs, ["sh", "-c", "echo oops >&2; exit 3"], "posix_ose"))
+
+    assert [result.returncode for result in results] == [3, 1]
+    assert results[0].stderr == b"oops\n"
+    assert b"no-such-env" in results[1].stderr
+
+
+def test_run_many_unexpected_errors(prefixes, mocker):
+    """Test that any error building a plan or starting the command fails only that environment"""
+    plans = {prefixes[0]: RuntimeError("broken plugin"), prefixes[1]: {}, prefixes[2]: {}}
+    mocker.patch("condact.fanout.build_many", return_value=plans)
+    argvs = [("/no/such/shell", ["sh"]), ("/bin/sh", ["sh", "-c", "true"])]
+    mocker.patch("condact.fanout.PluginActivator.get_run_argv", side_effect=argvs)
+
+    results = list(run_many(prefixes[:3], ["true"], "posix_ose", jobs=1))
+
+    assert [result.returncode for result in results] == [1, 1, 0]
+    assert results[0].stderr == b"broken plugin\n"
+    assert b"/no/such/shell" in results[1].stderr
+
+
+def test_run_fanout(prefixes, capsys):
+    """Test that output is printed per environment and exit codes are aggregated"""
+    assert run_fanout("posix_ose", prefixes[:2], ["true"]) == 0
+    assert run_fanout("posix_ose", prefixes[:2], ["false"]) == 1
+
+    out, err = capsys.readouterr()
+    assert out.count(f"==> {prefixes[0]} <==") == 2
+    assert f"Command failed in 2 of 2 environments: {prefixes[0]}, {prefixes[1]}" in err
+
+
+@pytest.mark.parametrize(
+    "a",
+    [
+        ["-n", "posix_ose", "run", "--envs", "a,b", "--jobs", "4", "--", "python", "-V"],
+        ["-n", "posix_ose", "run", "-j", "4", "--envs", "a,b", "python", "-V"],
+    ],
+)
+def test_get_parsed_args_run_envs(a: list):
+    """Test that the environments of a fan-out are not taken from the command"""
+    ns = get_parsed_args(a)
+
+    assert ns.envs == ["a", "b"]
+    assert ns.jobs == 4
+    assert ns.env is None
+    assert ns.argv == ["python", "-V"]
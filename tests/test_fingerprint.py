@@ -0,0 +1,71 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import os
+from argparse import Namespace
+
+import pytest
+
+from condact.cli import get_parsed_args, run_command
+from condact.client import main as client_main
+from condact.fingerprint import FINGERPRINT_VAR, activation_fingerprint, is_current, stamp
+from condact.logic import PluginActivator
+
+
+@pytest.fixture
+def prefix(make_prefix) -> str:
+    """Return an environment prefix with one activate.d script."""
+    return make_prefix(files={"etc/conda/activate.d/a.sh": "export A=1\n"})
+
+
+def test_activation_fingerprint(prefix):
+    """Test that history and activation script changes, even in place, change the fingerprint"""
+    script = os.path.join(prefix, "etc", "conda", "activate.d", "a.sh")
+    fingerprint = activation_fingerprint(prefix)
+    assert activation_fingerprint(prefix) == fingerprint
+
+    with open(script, "a") as fh:
+        fh.write("export B=2\n")
+    assert activation_fingerprint(prefix) != fingerprint
+    fingerprint = activation_fingerprint(prefix)
+
+    with open(os.path.join(prefix, "conda-meta", "history"), "w") as fh:
+        fh.write("==> 2024-01-01 <==\n")
+    assert activation_fingerprint(prefix) != fingerprint
+
+
+def test_is_current(prefix):
+    """Test that only an unchanged, stamped active environment is current"""
+    plan = stamp({"export_vars": {"CONDA_PREFIX": prefix}}, prefix)
+    environ = {"CONDA_PREFIX": prefix, **plan.export_vars}
+
+    assert is_current(environ)
+    assert not is_current({**environ, "CONDA_PREFIX": os.path.dirname(prefix)})
+    assert not is_current({"CONDA_PREFIX": prefix})
+
+    os.makedirs(os.path.join(prefix, "etc", "conda", "deactivate.d"))
+    assert not is_current(environ)
+
+
+@pytest.mark.osexec
+def test_osexec_activate_exports_fingerprint(posix_ose_hook, prefix):
+    """Test that activation plans export the fingerprint of the activated prefix"""
+    activator = PluginActivator(posix_ose_hook)
+    plan = activator.parse_and_build(Namespace(command="activate", env=prefix, dev=False, stack=False))
+
+    assert plan.export_vars[FINGERPRINT_VAR] == activation_fingerprint(prefix)
+
+
+def test_reactivate_noop(prefix, monkeypatch, mocker):
+    """Test that reactivating an unchanged environment exits without building a plan"""
+    monkeypatch.setenv("CONDA_PREFIX", prefix)
+    monkeypatch.setenv(FINGERPRINT_VAR, activation_fingerprint(prefix))
+    update_plugin_manager = mocker.patch("condact.shell_manager.update_plugin_manager")
+    request_plan = mocker.patch("condact.client.request_plan")
+
+    assert run_command(get_parsed_args(["-n", "posix_ose", "reactivate"])) == 0
+    assert client_main(["-n", "posix_ose", "reactivate"]) == 0
+
+    update_plugin_manager.assert_not_called()
+    request_plan.assert_not_called()
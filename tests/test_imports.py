@@ -0,0 +1,35 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import subprocess
+import sys
+
+# modules used by the fast paths (condact-client, cache and snapshot lookups, plugins
+# reading plans), which must be importable without importing conda
+CONDA_FREE_MODULES = (
+    "condact.cache",
+    "condact.client",
+    "condact.collapse",
+    "condact.environ",
+    "condact.fingerprint",
+    "condact.osexec",
+    "condact.paths",
+    "condact.plan",
+    "condact.plan_format",
+    "condact.script_cache",
+    "condact.snapshot",
+    "condact.trace",
+    "condact.transition",
+)
+
+
+def test_modules_do_not_import_conda():
+    """Test that the fast-path modules can be imported without importing conda"""
+    code = "import importlib, sys\n"
+    code += "".join(f"importlib.import_module({module!r})\n" for module in CONDA_FREE_MODULES)
+    code += "print(sorted(name for name in sys.modules if name == 'conda' or name.startswith('conda.')))"
+
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == "[]"
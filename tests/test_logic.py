@@ -6,8 +6,10 @@ import os
 import pytest
 
 from conda.base.context import context, reset_context
+from conda.activate import _Activator
+from conda.exceptions import CondaError
 
-from condact.logic import PluginActivator, _ActivatorChild
+from condact.logic import PluginActivator, _ActivatorChild, _check_activator_init
 
 @pytest.mark.osexec
 def test_osexec_init_happy_path(plugin_hook):
@@ -123,6 +125,68 @@ def test_osexec_update_env_map_missing_env_var(plugin_hook, monkeypatch):
     assert env_map == current_env
 
 
+@pytest.mark.osexec
+def test_osexec_get_run_argv_direct(plugin_hook, tmp_path):
+    """
+    Test that a command is resolved against the new PATH and run directly when the plan
+    has no activate or deactivate scripts.
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    tool = bin_dir / "tool"
+    tool.write_text("#!/bin/sh\n")
+    tool.chmod(0o755)
+
+    activator = PluginActivator(plugin_hook)
+    path, arg_list = activator.get_run_argv({}, ["tool", "-v"], {"PATH": str(bin_dir)})
+
+    assert path == str(tool)
+    assert arg_list == ["tool", "-v"]
+
+
+@pytest.mark.osexec
+def test_osexec_get_run_argv_scripts(plugin_hook):
+    """
+    Test that activate and deactivate scripts are sourced by /bin/sh before the command.
+    """
+    cmds_dict = {"deactivate_scripts": ("/old/d.sh",), "activate_scripts": ("/new/a.sh",)}
+
+    activator = PluginActivator(plugin_hook)
+    path, arg_list = activator.get_run_argv(cmds_dict, ["tool", "-v"], {"PATH": ""})
+
+    assert path == "/bin/sh"
+    assert arg_list == ["/bin/sh", "-c", '. "/old/d.sh"\n. "/new/a.sh"\nexec "$@"', "sh", "tool", "-v"]
+
+
+@pytest.mark.osexec
+def test_osexec_get_run_argv_not_found(plugin_hook):
+    """
+    Test that an error is raised if the command is not in the environment.
+    """
+    activator = PluginActivator(plugin_hook)
+
+    with pytest.raises(CondaError, match="Command not found"):
+        activator.get_run_argv({}, ["no-such-tool"], {"PATH": ""})
+
+
+@pytest.mark.osexec
+def test_osexec_run(posix_ose_hook, mocker):
+    """
+    Test that run replaces the process with the command in the activated environment.
+    """
+    execve = mocker.patch("os.execve")
+    ns = Namespace(command="run", env=None, dev=False, stack=False, argv=["sh", "-c", "true"])
+
+    activator = PluginActivator(posix_ose_hook)
+    activator.run(activator.parse_and_build(ns), ns.argv)
+
+    path, arg_list, env = execve.call_args.args
+    assert os.path.basename(path) == "sh"
+    assert arg_list == ["sh", "-c", "true"]
+    assert type(env) is dict
+    assert env["CONDA_PREFIX"] == context.root_prefix
+
+
 # use data types that need to be converted to strings
 CMDS_DICT_ALL = {
     "unset_vars": ["A", 1],
@@ -220,6 +284,46 @@ def test_osexec_parse_and_build_deactivate_cmd_dict(posix_ose_hook, monkeypatch)
     assert isinstance(builder["activate_scripts"], tuple)
 
 
+@pytest.mark.osexec
+def test_osexec_build_deactivate_injected_environ(posix_ose_hook, monkeypatch, tmp_path):
+    """
+    Test that deactivate is built from the environment given to the activator, not from the
+    environment of the process, which is left unchanged.
+    """
+    monkeypatch.setenv("CONDA_SHLVL", "0")
+    monkeypatch.delenv("CONDA_PREFIX", raising=False)
+    before = dict(os.environ)
+    prefix = str(tmp_path / "env")
+    environ = {"PATH": f"{prefix}/bin:/usr/bin", "CONDA_SHLVL": "1", "CONDA_PREFIX": prefix}
+
+    activator = PluginActivator(posix_ose_hook, environ)
+    plan = activator.parse_and_build(Namespace(command="deactivate", dev=False))
+
+    assert plan["export_vars"]["PATH"] == "/usr/bin"
+    assert "CONDA_PREFIX" in plan["unset_vars"]
+    assert dict(os.environ) == before
+
+
+@pytest.mark.currentlogic
+def test_cl_build_deactivate_injected_environ(posix_cl_hook, monkeypatch, tmp_path):
+    """
+    Test that the classic activator builds deactivate from the environment given to it,
+    and leaves the environment of the process unchanged.
+    """
+    monkeypatch.setenv("CONDA_SHLVL", "0")
+    monkeypatch.delenv("CONDA_PREFIX", raising=False)
+    before = dict(os.environ)
+    prefix = str(tmp_path / "env")
+    environ = {"PATH": f"{prefix}/bin:/usr/bin", "CONDA_SHLVL": "1", "CONDA_PREFIX": prefix}
+
+    activator = _ActivatorChild(posix_cl_hook, Namespace(command="deactivate", dev=False), environ)
+    cmds_dict = activator.build_deactivate()
+
+    assert cmds_dict["export_vars"]["PATH"] == "/usr/bin"
+    assert "CONDA_PREFIX" in cmds_dict["unset_vars"]
+    assert dict(os.environ) == before
+
+
 @pytest.mark.skip(reason="conda_cli generates a CondaValueError when looking for a solver")
 @pytest.mark.osexec
 def test_osexec_parse_and_build_deactivate_clean_env(posix_ose_hook, temp_env, conda_cli, monkeypatch):
@@ -398,3 +502,18 @@ def test_cl_parse_and_set_args(ns, auto_stack, shlvl, expected, posix_cl_hook, m
     # tearDown
     reset_context()
 
+
+
+@pytest.mark.currentlogic
+def test_cl_init_unsupported_activator(posix_cl_hook, mocker):
+    """Test that a conda _Activator.__init__ setting unknown attributes is reported"""
+
+    def __init__(self, arguments=None):
+        self._raw_arguments = arguments
+        self.new_setting = True
+
+    mocker.patch.object(_Activator, "__init__", __init__)
+    _check_activator_init.cache_clear()
+
+    with pytest.raises(CondaError, match="new_setting"):
+        _ActivatorChild(posix_cl_hook, [])
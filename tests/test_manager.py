@@ -6,6 +6,7 @@ import pytest
 
 from conda.exceptions import PluginError
 
+from condact.registry import ShellPluginRegistry, get_registry
 from condact.shell_hookspec import hookimpl
 from condact.shell_manager import get_shell_syntax
 from condact.shell_types import CondaShellPlugins
@@ -132,4 +133,74 @@ def test_get_shell_syntax_error_wrong_plugin(plugin_manager):
         get_shell_syntax(plugin_manager, "FunPlugin")
 
     assert "No shell plugin found" in str(e.value)
-    assert "FunPlugin" in str(e.value)
\ No newline at end of file
+    assert "FunPlugin" in str(e.value)
+
+class InvalidPlugin:
+    @hookimpl
+    def conda_shells():
+        yield CondaShellPlugins(
+            name="invalidplugin",
+            summary="plugin without templates",
+            osexec=False,
+            custom=None,
+            script_path=None,
+            pathsep_join=":".join,
+            sep="/",
+            path_conversion=lambda x: x,
+            script_extension=".sh",
+            tempfile_extension=None,
+            command_join="\n",
+            run_script_tmpl='. "%s"',
+            unset_var_tmpl=None,
+            export_var_tmpl=None,
+            set_var_tmpl=None,
+            define_update_prompt=None,
+        )
+
+
+def test_get_shell_syntax_invalid_plugin(plugin_manager):
+    """Raise error when an invalid plugin is requested, without affecting valid plugins."""
+    plugin_manager.load_plugins(BashPlugin, InvalidPlugin)
+
+    with pytest.raises(PluginError) as e:
+        get_shell_syntax(plugin_manager, "invalidplugin")
+
+    assert "export_var_tmpl" in str(e.value)
+    assert get_shell_syntax(plugin_manager, "shellplugin").name == "shellplugin"
+
+
+def test_get_registry_reused_until_plugins_change(plugin_manager):
+    """Ensure the registry is built once and rebuilt when plugins are loaded."""
+    plugin_manager.load_plugins(BashPlugin)
+    registry = get_registry(plugin_manager)
+
+    assert get_registry(plugin_manager) is registry
+    assert registry.names() == ["shellplugin"]
+
+    plugin_manager.load_plugins(OtherPlugin)
+
+    assert get_registry(plugin_manager) is not registry
+    assert "shellplugin2" in get_registry(plugin_manager)
+
+
+def test_registry_conflicting_names():
+    """Raise error when a name shared by two plugins is requested, without affecting other plugins."""
+    registry = ShellPluginRegistry([*BashPlugin.conda_shells(), *OtherPlugin.conda_shells()])
+    registry.register(next(BashPlugin.conda_shells()))
+
+    with pytest.raises(PluginError) as e:
+        registry.get("shellplugin")
+
+    assert "Conflicting" in str(e.value)
+    assert registry.names() == ["shellplugin2"]
+
+
+def test_registry_resolves_descriptor():
+    """Ensure staticmethod wrappers are unwrapped and a false custom is normalized to None."""
+    syntax = next(OtherPlugin.conda_shells())._replace(
+        custom=False, define_update_prompt=staticmethod(str)
+    )
+    registry = ShellPluginRegistry([syntax])
+
+    assert registry.get("shellplugin2").custom is None
+    assert registry.get("shellplugin2").define_update_prompt is str
@@ -0,0 +1,94 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import pickle
+from argparse import Namespace
+
+import pytest
+
+from condact.logic import PluginActivator
+from condact.plan import PLAN_KEYS, ActivationPlan
+
+CMDS_DICT = {
+    "unset_vars": ("CONDA_PREFIX_1",),
+    "set_vars": {"PS1": "(env) $ "},
+    "export_path": {"PATH": "/env/bin:/usr/bin"},
+    "export_vars": {"CONDA_PREFIX": "/env", "CONDA_SHLVL": 2},
+    "deactivate_scripts": ("/old/etc/conda/deactivate.d/a.sh",),
+    "activate_scripts": ("/env/etc/conda/activate.d/b.sh", "/env/etc/conda/activate.d/c.sh"),
+}
+
+
+def test_plan_reads_as_dict():
+    """Test that a plan can be read like the dictionary it was built from"""
+    plan = ActivationPlan.from_mapping(CMDS_DICT)
+
+    assert plan == CMDS_DICT
+    assert list(plan) == list(PLAN_KEYS)
+    assert isinstance(plan["set_vars"], dict)
+    assert isinstance(plan["activate_scripts"], tuple)
+    assert plan.get("export_vars")["CONDA_SHLVL"] == 2
+    assert plan.get("missing") is None
+
+
+def test_plan_missing_keys():
+    """Test that keys missing from a builder dictionary are empty in the plan"""
+    plan = ActivationPlan.from_mapping({"unset_vars": [], "set_vars": {"A": "1"}})
+
+    assert plan.export_path == {}
+    assert plan.activate_scripts == ()
+    assert ActivationPlan.from_mapping(plan) is plan
+
+
+def test_plan_is_immutable():
+    """Test that a plan cannot be changed, even through the dicts it returns"""
+    plan = ActivationPlan.from_mapping(CMDS_DICT)
+
+    with pytest.raises(AttributeError):
+        plan.unset_vars = ()
+    with pytest.raises(TypeError):
+        plan["set_vars"] = {}
+    with pytest.raises(TypeError):
+        plan.set_vars["PS1"] = ""
+
+    plan["set_vars"]["PS1"] = ""
+    assert plan.set_vars["PS1"] == "(env) $ "
+
+
+def test_plan_hash_and_serialization():
+    """Test that equal plans hash alike and that plans survive serialization"""
+    plan = ActivationPlan.from_mapping(CMDS_DICT)
+    reordered = ActivationPlan.from_mapping({**CMDS_DICT, "export_vars": {"CONDA_SHLVL": 2, "CONDA_PREFIX": "/env"}})
+
+    assert hash(plan) == hash(reordered)
+    assert plan.digest == reordered.digest
+    assert len({plan, reordered}) == 1
+    assert ActivationPlan.from_json(plan.to_json()) == plan
+    assert pickle.loads(pickle.dumps(plan)) == plan
+    assert " " not in plan.to_json().replace("(env) $ ", "")
+
+    with pytest.raises(ValueError):
+        ActivationPlan.from_json("[]")
+
+
+def test_plan_script_commands():
+    """Test that script commands are rendered once per template"""
+    plan = ActivationPlan.from_mapping(CMDS_DICT)
+
+    deactivate, activate = plan.script_commands('. "%s"', "\n")
+
+    assert deactivate == ('. "/old/etc/conda/deactivate.d/a.sh"\n',)
+    assert len(activate) == 2
+    assert plan.script_commands('. "%s"', "\n") is plan.script_commands('. "%s"', "\n")
+
+
+@pytest.mark.osexec
+def test_parse_and_build_returns_plan(posix_ose_hook):
+    """Test that PluginActivator builds ActivationPlans"""
+    ns = Namespace(command="activate", env=None, dev=False, stack=None)
+
+    plan = PluginActivator(posix_ose_hook).parse_and_build(ns)
+
+    assert isinstance(plan, ActivationPlan)
+    assert "CONDA_SHLVL" in plan.export_vars
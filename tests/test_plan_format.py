@@ -0,0 +1,88 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import struct
+import zlib
+
+import pytest
+
+from condact import plan_format
+from condact.plan import ActivationPlan
+from condact.plan_format import PlanFormatError
+
+PLAN = ActivationPlan(
+    unset_vars=("CONDA_PREFIX_1",),
+    set_vars={"PS1": "(env) é $ ", "EMPTY": "", 1: None},
+    export_path={"PATH": "/env/bin:/usr/bin"},
+    export_vars={"CONDA_PREFIX": "/env", "CONDA_SHLVL": 2, "FLAG": True, "BIG": 2**70},
+    deactivate_scripts=(),
+    activate_scripts=tuple(f"/env/etc/conda/activate.d/{i:03}.sh" for i in range(300)),
+)
+
+
+def test_round_trip():
+    """Test that plans survive the binary format, keeping integers, booleans and None"""
+    data = plan_format.dumps(PLAN)
+    plan = plan_format.loads(data)
+
+    assert data[:4] == plan_format.MAGIC
+    assert plan == PLAN
+    assert plan.export_vars["CONDA_SHLVL"] == 2
+    assert plan.export_vars["FLAG"] is True
+    assert plan.export_vars["BIG"] == str(2**70)
+    assert plan.set_vars[1] is None
+    assert len(plan.activate_scripts) == 300
+    assert plan_format.loads(plan_format.dumps(plan_format.loads(data).to_dict())) == plan
+
+
+def test_round_trip_undecodable():
+    """Test that values holding bytes that are not UTF-8, as os.environ decodes them, survive"""
+    plan = ActivationPlan(export_vars={"PATH": "/a/\udcff/bin:/usr/bin"})
+    data = plan_format.dumps(plan)
+
+    assert b"/a/\xff/bin" in data
+    assert plan_format.loads(data) == plan
+
+
+def test_dump_load(tmp_path):
+    """Test that plans can be written to and read from files"""
+    path = str(tmp_path / "plan.bin")
+
+    plan_format.dump(PLAN, path)
+
+    assert plan_format.load(path) == PLAN
+
+
+@pytest.mark.parametrize(
+    "corrupt, message",
+    [
+        (lambda data: data[:10], "truncated"),
+        (lambda data: data[:-1], "truncated"),
+        (lambda data: b"XXXX" + data[4:], "not a serialized activation plan"),
+        (lambda data: data[:4] + struct.pack(">H", 99) + data[6:], "version: 99"),
+        (lambda data: data[:-1] + bytes([data[-1] ^ 0xFF]), "checksum"),
+    ],
+)
+def test_invalid_data(corrupt, message):
+    """Test that truncated, foreign, newer and corrupted data is rejected"""
+    with pytest.raises(PlanFormatError, match=message):
+        plan_format.loads(corrupt(plan_format.dumps(PLAN)))
+
+
+def test_malformed_body():
+    """Test that a body with a valid checksum but invalid content is rejected"""
+    body = struct.pack(">I", 1) + b"x"
+    header = struct.pack(">HHII", plan_format.FORMAT_VERSION, 0, len(body), zlib.crc32(body))
+
+    with pytest.raises(PlanFormatError, match="Unknown value tag"):
+        plan_format.loads(plan_format.MAGIC + header + body)
+
+
+def test_trailing_data():
+    """Test that data after the plan fields is rejected"""
+    body = plan_format.dumps(PLAN)[16:] + b"n"
+    header = struct.pack(">HHII", plan_format.FORMAT_VERSION, 0, len(body), zlib.crc32(body))
+
+    with pytest.raises(PlanFormatError, match="trailing data"):
+        plan_format.loads(plan_format.MAGIC + header + body)
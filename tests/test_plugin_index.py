@@ -0,0 +1,59 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from condact import plugin_index
+from condact.plugin_index import load_index, load_indexed_plugin, site_fingerprint, update_index
+from condact.shell_manager import get_shell_syntax
+
+from .test_manager import OtherPlugin
+
+ENTRY_POINT = SimpleNamespace(name="other", value="tests.test_manager:OtherPlugin")
+
+
+@pytest.fixture
+def indexed(plugin_manager, mocker):
+    """Record OtherPlugin in the plugin index, as if found through a full entry point scan."""
+    mocker.patch("condact.plugin_index._entry_points", return_value=[ENTRY_POINT])
+    plugin_manager.register(OtherPlugin, name=ENTRY_POINT.name)
+    update_index(plugin_manager, "conda")
+    plugin_manager.unregister(name=ENTRY_POINT.name)
+    return plugin_manager
+
+
+def test_site_fingerprint_changes_with_directory(tmp_path):
+    """Test that installing a distribution into a path directory changes the fingerprint."""
+    before = site_fingerprint([str(tmp_path)])
+    (tmp_path / "pkg-1.0.dist-info").mkdir()
+
+    assert site_fingerprint([str(tmp_path)]) != before
+
+
+def test_update_index(indexed):
+    """Test that the index maps shell plugin names to the entry point providing them."""
+    assert load_index() == {"shellplugin2": {"entry_point": "other", "value": ENTRY_POINT.value}}
+
+
+def test_load_indexed_plugin(indexed):
+    """Test that an indexed plugin is registered without scanning entry points."""
+    assert load_indexed_plugin(indexed, "shellplugin2")
+
+    syntax = get_shell_syntax(indexed, "shellplugin2")
+    assert syntax.summary == "second test plugin"
+
+
+def test_load_indexed_plugin_unknown_name(indexed):
+    """Test that plugins missing from the index are not loaded."""
+    assert not load_indexed_plugin(indexed, "FunPlugin")
+
+
+def test_load_indexed_plugin_stale_index(indexed, mocker):
+    """Test that the index is ignored once the installed distributions change."""
+    mocker.patch.object(plugin_index, "site_fingerprint", return_value="changed")
+
+    assert load_index() == {}
+    assert not load_indexed_plugin(indexed, "shellplugin2")
@@ -0,0 +1,131 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import os
+from argparse import Namespace
+
+import pytest
+
+from condact import snapshot
+from condact.cli import run_cache_command
+from condact.logic import PluginActivator
+from condact.script_cache import cached_effects, capture, is_cacheable, script_cache_dir
+
+ENABLED = {"CONDACT_SCRIPT_CACHE": "1"}
+
+
+@pytest.fixture
+def scripts(tmp_path) -> list[str]:
+    """Return two activate.d scripts; each records its runs in runs.log."""
+    log = tmp_path / "runs.log"
+    first = tmp_path / "activate.d" / "01-jdk.sh"
+    second = tmp_path / "activate.d" / "02-cuda.sh"
+    first.parent.mkdir()
+    first.write_text(f'echo jdk >> "{log}"\necho noise\nexport JAVA_HOME=/opt/jdk\nunset OLD_JAVA\n')
+    second.write_text(f'echo cuda >> "{log}"\nexport CUDA_PATH="$JAVA_HOME/../cuda"\n')
+    return [str(first), str(second)]
+
+
+@pytest.fixture
+def prefix(make_prefix, scripts) -> str:
+    """Return an environment prefix whose activate.d directory holds the scripts."""
+    prefix = make_prefix()
+    os.makedirs(os.path.join(prefix, "etc", "conda"))
+    os.rename(os.path.dirname(scripts[0]), os.path.join(prefix, "etc", "conda", "activate.d"))
+    return prefix
+
+
+def runs(tmp_path) -> list[str]:
+    return (tmp_path / "runs.log").read_text().split()
+
+
+def test_capture(scripts):
+    """Test that the effect of a script on the environment is captured"""
+    effect = capture(scripts[0], {"PATH": os.defpath, "OLD_JAVA": "1"})
+
+    assert effect.export_vars == {"JAVA_HOME": "/opt/jdk"}
+    assert effect.unset_vars == ("OLD_JAVA",)
+
+
+def test_capture_failure(tmp_path):
+    """Test that failing scripts are not captured"""
+    script = tmp_path / "broken.sh"
+    script.write_text("export A=1\nfalse\n")
+
+    assert capture(str(script), {"PATH": os.defpath}) is None
+
+
+def test_cached_effects(scripts, tmp_path):
+    """Test that scripts run once, in order, and their combined effect is applied after that"""
+    env = {"PATH": os.defpath, "OLD_JAVA": "1"}
+
+    first = cached_effects(env, (), scripts, ENABLED)
+    second = cached_effects(env, (), scripts, ENABLED)
+
+    assert first == second == (2, {"JAVA_HOME": "/opt/jdk", "CUDA_PATH": "/opt/jdk/../cuda"}, {"OLD_JAVA"})
+    assert runs(tmp_path) == ["jdk", "cuda"]
+
+    cached_effects({**env, "OTHER": "1"}, (), scripts, ENABLED)
+    assert runs(tmp_path) == ["jdk", "cuda", "jdk", "cuda"]
+
+
+def test_cached_effects_lists(scripts):
+    """Test that denied scripts, and all scripts after them, run in the shell"""
+    env = {"PATH": os.defpath}
+
+    assert cached_effects(env, (), scripts, {}) == (0, {}, set())
+    assert cached_effects(env, (), scripts, {**ENABLED, "CONDACT_NO_CACHE": "1"}) == (0, {}, set())
+    assert cached_effects(env, ("deactivate.sh",), scripts, ENABLED)[0] == 0
+    assert cached_effects(env, (), scripts, {**ENABLED, "CONDACT_SCRIPT_CACHE_DENY": "01-*"})[0] == 0
+    assert cached_effects(env, (), scripts, {**ENABLED, "CONDACT_SCRIPT_CACHE_DENY": "02-*"})[0] == 1
+    assert cached_effects(env, (), scripts, {**ENABLED, "CONDACT_SCRIPT_CACHE_ALLOW": "01-*, x"})[0] == 1
+
+    assert is_cacheable("/env/etc/conda/activate.d/a.sh", ENABLED)
+    assert not is_cacheable("/env/etc/conda/activate.d/a.bat", ENABLED)
+
+
+@pytest.mark.osexec
+def test_osexec_activate_applies_cached_effects(posix_ose_hook, mocker, prefix):
+    """Test that activation applies cached effects instead of sourcing the scripts"""
+    execve = mocker.patch("os.execve")
+    environ = {"PATH": os.defpath, "CONDA_SHLVL": "0", **ENABLED}
+
+    activator = PluginActivator(posix_ose_hook, environ)
+    activator.activate(activator.parse_and_build(Namespace(command="activate", env=prefix, dev=False, stack=False)))
+
+    path, arg_list, env = execve.call_args.args
+    assert arg_list == [path]
+    assert env["JAVA_HOME"] == "/opt/jdk"
+    assert env["CUDA_PATH"] == "/opt/jdk/../cuda"
+
+    # the snapshot deactivate restores covers the variables set by the cached scripts
+    restored = snapshot.restore(env)
+    assert {"JAVA_HOME", "CUDA_PATH"} <= set(restored.unset_vars)
+
+
+@pytest.mark.osexec
+def test_osexec_run_applies_cached_effects(posix_ose_hook, mocker, prefix):
+    """Test that run applies cached effects and runs the command without /bin/sh"""
+    execve = mocker.patch("os.execve")
+    environ = {"PATH": os.defpath, "CONDA_SHLVL": "0", **ENABLED}
+
+    activator = PluginActivator(posix_ose_hook, environ)
+    ns = Namespace(command="run", env=prefix, dev=False, stack=False, argv=["true"])
+    activator.run(activator.parse_and_build(ns), ["true"])
+
+    path, arg_list, env = execve.call_args.args
+    assert arg_list == ["true"]
+    assert os.path.basename(path) == "true"
+    assert env["CUDA_PATH"] == "/opt/jdk/../cuda"
+
+
+def test_cache_clear_removes_script_effects(scripts, capsys):
+    """Test that clearing the cache also removes the cached script effects"""
+    cached_effects({"PATH": os.defpath}, (), scripts, ENABLED)
+    assert os.listdir(script_cache_dir())
+
+    assert run_cache_command(Namespace(cache_command="clear", json=False)) == 0
+
+    assert not os.listdir(script_cache_dir())
+    assert "2 cached script effects" in capsys.readouterr().out
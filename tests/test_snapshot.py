@@ -0,0 +1,99 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import os
+from argparse import Namespace
+
+import pytest
+
+from condact import snapshot
+from condact.environ import EnvOverlay
+from condact.logic import PluginActivator, _ActivatorChild
+
+ENV0 = {"PATH": "/usr/bin", "CONDA_SHLVL": "0", "HOME": "/home/me"}
+
+
+def activate(environ: dict, **changes) -> dict:
+    """Return the environment after an activation making changes, with its snapshot taken."""
+    env_map = EnvOverlay(environ)
+    for key, value in changes.items():
+        if value is None:
+            del env_map[key]
+        else:
+            env_map[key] = value
+    snapshot.take(environ, env_map, [f"{changes['CONDA_PREFIX']}/deactivate.sh"], [])
+    return env_map.materialize()
+
+
+def restored(environ: dict) -> dict | None:
+    """Return the environment restored from the snapshot, or None if it is stale."""
+    plan = snapshot.restore(environ)
+    if plan is None:
+        return None
+    env_map = EnvOverlay(environ)
+    for key in plan.unset_vars:
+        env_map.pop(key, None)
+    env_map.update(plan.export_vars)
+    return env_map.materialize()
+
+
+def test_restore():
+    """Test that the environment before the activation is restored exactly"""
+    env1 = activate(ENV0, CONDA_SHLVL="1", CONDA_PREFIX="/a", PATH="/a/bin:/usr/bin")
+    env2 = activate(env1, CONDA_SHLVL="2", CONDA_PREFIX="/b", CONDA_PREFIX_1="/a", PATH="/b/bin:/a/bin:/usr/bin")
+
+    assert restored(env2) == env1
+    assert restored(env1) == ENV0
+    assert snapshot.restore(env2).deactivate_scripts == ("/b/deactivate.sh",)
+
+
+def test_restore_replaced_activation():
+    """Test that an activation replacing another at the same level returns to the state before both"""
+    env1 = activate(ENV0, CONDA_SHLVL="1", CONDA_PREFIX="/a", PATH="/a/bin:/usr/bin", A_HOME="/a")
+    env1b = activate(env1, CONDA_PREFIX="/b", PATH="/b/bin:/usr/bin", A_HOME=None, B_HOME="/b")
+
+    assert restored(env1b) == ENV0
+    assert snapshot.restore(env1b).deactivate_scripts == ("/b/deactivate.sh",)
+
+
+def test_restore_stale(tmp_path):
+    """Test that changed variables and missing or corrupted snapshots are not restored"""
+    env1 = activate(ENV0, CONDA_SHLVL="1", CONDA_PREFIX="/a", PATH="/a/bin:/usr/bin")
+    path = os.path.join(snapshot.snapshot_dir(), env1["_CONDACT_SNAPSHOT_1"].split(":")[0] + ".plan")
+
+    assert restored({**env1, "PS1": "changed prompt"}) is not None
+    assert restored({**env1, "PATH": "/opt/bin:/a/bin:/usr/bin"}) is None
+
+    with open(path, "r+b") as fh:
+        data = fh.read()
+        fh.seek(-1, os.SEEK_END)
+        fh.write(bytes([data[-1] ^ 0xFF]))
+    assert restored(env1) is None
+
+    os.unlink(path)
+    assert restored(env1) is None
+
+
+@pytest.mark.osexec
+def test_osexec_deactivate_restores_snapshot(posix_ose_hook, mocker, make_prefix):
+    """Test that deactivate restores the snapshot of activate without building a plan"""
+    prefix = make_prefix()
+    execve = mocker.patch("os.execve")
+    environ = {**ENV0, "PS1": "$ "}
+    activator = PluginActivator(posix_ose_hook, environ)
+    activator.activate(activator.parse_and_build(Namespace(command="activate", env=prefix, dev=False, stack=False)))
+    activated = execve.call_args.args[2]
+
+    build_deactivate = mocker.spy(_ActivatorChild, "build_deactivate")
+    activator = PluginActivator(posix_ose_hook, activated)
+    plan = activator.parse_and_build(Namespace(command="deactivate", dev=False))
+
+    build_deactivate.assert_not_called()
+    assert activator.update_env_map(plan).materialize() == environ
+
+    activator = PluginActivator(posix_ose_hook, {**activated, "PATH": "/changed"})
+    plan = activator.parse_and_build(Namespace(command="deactivate", dev=False))
+
+    build_deactivate.assert_called_once()
+    assert "_CONDACT_SNAPSHOT_1" in plan.unset_vars
@@ -0,0 +1,98 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import json
+from argparse import Namespace
+
+import pytest
+
+from condact import trace
+from condact.logic import _ActivatorChild
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch) -> str:
+    """Enable tracing to a temporary file and disable it again afterwards."""
+    path = str(tmp_path / "trace.jsonl")
+    monkeypatch.setattr(trace, "_tracer", None)
+    trace.enable(path)
+    yield path
+    trace._tracer.close()
+
+
+def read_spans(path: str) -> list[dict]:
+    with open(path) as fh:
+        return [json.loads(line) for line in fh]
+
+
+def test_span_disabled(monkeypatch):
+    """Test that spans are no-ops when tracing is not enabled"""
+    monkeypatch.setattr(trace, "_tracer", None)
+
+    with trace.span("phase", a=1) as attrs:
+        attrs["b"] = 2
+
+    assert not trace.enabled()
+    assert attrs == {"a": 1, "b": 2}
+
+
+def test_span_nesting(trace_file):
+    """Test that nested spans are written in completion order with their parent"""
+
+    @trace.traced("inner")
+    def inner():
+        return 42
+
+    with trace.span("outer", command="activate") as attrs:
+        assert inner() == 42
+        attrs["hit"] = True
+
+    inner_span, outer_span = read_spans(trace_file)
+    assert inner_span["name"] == "inner"
+    assert inner_span["parent"] == "outer"
+    assert inner_span["depth"] == 1
+    assert outer_span["name"] == "outer"
+    assert outer_span["parent"] is None
+    assert outer_span["attrs"] == {"command": "activate", "hit": True}
+    assert outer_span["duration_ms"] >= inner_span["duration_ms"]
+
+
+def test_span_error(trace_file):
+    """Test that spans record the exception that ended them, except successful exits"""
+    with pytest.raises(SystemExit):
+        with trace.span("ok"):
+            raise SystemExit(0)
+    with pytest.raises(ValueError):
+        with trace.span("failed"):
+            raise ValueError()
+
+    ok, failed = read_spans(trace_file)
+    assert "error" not in ok
+    assert failed["error"] == "ValueError"
+
+
+def test_before_exec(trace_file):
+    """Test that open spans are written before the process would be replaced"""
+    with trace.span("cli.execute"):
+        with trace.span("activate"):
+            trace.before_exec("/bin/bash")
+
+    exec_event, activate, execute = read_spans(trace_file)
+    assert exec_event["name"] == "exec"
+    assert exec_event["attrs"] == {"path": "/bin/bash"}
+    assert (activate["name"], activate["exec"]) == ("activate", True)
+    assert (execute["name"], execute["exec"]) == ("cli.execute", True)
+
+
+def test_classic_builds_traced(trace_file, posix_cl_hook, tmp_path):
+    """Test that the classic activator's deactivate and reactivate builds are traced"""
+    prefix = str(tmp_path / "env")
+    environ = {"PATH": f"{prefix}/bin:/usr/bin", "CONDA_SHLVL": "1", "CONDA_PREFIX": prefix}
+
+    _ActivatorChild(posix_cl_hook, Namespace(command="deactivate", dev=False), environ).build_deactivate()
+    _ActivatorChild(posix_cl_hook, Namespace(command="reactivate", dev=False), environ).build_reactivate()
+
+    names = [span["name"] for span in read_spans(trace_file)]
+    assert "_ActivatorChild.build_deactivate" in names
+    assert "_ActivatorChild.build_reactivate" in names
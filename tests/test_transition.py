@@ -0,0 +1,100 @@
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import annotations
+
+import os
+from argparse import Namespace
+
+import pytest
+
+from condact.logic import PluginActivator
+from condact.plan import ActivationPlan
+from condact.transition import is_transition_safe, plan_transition
+
+SAFE = "#!/bin/sh\n# condact: transition-safe\nexport PKG_HOME=/opt/pkg\n"
+UNSAFE = '#!/bin/sh\nexport PKG_HOME="$CONDA_PREFIX/pkg"\n'
+
+
+@pytest.fixture
+def prefixes(make_prefix) -> tuple[str, str]:
+    """Return two sibling environments sharing the safe and the unsafe package."""
+    shared = {
+        "etc/conda/activate.d/safe.sh": SAFE,
+        "etc/conda/deactivate.d/safe.sh": SAFE,
+        "etc/conda/activate.d/unsafe.sh": UNSAFE,
+        "etc/conda/deactivate.d/unsafe.sh": UNSAFE,
+    }
+    old = make_prefix("old", {**shared, "etc/conda/deactivate.d/old_only.sh": SAFE})
+    new = make_prefix("new", {**shared, "etc/conda/activate.d/new_only.sh": SAFE})
+    return old, new
+
+
+def scripts(prefix: str, subdir: str, *names: str) -> tuple[str, ...]:
+    return tuple(os.path.join(prefix, "etc", "conda", subdir, name) for name in names)
+
+
+def test_is_transition_safe(tmp_path):
+    """Test that scripts opt in with a marker comment or by name"""
+    safe = tmp_path / "safe.sh"
+    safe.write_text(SAFE)
+    unsafe = tmp_path / "unsafe.sh"
+    unsafe.write_text(UNSAFE)
+
+    assert is_transition_safe(str(safe))
+    assert not is_transition_safe(str(unsafe))
+    assert is_transition_safe(str(unsafe), {"unsafe.sh"})
+    assert not is_transition_safe(str(tmp_path / "missing.sh"))
+
+
+def test_plan_transition(prefixes):
+    """Test that only changed variables and the scripts of unshared packages remain"""
+    old, new = prefixes
+    environ = {"CONDA_PREFIX": old, "CONDA_SHLVL": "1", "PKG": "same"}
+    plan = ActivationPlan(
+        unset_vars=("CONDA_PREFIX_1", "PKG"),
+        export_path={"PATH": f"{new}/bin"},
+        export_vars={"CONDA_PREFIX": new, "CONDA_SHLVL": 1},
+        deactivate_scripts=scripts(old, "deactivate.d", "old_only.sh", "safe.sh", "unsafe.sh"),
+        activate_scripts=scripts(new, "activate.d", "new_only.sh", "safe.sh", "unsafe.sh"),
+    )
+
+    transition = plan_transition(plan, environ, old, new)
+
+    assert transition.unset_vars == ("PKG",)
+    assert transition.export_vars == {"CONDA_PREFIX": new}
+    assert transition.export_path == plan.export_path
+    assert transition.deactivate_scripts == scripts(old, "deactivate.d", "old_only.sh", "unsafe.sh")
+    assert transition.activate_scripts == scripts(new, "activate.d", "new_only.sh", "unsafe.sh")
+
+    opted_in = plan_transition(plan, {**environ, "CONDACT_TRANSITION_SCRIPTS": "unsafe.sh"}, old, new)
+    assert opted_in.activate_scripts == scripts(new, "activate.d", "new_only.sh")
+
+
+def test_plan_transition_changed_script(prefixes):
+    """Test that a package whose scripts differ between the environments is not shared"""
+    old, new = prefixes
+    with open(os.path.join(new, "etc", "conda", "activate.d", "safe.sh"), "a") as fh:
+        fh.write("export PKG_VERSION=2\n")
+    plan = ActivationPlan(activate_scripts=scripts(new, "activate.d", "safe.sh"))
+
+    assert plan_transition(plan, {}, old, new).activate_scripts == plan.activate_scripts
+
+
+@pytest.mark.osexec
+def test_osexec_switch_environment(posix_ose_hook, prefixes):
+    """Test that switching between sibling environments skips their shared safe package"""
+    old, new = prefixes
+    environ = {**os.environ, "CONDA_PREFIX": old, "CONDA_SHLVL": "1", "PATH": f"{old}/bin:/usr/bin"}
+    args = Namespace(command="activate", env=new, dev=False, stack=False)
+
+    plan = PluginActivator(posix_ose_hook, environ).parse_and_build(args)
+
+    # the plan and the transition are both computed from environ, not from os.environ
+    assert plan.export_vars["CONDA_PREFIX"] == new
+    assert plan.export_vars["PATH"] == f"{new}/bin:/usr/bin"
+    assert os.environ.get("CONDA_PREFIX") != old
+    assert set(plan.deactivate_scripts) == set(scripts(old, "deactivate.d", "old_only.sh", "unsafe.sh"))
+    assert set(plan.activate_scripts) == set(scripts(new, "activate.d", "new_only.sh", "unsafe.sh"))
+
+    full = PluginActivator(posix_ose_hook, {**environ, "CONDACT_NO_TRANSITION": "1"}).parse_and_build(args)
+    assert len(full.activate_scripts) == 3